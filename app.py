@@ -1,15 +1,31 @@
 """Finance Tracker allows you to track your financial asset operations."""
 
 import flask
+from routes import admin
 from routes import api
+from routes import metrics
 from routes import static
 from routes import ui
+from services import portfolio_manager
+from services import scheduler_manager
 
 app = flask.Flask(__name__)
+app.register_blueprint(admin.admin_routes)
 app.register_blueprint(api.api_routes)
+app.register_blueprint(metrics.metrics_routes)
 app.register_blueprint(static.static_routes)
 app.register_blueprint(ui.ui_routes)
 
 
+@app.before_request
+def start_background_work():
+  # Started on first request, so servers loading the app before forking
+  # workers (see wsgi.py) run it in each worker instead of only before forking.
+  portfolio_manager.start_loading()
+  scheduler_manager.start()
+
+
 if __name__ == "__main__":
+  # Serves requests while portfolios are loaded.
+  portfolio_manager.start_loading()
   app.run(host='0.0.0.0', port=99, debug=True)
@@ -0,0 +1,68 @@
+"""Benchmarks analyzing the price history of all assets in a portfolio.
+
+Trackers of a synthetic portfolio get years of random daily prices, and
+returns, volatility, drawdown and correlations are calculated for several
+windows. Analytics are dropped before each run, so all are calculated.
+
+Run from the repository root:
+  python -m benchmarks.analytics --assets 20 --days 2500
+"""
+
+import argparse
+import json
+import tempfile
+from benchmarks import portfolio_generator
+from benchmarks import risk
+from benchmarks import timing
+from services import analytics_manager
+from services import portfolio_manager
+from services import price_history_manager
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--assets', type=int, default=20)
+  parser.add_argument('--operations', type=int, default=200)
+  parser.add_argument('--days', type=int, default=2500)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as storage_path:
+    # Benchmark portfolios and prices are stored apart from real ones.
+    portfolio_manager.set_storage_path(storage_path)
+    price_history_manager.set_storage_path(storage_path)
+    managed_portfolio = portfolio_generator.get_portfolio(
+        args.assets, args.operations)
+    risk.store_price_histories(
+        [
+            managed_asset.get_tracker()
+            for managed_asset in managed_portfolio.assets.values()
+        ],
+        args.days, storage_path)
+    price_history_manager.set_storage_path(storage_path)
+
+    results = []
+    for window_days in (20, 250):
+      results.append(timing.measure(
+          f'analytics.window_{window_days}',
+          lambda: analytics_manager.get_portfolio_analytics(
+              managed_portfolio, window_days),
+          repeat=args.repeat,
+          parameters={
+              'assets': args.assets,
+              'days': args.days,
+              'window_days': window_days,
+          },
+          setup=analytics_manager._PORTFOLIO_ANALYTICS.clear))
+
+    results.append(timing.measure(
+        'analytics.unchanged',
+        lambda: analytics_manager.get_portfolio_analytics(managed_portfolio),
+        repeat=args.repeat,
+        parameters={'assets': args.assets, 'days': args.days}))
+
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
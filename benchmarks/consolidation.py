@@ -0,0 +1,75 @@
+"""Benchmarks consolidating positions across many portfolios.
+
+Portfolios hold the same trackers and all their assets change before each
+run, so all positions are computed, either in this process or in parallel
+processes. Consolidating unchanged portfolios is measured too.
+
+Run from the repository root:
+  python -m benchmarks.consolidation --portfolios 8 --assets 20
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from benchmarks import portfolio_generator
+from benchmarks import timing
+from services import consolidation_manager
+from services import portfolio_manager
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--portfolios', type=int, default=8)
+  parser.add_argument('--assets', type=int, default=20)
+  parser.add_argument('--operations', type=int, default=500)
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as storage_path:
+    # Benchmark portfolios are stored apart from real portfolios.
+    portfolio_manager.set_storage_path(storage_path)
+    portfolios = [
+        portfolio_generator.get_portfolio(
+            args.assets, args.operations, seed=portfolio_index)
+        for portfolio_index in range(args.portfolios)
+    ]
+
+    def change_portfolios():
+      for managed_portfolio in portfolios:
+        for managed_asset in managed_portfolio.assets.values():
+          managed_asset.increment_version()
+        portfolio_manager.store_portfolio(managed_portfolio)
+
+    parameters = {
+        'portfolios': args.portfolios,
+        'assets': args.assets,
+        'operations_per_asset': args.operations,
+    }
+
+    results = []
+    for workers in (0, args.workers):
+      os.environ[consolidation_manager._WORKERS_ENVIRONMENT_VARIABLE] = (
+          str(workers))
+      # Starts worker processes before measuring.
+      change_portfolios()
+      consolidation_manager.get_consolidated_positions(portfolios)
+
+      results.append(timing.measure(
+          f'consolidation.changed.workers_{workers}',
+          lambda: consolidation_manager.get_consolidated_positions(
+              portfolios),
+          repeat=args.repeat, parameters=parameters,
+          setup=change_portfolios))
+
+    results.append(timing.measure(
+        'consolidation.unchanged',
+        lambda: consolidation_manager.get_consolidated_positions(portfolios),
+        repeat=args.repeat, parameters=parameters))
+
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,120 @@
+"""Benchmarks how long it takes to import the app, to track startup time.
+
+Imports the app in a fresh interpreter with `python -X importtime` and
+reports the total import time, the slowest modules and whether any module
+which should only load on first use was imported.
+
+Run from the repository root:
+  python -m benchmarks.import_time --max-ms 1500
+"""
+
+import argparse
+import subprocess
+import sys
+from typing import List, Mapping, Text, Tuple
+
+# Modules which must not be imported until they are used.
+_LAZY_MODULES = ['yahoo_fin', 'pandas', 'requests_html']
+_IMPORT_TIME_PREFIX = 'import time:'
+
+ModuleImportTime = Tuple[Text, int, int]
+
+
+def get_import_times(module_name: Text = 'app') -> List[ModuleImportTime]:
+  """Imports a module in a new interpreter, timing every import.
+
+  Args:
+    module_name: Module to import.
+
+  Raises:
+    subprocess.CalledProcessError: module could not be imported.
+
+  Returns:
+    Name, own and cumulative import microseconds of each imported module.
+  """
+  completed_process = subprocess.run(
+      [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+      capture_output=True, text=True, check=True)
+
+  import_times = []
+  for line in completed_process.stderr.splitlines():
+    if not line.startswith(_IMPORT_TIME_PREFIX):
+      continue
+    self_time, cumulative_time, imported_module = (
+        line[len(_IMPORT_TIME_PREFIX):].split('|'))
+    if not self_time.strip().isdigit():
+      continue  # Header line.
+    import_times.append((
+        imported_module.strip(), int(self_time), int(cumulative_time)))
+
+  return import_times
+
+
+def get_import_summary(module_name: Text,
+                       import_times: List[ModuleImportTime]) -> Mapping:
+  """Summarizes the import times of a module.
+
+  Args:
+    module_name: Imported module.
+    import_times: Name, own and cumulative import microseconds of each
+        imported module.
+
+  Returns:
+    Total import milliseconds, slowest top-level modules and eagerly
+    imported lazy modules.
+  """
+  cumulative_times = {
+      imported_module: cumulative_time
+      for imported_module, _, cumulative_time in import_times
+  }
+  top_level_times = sorted(
+      ((imported_module, cumulative_time)
+       for imported_module, cumulative_time in cumulative_times.items()
+       if '.' not in imported_module and imported_module != module_name),
+      key=lambda module_time: -module_time[1])
+
+  return {
+      'total_ms': cumulative_times.get(module_name, 0) / 1000,
+      'slowest_modules': [
+          {'module': imported_module, 'cumulative_ms': cumulative_time / 1000}
+          for imported_module, cumulative_time in top_level_times[:10]
+      ],
+      'eager_lazy_modules': [
+          lazy_module for lazy_module in _LAZY_MODULES
+          if lazy_module in cumulative_times
+      ],
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--module', default='app')
+  parser.add_argument(
+      '--max-ms', type=float, default=None,
+      help='Fail if importing takes longer than this.')
+  args = parser.parse_args()
+
+  import_summary = get_import_summary(
+      args.module, get_import_times(args.module))
+
+  print(f'{args.module}: {import_summary["total_ms"]:.1f} ms')
+  for slowest_module in import_summary['slowest_modules']:
+    print(
+        f'  {slowest_module["module"]}: '
+        f'{slowest_module["cumulative_ms"]:.1f} ms')
+
+  is_regression = False
+  if import_summary['eager_lazy_modules']:
+    print(
+        'Imported before first use: '
+        f'{", ".join(import_summary["eager_lazy_modules"])}')
+    is_regression = True
+  if args.max_ms is not None and import_summary['total_ms'] > args.max_ms:
+    print(f'Import took longer than {args.max_ms:.1f} ms')
+    is_regression = True
+
+  sys.exit(1 if is_regression else 0)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,217 @@
+"""Load tests refreshing asset stats while market data is slow.
+
+Many clients refresh the stats of an asset at the same time against a server
+with a fixed number of threads, as a single server worker. Each refresh either
+waits for the market data in the request, or asks for a background job with
+`Prefer: respond-async` and polls it until it finishes.
+
+Run from the repository root:
+  python -m benchmarks.load_test --clients 64 --threads 4 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import importlib
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+import wsgiref.simple_server
+from benchmarks import portfolio_generator
+from models import market_data
+from services import market_data_manager
+from services import market_data_provider
+from services import portfolio_manager
+from services import scheduler_manager
+from typing import Mapping, Optional, Sequence, Text
+
+_JOB_POLL_INTERVAL = 0.25
+_FINISHED_JOB_STATUSES = ('SUCCEEDED', 'FAILED')
+_STATS_TABLE = [('Trailing P/E', '20.5'), ('Profit Margin', '25.1%')]
+
+
+class _SlowMarketDataProvider(market_data_provider.MarketDataProvider):
+  """Provides fixed market data after waiting, as a slow remote service."""
+
+  supports_batch_quotes = True
+
+  def __init__(self, latency: float):
+    """Instantiates the provider.
+
+    Args:
+      latency: Seconds each request takes.
+    """
+    self._latency = latency
+
+  async def get_quotes(
+          self, trackers: Sequence[Text]) -> market_data_provider.Quotes:
+    """Gets a fixed price for all trackers after waiting."""
+    await asyncio.sleep(self._latency)
+    return {tracker: 100.0 for tracker in trackers}
+
+  async def get_stats_table(
+          self, tracker: Text) -> Optional[market_data.StatsTable]:
+    """Gets fixed fundamentals after waiting."""
+    await asyncio.sleep(self._latency)
+    return _STATS_TABLE
+
+
+class _ThreadPoolWSGIServer(wsgiref.simple_server.WSGIServer):
+  """Serves requests with a fixed number of threads, as a server worker."""
+
+  request_queue_size = 1024
+
+  def __init__(self, server_address, handler_class, threads: int):
+    """Instantiates the server.
+
+    Args:
+      server_address: Host and port on which to listen.
+      handler_class: Handler of requests.
+      threads: Number of requests served at the same time.
+    """
+    super().__init__(server_address, handler_class)
+    self._executor = concurrent.futures.ThreadPoolExecutor(threads)
+
+  def process_request(self, request, client_address):
+    """Serves the request in one of the threads."""
+    self._executor.submit(self._serve_request, request, client_address)
+
+  def _serve_request(self, request, client_address):
+    """Serves a request and closes it."""
+    try:
+      self.finish_request(request, client_address)
+    except Exception:
+      self.handle_error(request, client_address)
+    finally:
+      self.shutdown_request(request)
+
+
+class _QuietRequestHandler(wsgiref.simple_server.WSGIRequestHandler):
+  """Handles requests without logging each of them."""
+
+  def log_message(self, *args):
+    """Does not log requests."""
+
+
+def refresh_stats(base_url: Text, asset_code: Text,
+                  respond_async: bool) -> float:
+  """Refreshes the stats of an asset, until they are updated.
+
+  Args:
+    base_url: URL of the asset stats endpoint, without asset code.
+    asset_code: Asset for which to refresh stats.
+    respond_async: Whether to ask for a background job and poll it.
+
+  Raises:
+    ValueError: stats job failed.
+
+  Returns:
+    Seconds until stats were updated.
+  """
+  start_time = time.perf_counter()
+
+  headers = {'Prefer': 'respond-async'} if respond_async else {}
+  stats_request = urllib.request.Request(
+      f'{base_url}{asset_code}/stats/', method='PUT', headers=headers)
+  with urllib.request.urlopen(stats_request) as response:
+    response_data = json.load(response)
+    job_url = response.headers.get('Location')
+
+  while respond_async and response_data['status'] not in (
+          _FINISHED_JOB_STATUSES):
+    time.sleep(_JOB_POLL_INTERVAL)
+    with urllib.request.urlopen(
+            urllib.parse.urljoin(base_url, job_url)) as response:
+      response_data = json.load(response)
+
+  if respond_async and response_data['status'] != 'SUCCEEDED':
+    raise ValueError(f'Stats job failed: {response_data["error"]}')
+
+  return time.perf_counter() - start_time
+
+
+def run_load(base_url: Text, asset_codes: Sequence[Text],
+             respond_async: bool) -> Mapping:
+  """Refreshes the stats of all assets at the same time.
+
+  Args:
+    base_url: URL of the asset stats endpoint, without asset code.
+    asset_codes: Assets for which to refresh stats, one per client.
+    respond_async: Whether to ask for background jobs and poll them.
+
+  Returns:
+    Machine-readable results, in seconds.
+  """
+  start_time = time.perf_counter()
+  with concurrent.futures.ThreadPoolExecutor(len(asset_codes)) as clients:
+    durations = list(clients.map(
+        lambda asset_code: refresh_stats(
+            base_url, asset_code, respond_async),
+        asset_codes))
+  total_duration = time.perf_counter() - start_time
+
+  durations.sort()
+  return {
+      'benchmark': (
+          'load.asset_stats.async' if respond_async else
+          'load.asset_stats.sync'),
+      'clients': len(asset_codes),
+      'total_s': total_duration,
+      'refreshes_per_s': len(asset_codes) / total_duration,
+      'median_s': statistics.median(durations),
+      'p95_s': durations[int(0.95 * (len(durations) - 1))],
+      'max_s': durations[-1],
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--clients', type=int, default=64)
+  parser.add_argument('--threads', type=int, default=4)
+  parser.add_argument('--latency', type=float, default=0.2)
+  args = parser.parse_args()
+
+  os.environ.setdefault('FINANCE_TRACKER_REFRESH_INTERVAL', '0')
+  market_data_manager.set_provider(_SlowMarketDataProvider(args.latency))
+  app = importlib.import_module('app').app
+
+  managed_portfolio = portfolio_generator.get_portfolio(
+      asset_count=args.clients, operations_per_asset=5)
+
+  with tempfile.TemporaryDirectory() as storage_path:
+    # Benchmark portfolios and jobs are stored apart from real ones.
+    portfolio_storage_path = os.path.join(storage_path, 'portfolios')
+    portfolio_manager.set_storage_path(portfolio_storage_path)
+    scheduler_manager._JOB_STORAGE_PATH = os.path.join(storage_path, 'jobs')
+    portfolio_manager.store_portfolio(managed_portfolio)
+
+    server = wsgiref.simple_server.make_server(
+        '127.0.0.1', 0, app,
+        server_class=lambda *server_args: _ThreadPoolWSGIServer(
+            *server_args, threads=args.threads),
+        handler_class=_QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base_url = (
+        f'http://127.0.0.1:{server.server_port}'
+        f'/api/portfolios/{managed_portfolio.get_id()}/assets/')
+    asset_codes = list(managed_portfolio.assets)
+
+    results = []
+    for respond_async in (False, True):
+      load_result = run_load(base_url, asset_codes, respond_async)
+      load_result.update(
+          {'threads': args.threads, 'latency_s': args.latency})
+      results.append(load_result)
+
+    server.shutdown()
+
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
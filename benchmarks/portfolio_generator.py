@@ -0,0 +1,147 @@
+"""Generates synthetic portfolios to benchmark portfolio operations."""
+
+import datetime
+import random
+from models import asset
+from models import operation
+from models import portfolio
+from services import asset_manager
+from typing import List
+
+_CURRENCY = 'USD'
+_START_DATE = datetime.datetime(2010, 1, 4, 16)
+
+
+def get_portfolio(asset_count: int = 20,
+                  operations_per_asset: int = 200,
+                  buy_weight: float = 0.6,
+                  sell_weight: float = 0.3,
+                  dividend_weight: float = 0.1,
+                  back_dated_ratio: float = 0.1,
+                  seed: int = 0) -> portfolio.Portfolio:
+  """Generates a portfolio with random assets and operations.
+
+  Operations never sell more units than held at their date. Back-dated
+  operations are added after operations which happened later than them, as
+  when past trades are registered late. Only sells and dividends are
+  back-dated, so no sell is added before the units it sells are bought.
+
+  Args:
+    asset_count: Number of assets in the portfolio.
+    operations_per_asset: Number of operations of each asset.
+    buy_weight: Relative frequency of buy operations.
+    sell_weight: Relative frequency of sell operations.
+    dividend_weight: Relative frequency of dividend operations.
+    back_dated_ratio: Fraction of operations added out of date order.
+    seed: Seed of the random values, so portfolios can be reproduced.
+
+  Returns:
+    Synthetic portfolio. It is not stored.
+  """
+  random_generator = random.Random(seed)
+  synthetic_portfolio = portfolio.Portfolio(
+      f'Benchmark {asset_count}x{operations_per_asset}', _CURRENCY)
+
+  for asset_index in range(asset_count):
+    asset_code = f'BENCH:A{asset_index:04d}'
+    synthetic_asset = asset.Asset(asset_code, asset_code, 0.0, _CURRENCY)
+    synthetic_portfolio.assets[asset_code] = synthetic_asset
+
+    asset_operations = _get_asset_operations(
+        synthetic_asset, operations_per_asset,
+        [buy_weight, sell_weight, dividend_weight], random_generator)
+    synthetic_asset.current_price = asset_operations[-1].price_per_unit
+
+    for asset_operation in _get_insertion_order(
+            asset_operations, back_dated_ratio, random_generator):
+      asset_manager.add_operation(synthetic_asset, asset_operation)
+
+  return synthetic_portfolio
+
+
+def _get_asset_operations(synthetic_asset: asset.Asset,
+                          operation_count: int,
+                          operation_weights: List[float],
+                          random_generator: random.Random
+                          ) -> List[operation.Operation]:
+  """Generates operations of an asset, in date order.
+
+  Args:
+    synthetic_asset: Asset to operate.
+    operation_count: Number of operations to generate.
+    operation_weights: Relative frequency of buy, sell and dividend.
+    random_generator: Source of random values.
+
+  Returns:
+    Operations of the asset, sorted by date.
+  """
+  operation_types = [
+      operation.OperationType.BUY,
+      operation.OperationType.SELL,
+      operation.OperationType.DIVIDEND,
+  ]
+
+  asset_operations = []
+  timestamp = _START_DATE
+  price = random_generator.uniform(10, 500)
+  held_units = 0
+  for _ in range(operation_count):
+    timestamp += datetime.timedelta(days=random_generator.randint(1, 10))
+    price = max(0.01, price * random_generator.gauss(1.0, 0.03))
+    (operation_type,) = random_generator.choices(
+        operation_types, weights=operation_weights)
+    if not held_units:
+      operation_type = operation.OperationType.BUY
+
+    if operation_type == operation.OperationType.BUY:
+      quantity = random_generator.randint(1, 100)
+      held_units += quantity
+      price_per_unit = price
+    elif operation_type == operation.OperationType.SELL:
+      quantity = random_generator.randint(1, held_units)
+      held_units -= quantity
+      price_per_unit = price
+    else:
+      quantity = held_units
+      price_per_unit = price * random_generator.uniform(0.001, 0.01)
+
+    asset_operations.append(operation.Operation(
+        synthetic_asset, timestamp, operation_type, quantity,
+        round(price_per_unit, 2), _CURRENCY))
+
+  return asset_operations
+
+
+def _get_insertion_order(asset_operations: List[operation.Operation],
+                         back_dated_ratio: float,
+                         random_generator: random.Random
+                         ) -> List[operation.Operation]:
+  """Moves a fraction of the operations to be added last.
+
+  Buys are not moved, as sells after them would sell more than held.
+
+  Args:
+    asset_operations: Operations sorted by date.
+    back_dated_ratio: Fraction of operations to add out of date order.
+    random_generator: Source of random values.
+
+  Returns:
+    Operations in the order in which to add them.
+  """
+  movable_operations = [
+      asset_operation for asset_operation in asset_operations
+      if asset_operation.operation_type != operation.OperationType.BUY
+  ]
+  back_dated_count = min(
+      int(len(asset_operations) * back_dated_ratio), len(movable_operations))
+  back_dated_operations = random_generator.sample(
+      movable_operations, back_dated_count)
+  back_dated_ids = {
+      back_dated_operation.get_id()
+      for back_dated_operation in back_dated_operations
+  }
+
+  return [
+      asset_operation for asset_operation in asset_operations
+      if asset_operation.get_id() not in back_dated_ids
+  ] + back_dated_operations
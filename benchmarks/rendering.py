@@ -0,0 +1,64 @@
+"""Benchmarks rendering pages with large tables.
+
+Renders the positions of a portfolio with thousands of assets and a history
+page with thousands of operations, with and without cached row fragments.
+
+Run from the repository root:
+  python -m benchmarks.rendering --rows 5000
+"""
+
+import argparse
+import importlib
+import json
+import os
+from benchmarks import portfolio_generator
+from benchmarks import timing
+from services import fragment_manager
+from services import portfolio_manager
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--rows', type=int, default=5000)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  # Keep background refreshes and network calls out of the measurements.
+  os.environ.setdefault('FINANCE_TRACKER_REFRESH_INTERVAL', '0')
+  os.environ.setdefault('FINANCE_TRACKER_MARKET_DATA_PROVIDER', 'fake')
+  client = importlib.import_module('app').app.test_client()
+
+  # One asset per positions row, and one asset with all the history rows.
+  positions_portfolio = portfolio_generator.get_portfolio(
+      asset_count=args.rows, operations_per_asset=5)
+  history_portfolio = portfolio_generator.get_portfolio(
+      asset_count=1, operations_per_asset=args.rows)
+  portfolios = portfolio_manager.get_portfolios()
+  for managed_portfolio in (positions_portfolio, history_portfolio):
+    portfolios[managed_portfolio.get_id()] = managed_portfolio
+
+  pages = {
+      'positions': f'/portfolios/{positions_portfolio.get_id()}/',
+      'history': (
+          f'/portfolios/{history_portfolio.get_id()}/history/'
+          f'?limit={args.rows}'),
+  }
+
+  results = []
+  for page_name, url in pages.items():
+    # Positions are computed once, so only rendering is measured.
+    client.get(url)
+    parameters = {'rows': args.rows, 'url': url}
+    results.append(timing.measure(
+        f'render.{page_name}.cold', lambda: client.get(url),
+        repeat=args.repeat, parameters=parameters,
+        setup=fragment_manager.clear))
+    results.append(timing.measure(
+        f'render.{page_name}.cached', lambda: client.get(url),
+        repeat=args.repeat, parameters=parameters))
+
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,115 @@
+"""Benchmarks estimating the value at risk of a portfolio.
+
+Trackers of a synthetic portfolio get years of random daily prices, and the
+historical and parametric value at risk are estimated over many scenarios.
+Estimates are dropped before each run, so all scenarios are simulated.
+
+Run from the repository root:
+  python -m benchmarks.risk --assets 20 --scenarios 100000
+"""
+
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import numpy as np
+from benchmarks import portfolio_generator
+from benchmarks import timing
+from services import portfolio_manager
+from services import price_history_manager
+from services import risk_manager
+from typing import Sequence, Text
+
+_PRICE_HISTORY_END_DATE = datetime.date(2020, 1, 1)
+
+
+def store_price_histories(trackers: Sequence[Text],
+                          days: int,
+                          storage_path: Text,
+                          seed: int = 0):
+  """Stores random daily prices of trackers which move together.
+
+  Args:
+    trackers: Trackers for which to store prices.
+    days: Number of daily prices of each tracker.
+    storage_path: Folder where to store price histories.
+    seed: Seed of the random prices, so histories can be reproduced.
+  """
+  random_generator = np.random.default_rng(seed)
+  market_returns = random_generator.normal(0.0003, 0.01, days)
+  dates = [
+      _PRICE_HISTORY_END_DATE - datetime.timedelta(days=days - day)
+      for day in range(days)
+  ]
+
+  for tracker in trackers:
+    daily_returns = (
+        random_generator.uniform(0.5, 1.5) * market_returns +
+        random_generator.normal(0, 0.015, days))
+    prices = random_generator.uniform(10, 500) * np.exp(
+        np.cumsum(daily_returns))
+    price_lines = ['date,price'] + [
+        f'{price_date.isoformat()},{price}'
+        for price_date, price in zip(dates, prices)
+    ]
+    with open(os.path.join(storage_path, f'{tracker}.csv'), 'w') as file:
+      file.write('\n'.join(price_lines))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--assets', type=int, default=20)
+  parser.add_argument('--operations', type=int, default=200)
+  parser.add_argument('--days', type=int, default=1000)
+  parser.add_argument('--scenarios', type=int, default=100000)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as storage_path:
+    # Benchmark portfolios and prices are stored apart from real ones.
+    portfolio_manager.set_storage_path(storage_path)
+    price_history_manager.set_storage_path(storage_path)
+    managed_portfolio = portfolio_generator.get_portfolio(
+        args.assets, args.operations)
+    store_price_histories(
+        [
+            managed_asset.get_tracker()
+            for managed_asset in managed_portfolio.assets.values()
+        ],
+        args.days, storage_path)
+    price_history_manager.set_storage_path(storage_path)
+
+    results = []
+    for horizon_days in (1, 10):
+      parameters = {
+          'assets': args.assets,
+          'days': args.days,
+          'scenarios': args.scenarios,
+          'horizon_days': horizon_days,
+      }
+      results.append(timing.measure(
+          f'risk.horizon_{horizon_days}',
+          lambda: risk_manager.get_portfolio_risk(
+              managed_portfolio, horizon_days=horizon_days,
+              scenarios=args.scenarios),
+          repeat=args.repeat, parameters=parameters,
+          setup=risk_manager._PORTFOLIO_RISKS.clear))
+
+    risk_manager.get_portfolio_risk(
+        managed_portfolio, scenarios=args.scenarios)
+    results.append(timing.measure(
+        'risk.unchanged',
+        lambda: risk_manager.get_portfolio_risk(
+            managed_portfolio, scenarios=args.scenarios),
+        repeat=args.repeat, parameters={
+            'assets': args.assets,
+            'days': args.days,
+            'scenarios': args.scenarios,
+        }))
+
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,101 @@
+"""Benchmarks parsing of fundamentals from cached stats tables.
+
+Compares looking up and parsing each stock attribute one at a time against
+indexing every table once and parsing all values in one vectorized step.
+
+Run from the repository root:
+  python -m benchmarks.stats_parsing --tables 5000
+"""
+
+import argparse
+import random
+import timeit
+from services import stats_manager
+from typing import List, Optional, Sequence, Text
+
+# Rows of a Yahoo Finance stats table which are not used as stock stats.
+_OTHER_ATTRIBUTES = [f'Other Attribute {index}' for index in range(50)]
+_RAW_VALUE_FORMATS = ['{:.2f}', '{:.2f}%', '{:.2f}B', '{:.2f}M', '{:.2f}k']
+_SUFFIX_MULTIPLIERS = {'%': 0.01, 'k': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+
+
+def get_stats_tables(table_count: int, seed: int = 0
+                     ) -> List[List[Sequence[Text]]]:
+  """Generates stats tables shaped like those fetched from Yahoo Finance.
+
+  Args:
+    table_count: Number of tables to generate.
+    seed: Seed of the random values.
+
+  Returns:
+    Rows of (attribute name, raw value) of each table.
+  """
+  random_generator = random.Random(seed)
+  attribute_names = _OTHER_ATTRIBUTES + [
+      stock_attribute.value
+      for stock_attribute in stats_manager.StockAttribute
+  ]
+
+  stats_tables = []
+  for _ in range(table_count):
+    stats_table = []
+    for attribute_name in attribute_names:
+      if random_generator.random() < 0.05:
+        raw_value = 'N/A'
+      else:
+        raw_value = random_generator.choice(_RAW_VALUE_FORMATS).format(
+            random_generator.uniform(-100, 100))
+      stats_table.append((attribute_name, raw_value))
+    random_generator.shuffle(stats_table)
+    stats_tables.append(stats_table)
+
+  return stats_tables
+
+
+def parse_one_by_one(stats_tables: Sequence[Sequence[Sequence[Text]]]):
+  """Parses each attribute of each table separately, scanning the table."""
+  for stats_table in stats_tables:
+    for stock_attribute in stats_manager.StockAttribute:
+      raw_value = '0'
+      for attribute_name, attribute_value in stats_table:
+        if attribute_name == stock_attribute.value:
+          raw_value = attribute_value
+          break
+      _parse_single_value(raw_value)
+
+
+def _parse_single_value(raw_value: Text) -> Optional[float]:
+  """Parses a single raw value into a number."""
+  raw_value = str(raw_value).strip()
+  if raw_value.lower() in ('n/a', 'nan', ''):
+    return None
+
+  multiplier = 1
+  if raw_value[-1] in _SUFFIX_MULTIPLIERS:
+    multiplier = _SUFFIX_MULTIPLIERS[raw_value[-1]]
+    raw_value = raw_value[:-1]
+  return float(raw_value) * multiplier
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--tables', type=int, default=5000)
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args()
+
+  stats_tables = get_stats_tables(args.tables)
+  benchmarks = {
+      'one_by_one': lambda: parse_one_by_one(stats_tables),
+      'vectorized': (
+          lambda: stats_manager.get_stock_stat_values(stats_tables)),
+  }
+
+  for benchmark_name, benchmark in benchmarks.items():
+    seconds = min(timeit.repeat(benchmark, number=1, repeat=args.repeat))
+    print(
+        f'{benchmark_name}: {seconds * 1000:.1f} ms for {args.tables} '
+        f'tables ({seconds / args.tables * 1e6:.1f} us per table)')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,196 @@
+"""Benchmarks position calculations, portfolio storage and web routes.
+
+Results are printed, or written to a file, as JSON so they can be compared
+between runs to track regressions.
+
+Run from the repository root:
+  python -m benchmarks.suite --assets 20 --operations 200 --output out.json
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+from benchmarks import portfolio_generator
+from benchmarks import timing
+from models import portfolio
+from services import portfolio_manager
+from services import position_manager
+from typing import List, Mapping
+
+_API_ROUTES = [
+    '/api/portfolios/',
+    '/api/portfolios/{portfolio_id}/',
+    '/api/portfolios/{portfolio_id}/position/',
+    '/api/portfolios/{portfolio_id}/summary/',
+    '/api/portfolios/{portfolio_id}/returns/',
+    '/api/portfolios/{portfolio_id}/operations/',
+    '/api/portfolios/{portfolio_id}/assets/{asset_code}/position/',
+]
+_UI_ROUTES = [
+    '/',
+    '/portfolios/{portfolio_id}/',
+    '/portfolios/{portfolio_id}/history/',
+    '/portfolios/{portfolio_id}/assets/{asset_code}/',
+]
+
+
+def benchmark_positions(managed_portfolio: portfolio.Portfolio,
+                        parameters: Mapping,
+                        repeat: int) -> List[Mapping]:
+  """Measures the position calculation of all assets per valuation method.
+
+  Args:
+    managed_portfolio: Portfolio for which to calculate positions.
+    parameters: Parameters of the portfolio, to report with the results.
+    repeat: Number of times to run each benchmark.
+
+  Returns:
+    Results of each valuation method which is implemented.
+  """
+  portfolio_assets = list(managed_portfolio.assets.values())
+
+  results = []
+  for valuation_method in position_manager.ValuationMethod:
+    try:
+      position_manager.get_position(portfolio_assets[0], valuation_method)
+    except NotImplementedError:
+      continue
+
+    results.append(timing.measure(
+        f'position.get_position.{valuation_method.name.lower()}',
+        lambda: [
+            position_manager.get_position(managed_asset, valuation_method)
+            for managed_asset in portfolio_assets
+        ],
+        repeat=repeat, parameters=parameters))
+
+  return results
+
+
+def benchmark_storage(managed_portfolio: portfolio.Portfolio,
+                      parameters: Mapping,
+                      repeat: int) -> List[Mapping]:
+  """Measures storing a portfolio and loading all stored portfolios.
+
+  Args:
+    managed_portfolio: Portfolio to store and load.
+    parameters: Parameters of the portfolio, to report with the results.
+    repeat: Number of times to run each benchmark.
+
+  Returns:
+    Results of storing and loading.
+  """
+  return [
+      timing.measure(
+          'portfolio_manager.store_portfolio',
+          lambda: portfolio_manager.store_portfolio(managed_portfolio),
+          repeat=repeat, parameters=parameters),
+      timing.measure(
+          'portfolio_manager.get_portfolios.load',
+          portfolio_manager.get_portfolios,
+          repeat=repeat, parameters=parameters,
+          # Forgets loaded portfolios, so all are loaded from files.
+          setup=lambda: portfolio_manager.set_storage_path(
+              portfolio_manager.get_storage_path())),
+  ]
+
+
+def benchmark_routes(managed_portfolio: portfolio.Portfolio,
+                     parameters: Mapping,
+                     repeat: int) -> List[Mapping]:
+  """Measures the latency of API and UI routes through a test client.
+
+  Routes are requested once before measuring, so results reflect requests
+  served after caches are warm.
+
+  Args:
+    managed_portfolio: Portfolio to request.
+    parameters: Parameters of the portfolio, to report with the results.
+    repeat: Number of times to request each route.
+
+  Returns:
+    Results of each route.
+  """
+  app_module = importlib.import_module('app')
+  client = app_module.app.test_client()
+  portfolio_manager.get_portfolios()[managed_portfolio.get_id()] = (
+      managed_portfolio)
+  route_values = {
+      'portfolio_id': managed_portfolio.get_id(),
+      'asset_code': next(iter(managed_portfolio.assets)),
+  }
+
+  results = []
+  for route in _API_ROUTES + _UI_ROUTES:
+    url = route.format(**route_values)
+    response = client.get(url)
+    if response.status_code != 200:
+      raise ValueError(f'{url} failed with {response.status_code}.')
+
+    results.append(timing.measure(
+        f'route.GET {route}', lambda: client.get(url),
+        repeat=repeat, parameters=parameters))
+
+  return results
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--assets', type=int, default=20)
+  parser.add_argument('--operations', type=int, default=200)
+  parser.add_argument('--buy-weight', type=float, default=0.6)
+  parser.add_argument('--sell-weight', type=float, default=0.3)
+  parser.add_argument('--dividend-weight', type=float, default=0.1)
+  parser.add_argument('--back-dated-ratio', type=float, default=0.1)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--repeat', type=int, default=10)
+  parser.add_argument('--output', help='File where to write JSON results.')
+  args = parser.parse_args()
+
+  # Keep background refreshes and network calls out of the measurements.
+  os.environ.setdefault('FINANCE_TRACKER_REFRESH_INTERVAL', '0')
+  os.environ.setdefault('FINANCE_TRACKER_MARKET_DATA_PROVIDER', 'fake')
+
+  parameters = {
+      'assets': args.assets,
+      'operations_per_asset': args.operations,
+      'buy_weight': args.buy_weight,
+      'sell_weight': args.sell_weight,
+      'dividend_weight': args.dividend_weight,
+      'back_dated_ratio': args.back_dated_ratio,
+      'seed': args.seed,
+  }
+  managed_portfolio = portfolio_generator.get_portfolio(
+      args.assets, args.operations, args.buy_weight, args.sell_weight,
+      args.dividend_weight, args.back_dated_ratio, args.seed)
+
+  with tempfile.TemporaryDirectory() as storage_path:
+    # Benchmark portfolios are stored apart from real portfolios.
+    portfolio_manager.set_storage_path(storage_path)
+
+    results = (
+        benchmark_positions(managed_portfolio, parameters, args.repeat) +
+        benchmark_storage(managed_portfolio, parameters, args.repeat) +
+        benchmark_routes(managed_portfolio, parameters, args.repeat))
+
+  benchmark_report = json.dumps({
+      'created_timestamp': datetime.datetime.now().timestamp(),
+      'python': sys.version.split()[0],
+      'platform': platform.platform(),
+      'results': results,
+  }, indent=2)
+
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      output_file.write(benchmark_report)
+  else:
+    print(benchmark_report)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,43 @@
+"""Measures how long code takes to run, for benchmarks."""
+
+import statistics
+import time
+from typing import Any, Callable, Mapping, Optional, Text
+
+
+def measure(benchmark_name: Text,
+            benchmark: Callable[[], Any],
+            repeat: int = 5,
+            parameters: Optional[Mapping] = None,
+            setup: Optional[Callable[[], Any]] = None) -> Mapping:
+  """Runs a benchmark many times and summarizes how long it took.
+
+  Args:
+    benchmark_name: Name under which results are reported.
+    benchmark: Code to measure.
+    repeat: Number of times to run the benchmark.
+    parameters: Parameters of the benchmark, to report with the results.
+    setup: Code to run before each run, which is not measured.
+
+  Returns:
+    Machine-readable results, in milliseconds.
+  """
+  durations = []
+  for _ in range(repeat):
+    if setup:
+      setup()
+    start_time = time.perf_counter()
+    benchmark()
+    durations.append((time.perf_counter() - start_time) * 1000)
+
+  durations.sort()
+  return {
+      'benchmark': benchmark_name,
+      'parameters': dict(parameters or {}),
+      'repeat': repeat,
+      'min_ms': durations[0],
+      'median_ms': statistics.median(durations),
+      'mean_ms': statistics.mean(durations),
+      'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+      'max_ms': durations[-1],
+  }
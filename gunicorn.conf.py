@@ -0,0 +1,30 @@
+"""Gunicorn settings to serve Finance Tracker on all cores.
+
+Run from the repository root:
+  gunicorn wsgi:app
+
+Each worker process serves requests with several threads. Workers are forked
+after the app and portfolios are loaded, and reload portfolios stored by other
+workers on their next request. With FINANCE_TRACKER_PRELOAD_PORTFOLIOS=0, each
+worker loads portfolios in the background instead. Send SIGHUP to the server
+to replace workers gracefully, e.g. after changing these settings; app code
+changes need a restart, as the app is loaded only once.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('FINANCE_TRACKER_BIND', '0.0.0.0:99')
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+workers = int(os.environ.get(
+    'FINANCE_TRACKER_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('FINANCE_TRACKER_THREADS', 4))
+preload_app = True
+
+timeout = 60
+graceful_timeout = 30
+# Replaces workers from time to time, so caches do not grow forever.
+max_requests = 10000
+max_requests_jitter = 1000
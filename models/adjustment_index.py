@@ -0,0 +1,108 @@
+import bisect
+import fractions
+from typing import Iterable, List, Tuple
+
+Factor = fractions.Fraction
+# POSIX timestamp, quantity factor and price factor of a corporate action.
+Adjustment = Tuple[float, Factor, Factor]
+
+# Factors of dates not adjusted by any action.
+_NO_FACTORS = (Factor(1), Factor(1))
+
+
+class AdjustmentIndex(object):
+  """Represents the cumulative adjustments of corporate actions over time.
+
+  Actions are sorted by date, each with the product of its factors and those
+  of all earlier actions, so the adjustment of any date is found in
+  O(log n). Factors are fractions, so a split followed by its reverse split
+  gives back the exact units.
+  """
+
+  def __init__(self, adjustments: Iterable[Adjustment] = ()):
+    """Instantiates an adjustment index.
+
+    Args:
+      adjustments: Date and factors of each corporate action.
+    """
+    self._timestamps = []
+    # Products of factors of each action and all earlier actions.
+    self._quantity_factors = []
+    self._price_factors = []
+
+    quantity_factor = Factor(1)
+    price_factor = Factor(1)
+    for timestamp, action_quantity_factor, action_price_factor in sorted(
+            adjustments):
+      quantity_factor *= action_quantity_factor
+      price_factor *= action_price_factor
+      self._timestamps.append(timestamp)
+      self._quantity_factors.append(quantity_factor)
+      self._price_factors.append(price_factor)
+
+  def __len__(self):
+    """Returns number of corporate actions."""
+    return len(self._timestamps)
+
+  def get_factors(self, timestamp: float) -> Tuple[Factor, Factor]:
+    """Gets the factors adjusting a date to the units after all actions.
+
+    Args:
+      timestamp: POSIX timestamp to adjust.
+
+    Returns:
+      Products of the quantity and price factors of actions after the date.
+    """
+    action_count = bisect.bisect_right(self._timestamps, timestamp)
+    if action_count == len(self._timestamps):
+      return _NO_FACTORS
+    if not action_count:
+      return (self._quantity_factors[-1], self._price_factors[-1])
+
+    return (
+        self._quantity_factors[-1] / self._quantity_factors[action_count - 1],
+        self._price_factors[-1] / self._price_factors[action_count - 1])
+
+  def get_price_factors(self, timestamps: Iterable[float]) -> List[Factor]:
+    """Gets the factors adjusting the prices of many dates after all actions.
+
+    Args:
+      timestamps: POSIX timestamps to adjust.
+
+    Returns:
+      Product of the price factors of actions after each date.
+    """
+    if not self._timestamps:
+      return [Factor(1) for _ in timestamps]
+
+    # Factors of actions after each number of actions, so each date only
+    # needs a search.
+    remaining_factors = [
+        self._price_factors[-1] / price_factor
+        for price_factor in [Factor(1)] + self._price_factors
+    ]
+    return [
+        remaining_factors[bisect.bisect_right(self._timestamps, timestamp)]
+        for timestamp in timestamps
+    ]
+
+  def get_initial_quantity_factor(self, timestamp: float) -> Factor:
+    """Gets the factor adjusting a date to the units before all actions.
+
+    Units adjusted this way do not change when actions are added after the
+    date.
+
+    Args:
+      timestamp: POSIX timestamp to adjust.
+
+    Returns:
+      Inverse of the product of quantity factors of actions up to the date.
+    """
+    action_count = bisect.bisect_right(self._timestamps, timestamp)
+    if not action_count:
+      return Factor(1)
+    return 1 / self._quantity_factors[action_count - 1]
+
+  def is_adjusted(self, timestamp: float) -> bool:
+    """Returns whether any action happened after the date."""
+    return bool(self._timestamps) and timestamp < self._timestamps[-1]
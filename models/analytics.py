@@ -0,0 +1,115 @@
+import datetime
+import json
+import math
+from models import asset
+from typing import Mapping, Optional, Sequence, Text
+
+
+def _get_json_number(number: Optional[float]) -> Optional[float]:
+  """Gets a number which can be represented in JSON, or None if undefined."""
+  if number is None or math.isnan(number):
+    return None
+  return number
+
+
+class AssetAnalytics(object):
+  """Represents the performance of the price of an asset over a window."""
+
+  def __init__(self,
+               managed_asset: asset.Asset,
+               window_return: Optional[float] = None,
+               best_rolling_return: Optional[float] = None,
+               worst_rolling_return: Optional[float] = None,
+               volatility: Optional[float] = None,
+               max_drawdown: Optional[float] = None):
+    """Instantiates asset analytics.
+
+    Values are None when the asset has no price history.
+
+    Args:
+      managed_asset: Asset whose price is analyzed.
+      window_return: Return of the price over the latest window.
+      best_rolling_return: Highest return over any window of the history.
+      worst_rolling_return: Lowest return over any window of the history.
+      volatility: Yearly standard deviation of daily log returns over the
+          latest window.
+      max_drawdown: Largest fall of the price from a previous high over the
+          latest window, as a positive fraction.
+    """
+    self.asset = managed_asset
+    self.window_return = window_return
+    self.best_rolling_return = best_rolling_return
+    self.worst_rolling_return = worst_rolling_return
+    self.volatility = volatility
+    self.max_drawdown = max_drawdown
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of AssetAnalytics."""
+    return {
+        'asset': self.asset.get_id(),
+        'window_return': _get_json_number(self.window_return),
+        'best_rolling_return': _get_json_number(self.best_rolling_return),
+        'worst_rolling_return': _get_json_number(self.worst_rolling_return),
+        'volatility': _get_json_number(self.volatility),
+        'max_drawdown': _get_json_number(self.max_drawdown),
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of AssetAnalytics."""
+    return json.dumps(self.to_dict())
+
+
+class PortfolioAnalytics(object):
+  """Represents the performance of the prices of all assets in a portfolio."""
+
+  def __init__(self,
+               window_days: int,
+               start_date: Optional[datetime.date],
+               end_date: Optional[datetime.date],
+               assets_analytics: Mapping[asset.Asset, AssetAnalytics],
+               correlated_assets: Sequence[asset.Asset],
+               correlations: Sequence[Sequence[float]]):
+    """Instantiates portfolio analytics.
+
+    Args:
+      window_days: Number of daily prices in each window.
+      start_date: First date of the price history used.
+      end_date: Last date of the price history used.
+      assets_analytics: Analytics of each asset in the portfolio.
+      correlated_assets: Assets with price history, in correlations order.
+      correlations: Correlation of the daily returns of each pair of
+          correlated assets over the latest window.
+    """
+    self.window_days = window_days
+    self.start_date = start_date
+    self.end_date = end_date
+    self.assets_analytics = assets_analytics
+    self.correlated_assets = correlated_assets
+    self.correlations = correlations
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of PortfolioAnalytics."""
+    return {
+        'window_days': self.window_days,
+        'start_date': self.start_date.isoformat() if self.start_date else None,
+        'end_date': self.end_date.isoformat() if self.end_date else None,
+        'assets': {
+            managed_asset.get_id(): asset_analytics.to_dict()
+            for managed_asset, asset_analytics in (
+                self.assets_analytics.items())
+        },
+        'correlations': {
+            'assets': [
+                managed_asset.get_id()
+                for managed_asset in self.correlated_assets
+            ],
+            'matrix': [
+                [_get_json_number(correlation) for correlation in row]
+                for row in self.correlations
+            ],
+        },
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of PortfolioAnalytics."""
+    return json.dumps(self.to_dict())
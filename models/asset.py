@@ -1,5 +1,7 @@
 import json
 import uuid
+from models import adjustment_index
+from models import holdings_index
 from typing import Mapping, Optional, Text
 
 
@@ -19,6 +21,8 @@ class Asset(object):
       asset_currency: Currency of the asset.
     """
     self._id = asset_code
+    self._instance_id = str(uuid.uuid4())
+    self._version = 0
     self.tracker = self.get_tracker()
 
     self.name = asset_name
@@ -26,6 +30,18 @@ class Asset(object):
     self.currency = asset_currency
 
     self.operations = {}
+    # Running totals of operations by operation type and currency.
+    self.operation_totals = {}
+    # Sorted (POSIX timestamp, operation id) of operations by operation type.
+    self.operation_index = {}
+    # Ids of operations by their contents, to find duplicated operations.
+    self.operation_contents = {}
+    # Units held over time, to find operations selling more than held.
+    self.holdings_index = holdings_index.HoldingsIndex()
+    # Splits and other corporate actions by their ids.
+    self.corporate_actions = {}
+    # Cumulative factors of corporate actions, to adjust operations.
+    self.adjustment_index = adjustment_index.AdjustmentIndex()
     self.stats = None
 
   def __str__(self):
@@ -44,6 +60,22 @@ class Asset(object):
     """Gets asset id (asset code)."""
     return self._id
 
+  def get_instance_id(self) -> Text:
+    """Gets an id unique to this asset, even if its code is reused later."""
+    if not hasattr(self, '_instance_id'):
+      self._instance_id = str(uuid.uuid4())
+    return self._instance_id
+
+  def get_version(self) -> int:
+    """Returns asset version, which changes every time the asset changes."""
+    if not hasattr(self, '_version'):
+      self._version = 0
+    return self._version
+
+  def increment_version(self):
+    """Marks the asset as changed."""
+    self._version = self.get_version() + 1
+
   def get_tracker(self):
     """Gets the asset tracker code, which is used to obtain data."""
     if not hasattr(self, 'tracker') or not self.tracker:
@@ -0,0 +1,71 @@
+import json
+from typing import Mapping, Sequence, Text
+
+
+class ConsolidatedPosition(object):
+  """Represents the combined position of a tracker across portfolios."""
+
+  def __init__(self,
+               tracker: Text,
+               currency: Text,
+               portfolio_ids: Sequence[Text],
+               quantity: int,
+               market_value: float,
+               realized_pl: float,
+               realized_roi: float,
+               unrealized_pl: float,
+               unrealized_roi: float,
+               dividends: float,
+               cost_basis: float,
+               sold_cost_basis: float):
+    """Instantiates a consolidated position.
+
+    All values are expressed in the given currency.
+
+    Args:
+      tracker: Tracker of the assets whose positions are combined.
+      currency: Currency of the assets whose positions are combined.
+      portfolio_ids: Ids of the portfolios holding the tracker.
+      quantity: Quantity of the tracker held.
+      market_value: Current value of the positions.
+      realized_pl: Profit/Loss already realized.
+      realized_roi: ROI of already realized transactions.
+      unrealized_pl: Potential Profit/Loss.
+      unrealized_roi: Potential ROI of unrealized operations.
+      dividends: Total dividends received.
+      cost_basis: Cost of the units held.
+      sold_cost_basis: Cost of the units already sold.
+    """
+    self.tracker = tracker
+    self.currency = currency
+    self.portfolio_ids = portfolio_ids
+    self.quantity = quantity
+    self.market_value = market_value
+    self.realized_pl = realized_pl
+    self.realized_roi = realized_roi
+    self.unrealized_pl = unrealized_pl
+    self.unrealized_roi = unrealized_roi
+    self.dividends = dividends
+    self.cost_basis = cost_basis
+    self.sold_cost_basis = sold_cost_basis
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of ConsolidatedPosition."""
+    return {
+        'tracker': self.tracker,
+        'currency': self.currency,
+        'portfolios': list(self.portfolio_ids),
+        'quantity': self.quantity,
+        'market_value': self.market_value,
+        'realized_pl': self.realized_pl,
+        'realized_roi': self.realized_roi,
+        'unrealized_pl': self.unrealized_pl,
+        'unrealized_roi': self.unrealized_roi,
+        'dividends': self.dividends,
+        'cost_basis': self.cost_basis,
+        'sold_cost_basis': self.sold_cost_basis,
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of ConsolidatedPosition."""
+    return json.dumps(self.to_dict())
@@ -0,0 +1,71 @@
+import datetime
+import json
+import enum
+import uuid
+from models import asset
+from typing import Mapping, Text
+
+
+class CorporateActionType(enum.Enum):
+  """Types of supported corporate actions."""
+  SPLIT = 1  # Each unit becomes ratio units.
+  REVERSE_SPLIT = 2  # Each ratio units become one unit.
+  SPIN_OFF = 3  # Units keep ratio of their value, the rest is spun off.
+
+
+class CorporateAction(object):
+  """Represents a corporate action changing the units or value of an asset.
+
+  Operations before the action are not changed. Instead, they are adjusted
+  when positions and returns are calculated.
+  """
+
+  def __init__(
+          self, managed_asset: asset.Asset, timestamp: datetime.datetime,
+          action_type: CorporateActionType, ratio: float):
+    """Instantiates a corporate action.
+
+    Args:
+      managed_asset: Asset affected by the action.
+      timestamp: Date and time when action took effect. Operations at or
+          after it are already expressed in the new units.
+      action_type: Type of corporate action.
+      ratio: Units after a split for each unit before, units before a reverse
+          split for each unit after, or fraction of the value kept after a
+          spin-off.
+    """
+    self._id = str(uuid.uuid4())
+    self.managed_asset = managed_asset
+    self.timestamp = timestamp
+    self.action_type = action_type
+    self.ratio = ratio
+
+  def __str__(self):
+    """Converts corporate action to string."""
+    return (
+        'CorporateAction<'
+        f'id: {self._id}, '
+        f'asset: {self.managed_asset.get_id()}, '
+        f'timestamp: {self.timestamp}, '
+        f'action_type: {self.action_type}, '
+        f'ratio: {self.ratio}'
+        '>'
+    )
+
+  def get_id(self):
+    """Gets corporate action id."""
+    return self._id
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict represtation of CorporateAction."""
+    return {
+        'corporate_action_id': self._id,
+        'timestamp': datetime.datetime.timestamp(self.timestamp),
+        'asset': self.managed_asset.get_id(),
+        'action_type': self.action_type.value,
+        'ratio': self.ratio,
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of CorporateAction."""
+    return json.dumps(self.to_dict())
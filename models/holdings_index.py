@@ -0,0 +1,251 @@
+import math
+import random
+from typing import Hashable, List, Optional, Tuple
+
+
+class HoldingsIndex(object):
+  """Represents the quantity of an asset held over time.
+
+  Quantity changes are kept sorted by key (e.g. by date) in a treap. Each
+  node keeps the total change of its subtree and the lowest quantity held
+  within it, so the lowest quantity held from any key on is found, and
+  changes are added or removed, in O(log n).
+
+  Nodes are kept in lists rather than objects, so the index is stored
+  compactly with its asset.
+  """
+
+  def __init__(self):
+    """Instantiates an empty holdings index."""
+    self._root = -1
+    self._keys = []
+    self._priorities = []
+    self._lefts = []
+    self._rights = []
+    self._changes = []
+    # Total change of each subtree.
+    self._totals = []
+    # Lowest quantity held after each change of a subtree, starting from
+    # zero before its first change.
+    self._lowest = []
+    # Nodes of removed changes, to be reused.
+    self._free_nodes = []
+
+  def __len__(self):
+    """Returns number of quantity changes."""
+    return len(self._keys) - len(self._free_nodes)
+
+  def add(self, key: Hashable, change: int):
+    """Adds a change of the quantity held.
+
+    Args:
+      key: Key by which changes are sorted. Must be unique.
+      change: Quantity added (positive) or removed (negative).
+    """
+    node = self._get_new_node(key, change)
+    lower_root, upper_root = self._split(self._root, key)
+    self._root = self._merge(self._merge(lower_root, node), upper_root)
+
+  def remove(self, key: Hashable) -> bool:
+    """Removes a change of the quantity held.
+
+    Args:
+      key: Key of the change to remove.
+
+    Returns:
+      Whether a change was removed.
+    """
+    lower_root, upper_root = self._split(self._root, key)
+    node, upper_root = self._split(upper_root, key, inclusive=True)
+    if node != -1:
+      self._free_nodes.append(node)
+    self._root = self._merge(lower_root, upper_root)
+    return node != -1
+
+  def get_lowest_quantity(self, key: Hashable,
+                          end_key: Optional[Hashable] = None) -> float:
+    """Gets the lowest quantity held from just before a key on.
+
+    The index is only read, not split, so it can be queried while it is
+    read elsewhere.
+
+    Args:
+      key: Key from which to look for the lowest quantity.
+      end_key: Key before which to stop looking. None to look until the
+          last change.
+
+    Returns:
+      Lowest of the quantity held before the key and after each change from
+      the key on, and before the end key.
+    """
+    quantity_before = self._get_quantity_before(key)
+    return min(quantity_before, self._get_range_lowest(
+        self._root, key, end_key, 0, False, end_key is None))
+
+  def get_quantity(self) -> int:
+    """Gets the quantity held after all changes."""
+    return self._get_total(self._root)
+
+  def _get_quantity_before(self, key: Hashable) -> int:
+    """Gets the quantity held after all changes with keys lower than a key."""
+    quantity = 0
+    node = self._root
+    while node != -1:
+      if self._keys[node] < key:
+        quantity += self._get_total(self._lefts[node]) + self._changes[node]
+        node = self._rights[node]
+      else:
+        node = self._lefts[node]
+    return quantity
+
+  def _get_range_lowest(self, node: int, key: Hashable,
+                        end_key: Optional[Hashable], quantity_before: int,
+                        is_after_key: bool, is_before_end: bool) -> float:
+    """Gets the lowest quantity held after the changes of a key range.
+
+    Args:
+      node: Root of the subtree in which to look.
+      key: Lowest key of the changes to look at.
+      end_key: Key before which to stop looking. None for no limit.
+      quantity_before: Quantity held before the first change of the subtree.
+      is_after_key: Whether all keys of the subtree are known to be equal to
+          or higher than the key.
+      is_before_end: Whether all keys of the subtree are known to be lower
+          than the end key.
+
+    Returns:
+      Lowest quantity held after changes of the subtree within the range.
+      Infinite if there are none.
+    """
+    if node == -1:
+      return math.inf
+    if is_after_key and is_before_end:
+      return quantity_before + self._lowest[node]
+
+    node_key = self._keys[node]
+    left_node = self._lefts[node]
+    quantity = quantity_before + self._get_total(left_node)
+    lowest_quantity = math.inf
+
+    if not node_key <= key:
+      lowest_quantity = self._get_range_lowest(
+          left_node, key, end_key, quantity_before, is_after_key,
+          is_before_end or not end_key < node_key)
+
+    quantity += self._changes[node]
+    is_node_before_end = is_before_end or node_key < end_key
+    if not node_key < key and is_node_before_end:
+      lowest_quantity = min(lowest_quantity, quantity)
+
+    if is_node_before_end:
+      lowest_quantity = min(lowest_quantity, self._get_range_lowest(
+          self._rights[node], key, end_key, quantity,
+          is_after_key or not node_key < key, is_before_end))
+
+    return lowest_quantity
+
+  def _get_new_node(self, key: Hashable, change: int) -> int:
+    """Creates a node without children, reusing removed nodes.
+
+    Args:
+      key: Key of the change.
+      change: Quantity change.
+
+    Returns:
+      New node.
+    """
+    values = (key, random.random(), -1, -1, change, change, change)
+    if self._free_nodes:
+      node = self._free_nodes.pop()
+      for node_values, value in zip(self._get_node_lists(), values):
+        node_values[node] = value
+      return node
+
+    for node_values, value in zip(self._get_node_lists(), values):
+      node_values.append(value)
+    return len(self._keys) - 1
+
+  def _get_node_lists(self) -> Tuple[List, ...]:
+    """Gets the lists of node values, in the order nodes are created."""
+    return (self._keys, self._priorities, self._lefts, self._rights,
+            self._changes, self._totals, self._lowest)
+
+  def _split(self, node: int, key: Hashable,
+             inclusive: bool = False) -> Tuple[int, int]:
+    """Splits a subtree by key.
+
+    Args:
+      node: Root of the subtree.
+      key: Key by which to split.
+      inclusive: Whether the key goes to the lower subtree.
+
+    Returns:
+      Roots of the subtrees with keys lower than (or equal to, if inclusive)
+      the key, and with the rest of keys.
+    """
+    if node == -1:
+      return (-1, -1)
+
+    node_key = self._keys[node]
+    if node_key < key or (inclusive and node_key == key):
+      lower_root, upper_root = self._split(
+          self._rights[node], key, inclusive)
+      self._rights[node] = lower_root
+      self._update(node)
+      return (node, upper_root)
+
+    lower_root, upper_root = self._split(self._lefts[node], key, inclusive)
+    self._lefts[node] = upper_root
+    self._update(node)
+    return (lower_root, node)
+
+  def _merge(self, lower_node: int, upper_node: int) -> int:
+    """Merges two subtrees, all keys of the first lower than the second.
+
+    Args:
+      lower_node: Root of the subtree with lower keys.
+      upper_node: Root of the subtree with upper keys.
+
+    Returns:
+      Root of the merged subtree.
+    """
+    if lower_node == -1:
+      return upper_node
+    if upper_node == -1:
+      return lower_node
+
+    if self._priorities[lower_node] > self._priorities[upper_node]:
+      self._rights[lower_node] = self._merge(
+          self._rights[lower_node], upper_node)
+      self._update(lower_node)
+      return lower_node
+
+    self._lefts[upper_node] = self._merge(lower_node, self._lefts[upper_node])
+    self._update(upper_node)
+    return upper_node
+
+  def _update(self, node: int):
+    """Updates the total and lowest quantity of a node from its children."""
+    # Called on every node of every split and merge, so children are looked
+    # up in place.
+    totals = self._totals
+    lowest = self._lowest
+    left_node = self._lefts[node]
+    right_node = self._rights[node]
+
+    quantity = self._changes[node]
+    lowest_quantity = quantity
+    if left_node != -1:
+      lowest_quantity = min(lowest[left_node], totals[left_node] + quantity)
+      quantity += totals[left_node]
+    total = quantity
+    if right_node != -1:
+      lowest_quantity = min(lowest_quantity, quantity + lowest[right_node])
+      total += totals[right_node]
+
+    totals[node] = total
+    lowest[node] = lowest_quantity
+
+  def _get_total(self, node: int) -> int:
+    """Gets the total change of a subtree. Zero if empty."""
+    return self._totals[node] if node != -1 else 0
@@ -0,0 +1,76 @@
+import datetime
+import enum
+import json
+import uuid
+from typing import Mapping, Optional, Text
+
+
+class JobStatus(enum.Enum):
+  """Stages of a background job."""
+  PENDING = 1
+  RUNNING = 2
+  SUCCEEDED = 3
+  FAILED = 4
+
+
+class Job(object):
+  """Represents work requested to run in the background."""
+
+  def __init__(self, job_type: Text, portfolio_id: Optional[Text] = None,
+               asset_id: Optional[Text] = None):
+    """Instantiates a pending job.
+
+    Args:
+      job_type: Name of the work to do.
+      portfolio_id: Id of the portfolio on which job works, if any.
+      asset_id: Id of the asset on which job works, if any.
+    """
+    self._id = str(uuid.uuid4())
+    self.job_type = job_type
+    self.portfolio_id = portfolio_id
+    self.asset_id = asset_id
+    self.status = JobStatus.PENDING
+    self.error = None
+    self.created_at = datetime.datetime.now()
+    self.started_at = None
+    self.finished_at = None
+
+  def __str__(self):
+    """Converts job to string."""
+    return (
+        'Job<'
+        f'id: {self._id}, '
+        f'job_type: {self.job_type}, '
+        f'status: {self.status}'
+        '>'
+    )
+
+  def get_id(self) -> Text:
+    """Gets job id."""
+    return self._id
+
+  def is_finished(self) -> bool:
+    """Returns whether job is not going to run anymore."""
+    return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of Job."""
+    return {
+        'job_id': self._id,
+        'job_type': self.job_type,
+        'portfolio_id': self.portfolio_id,
+        'asset_id': self.asset_id,
+        'status': self.status.name,
+        'error': self.error,
+        'created_timestamp': datetime.datetime.timestamp(self.created_at),
+        'started_timestamp': (
+            datetime.datetime.timestamp(self.started_at)
+            if self.started_at else None),
+        'finished_timestamp': (
+            datetime.datetime.timestamp(self.finished_at)
+            if self.finished_at else None),
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of Job."""
+    return json.dumps(self.to_dict())
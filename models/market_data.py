@@ -0,0 +1,53 @@
+import datetime
+import json
+from typing import Any, Mapping, Optional, Sequence, Text, Tuple
+
+StatsTable = Sequence[Tuple[Text, Any]]
+
+
+class MarketData(object):
+  """Represents market data fetched for a tracker at a point in time."""
+
+  def __init__(self,
+               tracker: Text,
+               price: Optional[float] = None,
+               stats_table: Optional[StatsTable] = None,
+               timestamp: Optional[datetime.datetime] = None):
+    """Instantiates market data.
+
+    Args:
+      tracker: Tracker code for which data was fetched.
+      price: Live price. None if it could not be fetched.
+      stats_table: Rows of (attribute name, raw value) with fundamentals.
+          None if they could not be fetched.
+      timestamp: Date and time when data was fetched. Defaults to now.
+    """
+    self.tracker = tracker
+    self.price = price
+    self.stats_table = stats_table
+    self.timestamp = timestamp or datetime.datetime.now()
+
+  def __str__(self):
+    """Converts market data to string."""
+    return (
+        'MarketData<'
+        f'tracker: {self.tracker}, '
+        f'price: {self.price}, '
+        f'timestamp: {self.timestamp}'
+        '>'
+    )
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of MarketData."""
+    return {
+        'tracker': self.tracker,
+        'price': self.price,
+        'stats_table': (
+            [[attribute, str(value)] for attribute, value in self.stats_table]
+            if self.stats_table is not None else None),
+        'timestamp': datetime.datetime.timestamp(self.timestamp),
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of MarketData."""
+    return json.dumps(self.to_dict())
@@ -0,0 +1,46 @@
+import datetime
+import json
+from typing import Mapping, Optional, Text
+
+
+class OperationTotals(object):
+  """Represents running totals of an asset operations of one type."""
+
+  def __init__(self,
+               quantity: int = 0,
+               value: float = 0.0,
+               count: int = 0,
+               first_timestamp: Optional[datetime.datetime] = None,
+               last_timestamp: Optional[datetime.datetime] = None):
+    """Instantiates operation totals.
+
+    Args:
+      quantity: Total quantity of the operations.
+      value: Total value of the operations (quantity * price per unit).
+      count: Number of operations.
+      first_timestamp: Date and time of the earliest operation.
+      last_timestamp: Date and time of the latest operation.
+    """
+    self.quantity = quantity
+    self.value = value
+    self.count = count
+    self.first_timestamp = first_timestamp
+    self.last_timestamp = last_timestamp
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of OperationTotals."""
+    return {
+        'quantity': self.quantity,
+        'value': self.value,
+        'count': self.count,
+        'first_timestamp': (
+            datetime.datetime.timestamp(self.first_timestamp)
+            if self.first_timestamp else None),
+        'last_timestamp': (
+            datetime.datetime.timestamp(self.last_timestamp)
+            if self.last_timestamp else None),
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of OperationTotals."""
+    return json.dumps(self.to_dict())
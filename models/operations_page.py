@@ -0,0 +1,33 @@
+import json
+from models import operation
+from typing import Mapping, Optional, Sequence, Text
+
+
+class OperationsPage(object):
+  """Represents a page of operations matching a query."""
+
+  def __init__(self,
+               operations: Sequence[operation.Operation],
+               next_cursor: Optional[Text] = None):
+    """Instantiates a page of operations.
+
+    Args:
+      operations: Operations in the page, in requested order.
+      next_cursor: Cursor from which to continue to the next page. None if
+          this is the last page.
+    """
+    self.operations = operations
+    self.next_cursor = next_cursor
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of OperationsPage."""
+    return {
+        'operations': [
+            page_operation.to_dict() for page_operation in self.operations
+        ],
+        'next_cursor': self.next_cursor,
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of OperationsPage."""
+    return json.dumps(self.to_dict())
@@ -1,3 +1,4 @@
+import collections
 import json
 import uuid
 from typing import Mapping, Optional, Sequence, Text
@@ -17,7 +18,10 @@ class Portfolio(object):
       portfolio_currency: Currency in which portfolio operates.
     """
     self._id = str(uuid.uuid4())
+    self._version = 0
     self.assets = {}
+    # Operations created with an idempotency key, oldest first.
+    self.idempotent_operations = collections.OrderedDict()
 
     self.name = portfolio_name
     self.currency = portfolio_currency
@@ -30,6 +34,16 @@ class Portfolio(object):
     """Returns portfolio id."""
     return self._id
 
+  def get_version(self) -> int:
+    """Returns portfolio version, which changes every time it is stored."""
+    if not hasattr(self, '_version'):
+      self._version = 0
+    return self._version
+
+  def increment_version(self):
+    """Marks the portfolio as changed."""
+    self._version = self.get_version() + 1
+
   def get_name(self) -> Text:
     """Returns portfolio name."""
     return f'{self.name} ({self._id})'
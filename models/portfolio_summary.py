@@ -0,0 +1,70 @@
+import json
+from models import asset
+from models import portfolio
+from typing import Mapping, Text
+
+
+class PortfolioSummary(object):
+  """Represents aggregated totals of all positions in a portfolio."""
+
+  def __init__(self,
+               managed_portfolio: portfolio.Portfolio,
+               market_value: float,
+               realized_pl: float,
+               realized_roi: float,
+               unrealized_pl: float,
+               unrealized_roi: float,
+               dividends: float,
+               total_pl: float,
+               total_roi: float,
+               allocation: Mapping[asset.Asset, float]):
+    """Instantiates a portfolio summary.
+
+    All values are expressed in the portfolio currency.
+
+    Args:
+      managed_portfolio: Portfolio whose positions are summarized.
+      market_value: Current value of all positions.
+      realized_pl: Profit/Loss already realized.
+      realized_roi: ROI of already realized transactions.
+      unrealized_pl: Potential Profit/Loss of current positions.
+      unrealized_roi: Potential ROI of current positions.
+      dividends: Total dividends received.
+      total_pl: Realized and unrealized Profit/Loss plus dividends.
+      total_roi: Total Profit/Loss over the cost of all units bought.
+      allocation: Weight of each asset over the total market value.
+    """
+    self.portfolio = managed_portfolio
+    self.currency = managed_portfolio.currency
+    self.market_value = market_value
+    self.realized_pl = realized_pl
+    self.realized_roi = realized_roi
+    self.unrealized_pl = unrealized_pl
+    self.unrealized_roi = unrealized_roi
+    self.dividends = dividends
+    self.total_pl = total_pl
+    self.total_roi = total_roi
+    self.allocation = allocation
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of PortfolioSummary."""
+    return {
+        'portfolio': self.portfolio.get_id(),
+        'currency': self.currency,
+        'market_value': self.market_value,
+        'realized_pl': self.realized_pl,
+        'realized_roi': self.realized_roi,
+        'unrealized_pl': self.unrealized_pl,
+        'unrealized_roi': self.unrealized_roi,
+        'dividends': self.dividends,
+        'total_pl': self.total_pl,
+        'total_roi': self.total_roi,
+        'allocation': {
+            managed_asset.get_id(): weight
+            for managed_asset, weight in self.allocation.items()
+        },
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of PortfolioSummary."""
+    return json.dumps(self.to_dict())
@@ -2,7 +2,7 @@ import json
 from models import asset
 from models import operation
 from models import portfolio
-from typing import Mapping, Text
+from typing import Mapping, Sequence, Text
 
 
 class Position(object):
@@ -19,7 +19,10 @@ class Position(object):
                opportunity_pl: float,
                opportunity_roi: float,
                dividends: float,
-               dividend_yield: float):
+               dividend_yield: float,
+               cost_basis: float = 0.0,
+               sold_cost_basis: float = 0.0,
+               unconverted_currencies: Sequence[Text] = ()):
     """Instantiates an asset position.
 
     Args:
@@ -34,6 +37,10 @@ class Position(object):
       opportunity_roi: Potential ROI if you didn't sell.
       dividends: Total dividends received.
       dividend_yield: Average dividend yield received.
+      cost_basis: Cost of the units held.
+      sold_cost_basis: Cost of the units already sold.
+      unconverted_currencies: Currencies of operations whose prices could
+          not be converted to the asset currency, so values mix them.
     """
     self.asset = managed_asset
     self.quantity = quantity
@@ -46,6 +53,9 @@ class Position(object):
     self.opportunity_roi = opportunity_roi
     self.dividends = dividends
     self.dividend_yield = dividend_yield
+    self.cost_basis = cost_basis
+    self.sold_cost_basis = sold_cost_basis
+    self.unconverted_currencies = list(unconverted_currencies)
 
   def to_dict(self) -> Mapping:
     """Returns Dict representation of Position."""
@@ -59,6 +69,9 @@ class Position(object):
         'unrealized_roi': self.unrealized_roi,
         'dividends': self.dividends,
         'dividend_yield': self.dividend_yield,
+        'cost_basis': self.cost_basis,
+        'sold_cost_basis': self.sold_cost_basis,
+        'unconverted_currencies': self.unconverted_currencies,
     }
 
   def to_json(self) -> Text:
@@ -0,0 +1,47 @@
+import datetime
+import json
+from typing import Mapping, Optional, Text
+
+
+class Returns(object):
+  """Represents time-weighted and money-weighted returns of an investment."""
+
+  def __init__(self,
+               time_weighted_return: Optional[float],
+               annualized_time_weighted_return: Optional[float],
+               internal_rate_of_return: Optional[float],
+               start_date: Optional[datetime.datetime],
+               end_date: Optional[datetime.datetime]):
+    """Instantiates investment returns.
+
+    Args:
+      time_weighted_return: Cumulative time-weighted return (TWR).
+      annualized_time_weighted_return: TWR expressed as a yearly rate.
+      internal_rate_of_return: Money-weighted return as a yearly rate (XIRR).
+      start_date: Date of the first operation considered.
+      end_date: Date at which the investment was valued.
+    """
+    self.time_weighted_return = time_weighted_return
+    self.annualized_time_weighted_return = annualized_time_weighted_return
+    self.internal_rate_of_return = internal_rate_of_return
+    self.start_date = start_date
+    self.end_date = end_date
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of Returns."""
+    return {
+        'time_weighted_return': self.time_weighted_return,
+        'annualized_time_weighted_return': (
+            self.annualized_time_weighted_return),
+        'internal_rate_of_return': self.internal_rate_of_return,
+        'start_timestamp': (
+            datetime.datetime.timestamp(self.start_date)
+            if self.start_date else None),
+        'end_timestamp': (
+            datetime.datetime.timestamp(self.end_date)
+            if self.end_date else None),
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of Returns."""
+    return json.dumps(self.to_dict())
@@ -0,0 +1,75 @@
+import datetime
+import json
+from typing import Mapping, Optional, Sequence, Text
+
+
+class Risk(object):
+  """Represents the potential losses of a portfolio over a horizon."""
+
+  def __init__(self,
+               currency: Text,
+               market_value: float,
+               confidence: float,
+               horizon_days: int,
+               scenarios: int,
+               historical_var: float,
+               historical_es: float,
+               parametric_var: float,
+               parametric_es: float,
+               start_date: Optional[datetime.date],
+               end_date: Optional[datetime.date],
+               unmodeled_trackers: Sequence[Text]):
+    """Instantiates portfolio risk.
+
+    All values are expressed in the given currency, as positive losses.
+
+    Args:
+      currency: Currency of the values.
+      market_value: Current value of the positions modeled.
+      confidence: Probability of losses not exceeding the value at risk.
+      horizon_days: Number of days over which losses are estimated.
+      scenarios: Number of simulated scenarios.
+      historical_var: Value at risk of scenarios drawn from past returns.
+      historical_es: Expected shortfall (average loss beyond the value at
+          risk) of scenarios drawn from past returns.
+      parametric_var: Value at risk of scenarios drawn from a normal
+          distribution fitted to past returns.
+      parametric_es: Expected shortfall of normally distributed scenarios.
+      start_date: First date of the price history used.
+      end_date: Last date of the price history used.
+      unmodeled_trackers: Trackers held without a price history, which are
+          left out.
+    """
+    self.currency = currency
+    self.market_value = market_value
+    self.confidence = confidence
+    self.horizon_days = horizon_days
+    self.scenarios = scenarios
+    self.historical_var = historical_var
+    self.historical_es = historical_es
+    self.parametric_var = parametric_var
+    self.parametric_es = parametric_es
+    self.start_date = start_date
+    self.end_date = end_date
+    self.unmodeled_trackers = unmodeled_trackers
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of Risk."""
+    return {
+        'currency': self.currency,
+        'market_value': self.market_value,
+        'confidence': self.confidence,
+        'horizon_days': self.horizon_days,
+        'scenarios': self.scenarios,
+        'historical_var': self.historical_var,
+        'historical_es': self.historical_es,
+        'parametric_var': self.parametric_var,
+        'parametric_es': self.parametric_es,
+        'start_date': self.start_date.isoformat() if self.start_date else None,
+        'end_date': self.end_date.isoformat() if self.end_date else None,
+        'unmodeled_trackers': list(self.unmodeled_trackers),
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of Risk."""
+    return json.dumps(self.to_dict())
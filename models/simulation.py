@@ -0,0 +1,50 @@
+import json
+from models import asset
+from models import operation
+from models import position
+from typing import Mapping, Sequence, Text
+
+
+class Simulation(object):
+  """Represents positions of an asset before and after hypothetical trades."""
+
+  def __init__(self,
+               managed_asset: asset.Asset,
+               operations: Sequence[operation.Operation],
+               current_positions: Mapping[Text, position.Position],
+               simulated_positions: Mapping[Text, position.Position]):
+    """Instantiates a simulation.
+
+    Args:
+      managed_asset: Asset on which operations were simulated.
+      operations: Hypothetical operations, which were not added.
+      current_positions: Positions of the asset by valuation method name.
+      simulated_positions: Positions of the asset with the operations, by
+          valuation method name.
+    """
+    self.asset = managed_asset
+    self.operations = operations
+    self.current_positions = current_positions
+    self.simulated_positions = simulated_positions
+
+  def to_dict(self) -> Mapping:
+    """Returns Dict representation of Simulation."""
+    return {
+        'asset': self.asset.get_id(),
+        'operations': [
+            simulated_operation.to_dict()
+            for simulated_operation in self.operations
+        ],
+        'positions': {
+            valuation_method: {
+                'current': self.current_positions[valuation_method].to_dict(),
+                'simulated': simulated_position.to_dict(),
+            }
+            for valuation_method, simulated_position in (
+                self.simulated_positions.items())
+        },
+    }
+
+  def to_json(self) -> Text:
+    """Returns JSON representation of Simulation."""
+    return json.dumps(self.to_dict())
@@ -0,0 +1,59 @@
+"""Admin routes to diagnose a running Finance Tracker."""
+
+import flask
+from services import profiler_manager
+
+admin_routes = flask.Blueprint('admin', __name__)
+
+_CPROFILE_PROFILER = 'cprofile'
+_SAMPLING_PROFILER = 'sampling'
+
+
+@admin_routes.before_request
+def check_profiler_enabled():
+  if not profiler_manager.is_enabled():
+    flask.abort(404)
+
+
+@admin_routes.route('/admin/profile/', methods=['GET'])
+def profile_process():
+  try:
+    seconds = float(flask.request.args.get('seconds', 5))
+    interval = float(flask.request.args.get('interval', 0.005))
+    stack_counts = profiler_manager.sample_process(seconds, interval)
+  except ValueError as error:
+    flask.abort(400, str(error))
+
+  return flask.Response(
+      profiler_manager.format_collapsed_stacks(stack_counts),
+      mimetype='text/plain')
+
+
+@admin_routes.route('/admin/profile/request/', methods=['GET'])
+def profile_request():
+  path = flask.request.args.get('path')
+  if not path or not path.startswith('/'):
+    flask.abort(400, 'Missing path of the GET request to profile.')
+
+  profiler = flask.request.args.get('profiler', _SAMPLING_PROFILER)
+  client = flask.current_app.test_client()
+
+  if profiler == _CPROFILE_PROFILER:
+    sort_key = flask.request.args.get('sort', 'cumulative')
+    try:
+      _, profile_text = profiler_manager.profile_function(
+          lambda: client.get(path), sort_key)
+    except ValueError as error:
+      flask.abort(400, str(error))
+  elif profiler == _SAMPLING_PROFILER:
+    try:
+      interval = float(flask.request.args.get('interval', 0.001))
+      _, stack_counts = profiler_manager.sample_function(
+          lambda: client.get(path), interval)
+    except ValueError as error:
+      flask.abort(400, str(error))
+    profile_text = profiler_manager.format_collapsed_stacks(stack_counts)
+  else:
+    flask.abort(400, f'Unknown profiler {profiler}.')
+
+  return flask.Response(profile_text, mimetype='text/plain')
@@ -3,14 +3,51 @@
 import datetime
 import flask
 
+from services import analytics_manager
 from services import asset_manager
+from services import consolidation_manager
+from services import corporate_action_manager
+from services import currency_manager
 from services import operation_manager
 from services import portfolio_manager
 from services import position_manager
+from services import price_history_manager
+from services import returns_manager
+from services import risk_manager
+from services import scheduler_manager
+from services import simulation_manager
 from services import stats_manager
 
 api_routes = flask.Blueprint('api', __name__)
 
+# Prefer header value requesting a job instead of waiting for the work.
+_RESPOND_ASYNC_PREFERENCE = 'respond-async'
+
+
+@api_routes.errorhandler(portfolio_manager.StalePortfolioError)
+def handle_stale_portfolio(error):
+  return {'error': str(error)}, 409
+
+
+@api_routes.errorhandler(asset_manager.DuplicateOperationError)
+def handle_duplicate_operation(error):
+  return {'error': str(error)}, 409
+
+
+@api_routes.errorhandler(asset_manager.OversellError)
+def handle_oversell(error):
+  return {'error': str(error)}, 400
+
+
+@api_routes.errorhandler(currency_manager.ExchangeRateError)
+def handle_missing_exchange_rate(error):
+  return {'error': str(error)}, 400
+
+
+@api_routes.errorhandler(operation_manager.IdempotencyKeyError)
+def handle_reused_idempotency_key(error):
+  return {'error': str(error)}, 422
+
 
 @api_routes.route('/api/portfolios/', methods=['GET'])
 def get_portfolios():
@@ -29,6 +66,27 @@ def create_portfolio():
   return new_portfolio.to_dict()
 
 
+@api_routes.route('/api/positions/', methods=['GET'])
+def get_consolidated_positions():
+  portfolios = portfolio_manager.get_portfolios()
+  portfolio_ids = flask.request.args.get('portfolios')
+  if portfolio_ids:
+    portfolio_ids = portfolio_ids.split(',')
+  else:
+    portfolio_ids = list(portfolios)
+
+  unknown_portfolio_ids = set(portfolio_ids) - set(portfolios)
+  if unknown_portfolio_ids:
+    flask.abort(404, f'Unknown portfolios: {sorted(unknown_portfolio_ids)}')
+
+  consolidated_positions = consolidation_manager.get_consolidated_positions(
+      [portfolios[portfolio_id] for portfolio_id in set(portfolio_ids)])
+  return flask.jsonify([
+      consolidated_position.to_dict()
+      for consolidated_position in consolidated_positions
+  ])
+
+
 @api_routes.route('/api/portfolios/<portfolio_id>/', methods=['GET'])
 def get_portfolio(portfolio_id):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
@@ -96,16 +154,85 @@ def get_portfolio_balance(portfolio_id):
   return portfolio_position_list
 
 
+@api_routes.route('/api/portfolios/<portfolio_id>/summary/', methods=['GET'])
+def get_portfolio_summary(portfolio_id):
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  summary = position_manager.get_portfolio_summary(managed_portfolio)
+  return summary.to_dict()
+
+
+@api_routes.route('/api/portfolios/<portfolio_id>/returns/', methods=['GET'])
+def get_portfolio_returns(portfolio_id):
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  portfolio_returns = returns_manager.get_portfolio_returns(managed_portfolio)
+  assets_returns = returns_manager.get_assets_returns(managed_portfolio)
+
+  return {
+      'portfolio': portfolio_returns.to_dict(),
+      'assets': {
+          managed_asset.get_id(): asset_returns.to_dict()
+          for managed_asset, asset_returns in assets_returns.items()
+      },
+  }
+
+
+@api_routes.route(
+    '/api/portfolios/<portfolio_id>/analytics/', methods=['GET'])
+def get_portfolio_analytics(portfolio_id):
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+
+  try:
+    analytics_parameters = {}
+    if 'window_days' in flask.request.args:
+      analytics_parameters['window_days'] = int(
+          flask.request.args['window_days'])
+    portfolio_analytics = analytics_manager.get_portfolio_analytics(
+        managed_portfolio, **analytics_parameters)
+  except ValueError as error:
+    flask.abort(400, str(error))
+
+  return portfolio_analytics.to_dict()
+
+
+@api_routes.route('/api/portfolios/<portfolio_id>/risk/', methods=['GET'])
+def get_portfolio_risk(portfolio_id):
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  try:
+    risk_parameters = {
+        parameter_name: parameter_type(flask.request.args[parameter_name])
+        for parameter_name, parameter_type in (
+            ('confidence', float), ('horizon_days', int),
+            ('scenarios', int), ('lookback_days', int))
+        if parameter_name in flask.request.args
+    }
+    portfolio_risk = risk_manager.get_portfolio_risk(
+        managed_portfolio, **risk_parameters)
+  except ValueError as error:
+    flask.abort(400, str(error))
+
+  return portfolio_risk.to_dict()
+
+
 @api_routes.route(
     '/api/portfolios/<portfolio_id>/operations/', methods=['GET'])
 def get_portfolio_operations(portfolio_id):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
-  portfolio_operations = operation_manager.get_operations(managed_portfolio)
 
-  return flask.jsonify([
+  try:
+    operations_query = operation_manager.get_operations_query(
+        flask.request.args)
+    operations_page = operation_manager.get_operations_page(
+        managed_portfolio, **operations_query)
+  except ValueError as error:
+    flask.abort(400, str(error))
+
+  response = flask.jsonify([
       portfolio_operation.to_dict()
-      for portfolio_operation in portfolio_operations.values()
+      for portfolio_operation in operations_page.operations
   ])
+  if operations_page.next_cursor:
+    response.headers['X-Next-Cursor'] = operations_page.next_cursor
+  return response
 
 
 @api_routes.route(
@@ -137,6 +264,16 @@ def get_portfolio_asset_balance(portfolio_id, asset_name):
   return asset_position.to_dict()
 
 
+@api_routes.route(
+    '/api/portfolios/<portfolio_id>/assets/<asset_name>/returns/',
+    methods=['GET'])
+def get_portfolio_asset_returns(portfolio_id, asset_name):
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  managed_asset = asset_manager.get_asset(managed_portfolio, asset_name)
+  asset_returns = returns_manager.get_asset_returns(managed_asset)
+  return asset_returns.to_dict()
+
+
 @api_routes.route(
     '/api/portfolios/<portfolio_id>/assets/<asset_name>/operations/',
     methods=['GET'])
@@ -181,21 +318,123 @@ def create_asset_operation(portfolio_id, asset_code):
   quantity = int(request_data['quantity'])
   price_per_unit = float(request_data['price_per_unit'])
   operation_currency = request_data['operation_currency']
+  allow_duplicate = bool(request_data.get('allow_duplicate', False))
+  idempotency_key = flask.request.headers.get(
+      'Idempotency-Key', request_data.get('idempotency_key'))
 
   new_operation = operation_manager.add_operation(
       managed_portfolio, managed_asset, timestamp, operation_type, quantity,
-      price_per_unit, operation_currency)
+      price_per_unit, operation_currency, allow_duplicate, idempotency_key)
 
   return new_operation.to_dict()
 
 
+@api_routes.route(
+    '/api/portfolios/<portfolio_id>/assets/<asset_code>/simulations/',
+    methods=['POST'])
+def simulate_asset_operations(portfolio_id, asset_code):
+  request_data = flask.request.get_json()
+
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  managed_asset = asset_manager.get_asset(managed_portfolio, asset_code)
+
+  new_operations = []
+  for operation_data in request_data['operations']:
+    timestamp = None
+    if 'timestamp' in operation_data:
+      timestamp_int = int(operation_data['timestamp'])
+      timestamp = datetime.datetime.fromtimestamp(timestamp_int)
+
+    price_per_unit = None
+    if 'price_per_unit' in operation_data:
+      price_per_unit = float(operation_data['price_per_unit'])
+
+    try:
+      operation_type = operation_manager.get_operation_type(
+          operation_data['operation_type'])
+    except ValueError as error:
+      flask.abort(400, str(error))
+
+    new_operations.append(simulation_manager.get_operation(
+        managed_portfolio, managed_asset, operation_type,
+        int(operation_data['quantity']), price_per_unit, timestamp,
+        operation_data.get('operation_currency', '')))
+
+  asset_simulation = simulation_manager.simulate_operations(
+      managed_portfolio, managed_asset, new_operations)
+
+  return asset_simulation.to_dict()
+
+
+@api_routes.route(
+    '/api/portfolios/<portfolio_id>/assets/<asset_code>/corporate-actions/',
+    methods=['GET'])
+def get_asset_corporate_actions(portfolio_id, asset_code):
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  managed_asset = asset_manager.get_asset(managed_portfolio, asset_code)
+  asset_actions = corporate_action_manager.get_corporate_actions(
+      managed_asset)
+
+  return flask.jsonify([
+      asset_action.to_dict() for asset_action in asset_actions
+  ])
+
+
+@api_routes.route(
+    '/api/portfolios/<portfolio_id>/assets/<asset_code>/corporate-actions/',
+    methods=['POST'])
+def create_asset_corporate_action(portfolio_id, asset_code):
+  request_data = flask.request.get_json()
+
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  managed_asset = asset_manager.get_asset(managed_portfolio, asset_code)
+
+  timestamp_int = int(request_data['timestamp'])
+  timestamp = datetime.datetime.fromtimestamp(timestamp_int)
+
+  try:
+    action_type = corporate_action_manager.get_corporate_action_type(
+        request_data['action_type'])
+    new_action = corporate_action_manager.add_corporate_action(
+        managed_portfolio, managed_asset, timestamp, action_type,
+        float(request_data['ratio']))
+  except asset_manager.OversellError:
+    raise
+  except ValueError as error:
+    flask.abort(400, str(error))
+
+  return new_action.to_dict()
+
+
+@api_routes.route(
+    '/api/portfolios/<portfolio_id>/assets/<asset_code>/corporate-actions/'
+    '<action_id>/',
+    methods=['DELETE'])
+def delete_asset_corporate_action(portfolio_id, asset_code, action_id):
+  managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
+  managed_asset = asset_manager.get_asset(managed_portfolio, asset_code)
+  action_to_delete = asset_manager.get_corporate_action(
+      managed_asset, action_id)
+  corporate_action_manager.delete_corporate_action(
+      managed_portfolio, action_to_delete)
+
+  return action_to_delete.to_dict()
+
+
 @api_routes.route(
     '/api/portfolios/<portfolio_id>/assets/<asset_name>/stats/',
     methods=['PUT'])
 def update_asset_stats(portfolio_id, asset_name):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
   managed_asset = asset_manager.get_asset(managed_portfolio, asset_name)
-  asset_stats = stats_manager.update_asset_stats(managed_asset)
+
+  if _RESPOND_ASYNC_PREFERENCE in flask.request.headers.get('Prefer', ''):
+    stats_job = scheduler_manager.submit_asset_stats_update(
+        managed_portfolio, managed_asset)
+    return _get_job_response(stats_job)
+
+  asset_stats = stats_manager.update_asset_stats(
+      managed_portfolio, managed_asset)
 
   return flask.jsonify(asset_stats.to_dict())
 
@@ -205,9 +444,90 @@ def update_asset_stats(portfolio_id, asset_name):
     methods=['PUT'])
 def get_asset_stats(portfolio_id,):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
-  portfolio_stats = stats_manager.update_portfolio_stats(managed_portfolio)
+  stats_job = scheduler_manager.submit_portfolio_stats_update(
+      managed_portfolio)
+  return _get_job_response(stats_job)
 
-  return flask.jsonify([
-      asset_stats.to_dict()
-      for asset_stats in portfolio_stats.values()
-  ])
+
+@api_routes.route('/api/jobs/<job_id>/', methods=['GET'])
+def get_job(job_id):
+  try:
+    requested_job = scheduler_manager.get_job(job_id)
+  except KeyError:
+    flask.abort(404)
+
+  return requested_job.to_dict()
+
+
+def _get_job_response(accepted_job):
+  job_url = flask.url_for('api.get_job', job_id=accepted_job.get_id())
+  return accepted_job.to_dict(), 202, {'Location': job_url}
+
+
+@api_routes.route('/api/exchange-rates/', methods=['GET'])
+def get_exchange_rates():
+  exchange_rates = currency_manager.get_exchange_rates()
+  return {
+      f'{from_currency}_{to_currency}': {
+          rate_date.isoformat(): rate
+          for rate_date, rate in sorted(pair_rates.items())
+      }
+      for (from_currency, to_currency), pair_rates in exchange_rates.items()
+  }
+
+
+@api_routes.route(
+    '/api/exchange-rates/<from_currency>/<to_currency>/', methods=['PUT'])
+def update_exchange_rate(from_currency, to_currency):
+  request_data = flask.request.get_json()
+
+  rate = float(request_data['rate'])
+  rate_date = None
+  if 'timestamp' in request_data:
+    timestamp_int = int(request_data['timestamp'])
+    rate_date = datetime.datetime.fromtimestamp(timestamp_int).date()
+
+  currency_manager.set_exchange_rate(
+      from_currency, to_currency, rate, rate_date)
+
+  return {
+      'from_currency': from_currency.upper(),
+      'to_currency': to_currency.upper(),
+      'rate': currency_manager.get_exchange_rate(
+          from_currency, to_currency, rate_date),
+  }
+
+
+@api_routes.route('/api/price-history/<tracker>/', methods=['GET'])
+def get_price_history(tracker):
+  price_histories = price_history_manager.get_price_histories()
+  if tracker.upper() not in price_histories:
+    flask.abort(404)
+
+  return {
+      price_date.isoformat(): price
+      for price_date, price in sorted(
+          price_histories[tracker.upper()].items())
+  }
+
+
+@api_routes.route('/api/price-history/<tracker>/', methods=['PUT'])
+def update_price_history(tracker):
+  request_data = flask.request.get_json()
+
+  price = float(request_data['price'])
+  price_date = None
+  if 'timestamp' in request_data:
+    timestamp_int = int(request_data['timestamp'])
+    price_date = datetime.datetime.fromtimestamp(timestamp_int).date()
+
+  try:
+    price_history_manager.set_prices({tracker: price}, price_date)
+  except ValueError as error:
+    flask.abort(400, str(error))
+
+  return {
+      'tracker': tracker.upper(),
+      'date': (price_date or datetime.date.today()).isoformat(),
+      'price': price,
+  }
@@ -0,0 +1,53 @@
+"""Metrics, readiness routes and request timing for Finance Tracker."""
+
+import time
+import flask
+from services import metrics_manager
+from services import portfolio_manager
+
+metrics_routes = flask.Blueprint('metrics', __name__)
+
+
+@metrics_routes.before_app_request
+def start_request_timer():
+  if metrics_manager.is_enabled():
+    flask.g.request_start_time = time.perf_counter()
+
+
+@metrics_routes.after_app_request
+def record_request_duration(response):
+  request_start_time = flask.g.pop('request_start_time', None)
+  if request_start_time is None:
+    return response
+
+  url_rule = flask.request.url_rule
+  metrics_manager.observe(
+      metrics_manager.REQUEST_DURATION_METRIC,
+      time.perf_counter() - request_start_time,
+      (
+          ('method', flask.request.method),
+          ('route', url_rule.rule if url_rule else 'unmatched'),
+          ('status', str(response.status_code)),
+      ))
+  return response
+
+
+@metrics_routes.route('/metrics', methods=['GET'])
+def get_metrics():
+  if not metrics_manager.is_enabled():
+    flask.abort(404)
+
+  return flask.Response(
+      metrics_manager.get_metrics_text(),
+      mimetype='text/plain; version=0.0.4')
+
+
+@metrics_routes.route('/ready', methods=['GET'])
+def get_readiness():
+  loaded_count, total_count = portfolio_manager.get_loading_progress()
+  is_loaded = portfolio_manager.is_loaded()
+  return {
+      'ready': is_loaded,
+      'loaded_portfolios': loaded_count,
+      'total_portfolios': total_count,
+  }, 200 if is_loaded else 503
@@ -1,7 +1,10 @@
 """UI routes for Finance Tracker."""
 
 import flask
+import markupsafe
+from services import analytics_manager
 from services import asset_manager
+from services import fragment_manager
 from services import operation_manager
 from services import portfolio_manager
 from services import position_manager
@@ -9,6 +12,59 @@ from services import stats_manager
 
 ui_routes = flask.Blueprint('ui', __name__)
 
+_HISTORY_PAGE_SIZE = 100
+_POSITIVE_NUMBER_CLASS = markupsafe.Markup('class="number-positive"')
+_NEGATIVE_NUMBER_CLASS = markupsafe.Markup('class="number-negative"')
+
+
+@ui_routes.app_template_filter('number_class')
+def get_number_class(number):
+  if number > 0:
+    return _POSITIVE_NUMBER_CLASS
+  if number < 0:
+    return _NEGATIVE_NUMBER_CLASS
+  return ''
+
+
+@ui_routes.app_template_global('position_row')
+def render_position_row(managed_portfolio, asset_position, allocation=None):
+  managed_asset = asset_position.asset
+  asset_allocation = allocation.get(managed_asset) if allocation else None
+  fragment_key = (
+      'position_row', managed_portfolio.get_id(), managed_asset.get_id(),
+      managed_asset.get_instance_id(),
+      position_manager.get_position_version(managed_asset),
+      bool(allocation), asset_allocation)
+
+  return fragment_manager.get_fragment(fragment_key, lambda: _render_fragment(
+      'blocks/position_row.jinja2',
+      portfolio=managed_portfolio,
+      position=asset_position,
+      allocation=allocation,
+      asset_allocation=asset_allocation))
+
+
+@ui_routes.app_template_global('operation_row')
+def render_operation_row(managed_portfolio, asset_operation):
+  fragment_key = (
+      'operation_row', managed_portfolio.get_id(), asset_operation.get_id(),
+      asset_operation.managed_asset.get_instance_id(),
+      asset_operation.managed_asset.get_version())
+
+  return fragment_manager.get_fragment(fragment_key, lambda: _render_fragment(
+      'blocks/operation_row.jinja2',
+      portfolio=managed_portfolio,
+      operation=asset_operation))
+
+
+def _render_fragment(template_name, **context):
+  fragment_template = flask.current_app.jinja_env.get_template(template_name)
+  # Fragments only use their own variables, so the shared context skips
+  # copying the app globals for every row.
+  fragment_context = fragment_template.new_context(context, shared=True)
+  return markupsafe.Markup(
+      ''.join(fragment_template.root_render_func(fragment_context)))
+
 
 @ui_routes.route('/', methods=['GET'])
 def get_portfolios():
@@ -22,22 +78,43 @@ def get_portfolio(portfolio_id):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
   portfolio_positions = position_manager.get_positions(managed_portfolio)
 
+  try:
+    portfolio_summary = (
+        position_manager.get_portfolio_summary(managed_portfolio))
+  except ValueError:
+    portfolio_summary = None
+
   return flask.render_template(
       'views/portfolio.jinja2',
       portfolio=managed_portfolio,
       portfolio_positions=portfolio_positions,
+      portfolio_summary=portfolio_summary,
   )
 
 
 @ui_routes.route('/portfolios/<portfolio_id>/history/', methods=['GET'])
 def get_portfolio_history(portfolio_id):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
-  portfolio_operations = operation_manager.get_operations(managed_portfolio)
+
+  try:
+    operations_query = operation_manager.get_operations_query(
+        flask.request.args, default_limit=_HISTORY_PAGE_SIZE)
+    operations_page = operation_manager.get_operations_page(
+        managed_portfolio, **operations_query)
+  except ValueError as error:
+    flask.abort(400, str(error))
+
+  next_page_args = None
+  if operations_page.next_cursor:
+    next_page_args = dict(
+        flask.request.args.items(), cursor=operations_page.next_cursor)
 
   return flask.render_template(
       'views/portfolio_history.jinja2',
       portfolio=managed_portfolio,
-      portfolio_operations=portfolio_operations,
+      operations_page=operations_page,
+      query_args=flask.request.args,
+      next_page_args=next_page_args,
   )
 
 
@@ -46,10 +123,21 @@ def get_portfolio_stats(portfolio_id):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
   portfolio_stats = stats_manager.get_portfolio_stats(managed_portfolio)
 
+  try:
+    analytics_parameters = {}
+    if 'window_days' in flask.request.args:
+      analytics_parameters['window_days'] = int(
+          flask.request.args['window_days'])
+    portfolio_analytics = analytics_manager.get_portfolio_analytics(
+        managed_portfolio, **analytics_parameters)
+  except ValueError as error:
+    flask.abort(400, str(error))
+
   return flask.render_template(
       'views/portfolio_stats.jinja2',
       portfolio=managed_portfolio,
       portfolio_stats=portfolio_stats,
+      portfolio_analytics=portfolio_analytics,
   )
 
 
@@ -58,13 +146,15 @@ def get_portfolio_stats(portfolio_id):
 def get_asset(portfolio_id, asset_name):
   managed_portfolio = portfolio_manager.get_portfolio(portfolio_id)
   managed_asset = asset_manager.get_asset(managed_portfolio, asset_name)
-  asset_operations = asset_manager.get_operations(managed_asset)
+  operations_page = operation_manager.get_operations_page(
+      managed_portfolio, asset_codes=[managed_asset.get_id()],
+      limit=_HISTORY_PAGE_SIZE)
   asset_position = position_manager.get_position(managed_asset)
 
   return flask.render_template(
       'views/asset.jinja2',
       portfolio=managed_portfolio,
       asset=managed_asset,
-      asset_operations=asset_operations,
+      operations_page=operations_page,
       asset_position=asset_position,
   )
@@ -0,0 +1,182 @@
+"""Analyzes the performance of asset prices from their price history."""
+
+import threading
+import numpy as np
+
+from models import analytics
+from models import portfolio
+from services import asset_manager
+from services import metrics_manager
+from services import price_history_manager
+from typing import Tuple
+
+_DEFAULT_WINDOW_DAYS = 250
+_DAYS_PER_YEAR = 365.25
+
+# Analytics of each portfolio and window, together with the portfolio and
+# prices version they were calculated at.
+_PORTFOLIO_ANALYTICS = {}
+_PORTFOLIO_ANALYTICS_LOCK = threading.Lock()
+
+
+@metrics_manager.timed('get_portfolio_analytics')
+def get_portfolio_analytics(
+    managed_portfolio: portfolio.Portfolio,
+    window_days: int = _DEFAULT_WINDOW_DAYS
+) -> analytics.PortfolioAnalytics:
+  """Gets returns, volatility, drawdown and correlations of portfolio assets.
+
+  Each asset is analyzed over its own price history, and each pair of assets
+  is correlated over the dates on which both have prices. Prices are
+  adjusted for corporate actions. Analytics are cached until the portfolio
+  or prices change.
+
+  Args:
+    managed_portfolio: Portfolio whose assets to analyze.
+    window_days: Number of daily prices in each window.
+
+  Raises:
+    ValueError: window is shorter than 2 days.
+
+  Returns:
+    Analytics of the portfolio assets.
+  """
+  if window_days < 2:
+    raise ValueError(f'Window must be at least 2 days, got {window_days}.')
+
+  cache_key = (managed_portfolio.get_id(), window_days)
+  version = (
+      managed_portfolio.get_version(),
+      price_history_manager.get_prices_version())
+  with _PORTFOLIO_ANALYTICS_LOCK:
+    cached_version, portfolio_analytics = (
+        _PORTFOLIO_ANALYTICS.get(cache_key, (None, None)))
+  if cached_version == version:
+    return portfolio_analytics
+
+  portfolio_assets = list(
+      asset_manager.get_assets(managed_portfolio).values())
+  price_histories = price_history_manager.get_price_histories()
+  correlated_assets = [
+      managed_asset for managed_asset in portfolio_assets
+      if len(price_histories.get(managed_asset.get_tracker().upper(), {})) > 1
+  ]
+  trackers = [
+      managed_asset.get_tracker() for managed_asset in correlated_assets
+  ]
+
+  assets_analytics = {
+      managed_asset: analytics.AssetAnalytics(managed_asset)
+      for managed_asset in portfolio_assets
+  }
+  for managed_asset in correlated_assets:
+    dates, prices = price_history_manager.get_price_matrix(
+        [managed_asset.get_tracker()])
+    prices[:, 0] = price_history_manager.get_adjusted_prices(
+        dates, prices[:, 0], asset_manager.get_adjustment_index(managed_asset))
+    assets_analytics[managed_asset] = analytics.AssetAnalytics(
+        managed_asset,
+        *(float(value[0])
+          for value in _get_tracker_analytics(dates, prices, window_days)))
+
+  # Histories of all assets side by side, each starting at its first price.
+  dates, prices = price_history_manager.get_price_matrix(
+      trackers, shared_dates=False)
+  for column, managed_asset in enumerate(correlated_assets):
+    prices[:, column] = price_history_manager.get_adjusted_prices(
+        dates, prices[:, column],
+        asset_manager.get_adjustment_index(managed_asset))
+
+  portfolio_analytics = analytics.PortfolioAnalytics(
+      window_days,
+      dates[0].item() if len(dates) else None,
+      dates[-1].item() if len(dates) else None,
+      assets_analytics,
+      correlated_assets,
+      _get_correlations(prices, window_days).tolist())
+
+  with _PORTFOLIO_ANALYTICS_LOCK:
+    _PORTFOLIO_ANALYTICS[cache_key] = (version, portfolio_analytics)
+  return portfolio_analytics
+
+
+def _get_tracker_analytics(dates: np.ndarray,
+                           prices: np.ndarray,
+                           window_days: int) -> Tuple[np.ndarray, ...]:
+  """Calculates the analytics of many trackers with prices on the same dates.
+
+  Args:
+    dates: Sorted dates of the prices, at least 2.
+    prices: Price of each tracker (column) at each date (row).
+    window_days: Number of daily prices in each window.
+
+  Returns:
+    Window return, best and worst rolling returns, volatility and maximum
+    drawdown of each tracker.
+  """
+  # Histories shorter than the window are analyzed as a single window.
+  window_length = min(window_days, len(dates)) - 1
+  window_prices = prices[-(window_length + 1):]
+
+  window_returns = window_prices[-1] / window_prices[0] - 1
+  rolling_returns = prices[window_length:] / prices[:-window_length] - 1
+
+  # Prices may not be recorded every day, so years are measured in the
+  # number of prices recorded per year.
+  elapsed_days = int((dates[-1] - dates[0]).astype(int))
+  prices_per_year = (len(dates) - 1) * _DAYS_PER_YEAR / max(elapsed_days, 1)
+  daily_returns = np.diff(np.log(window_prices), axis=0)
+  volatilities = np.full(prices.shape[1], np.nan)
+  if window_length > 1:
+    volatilities = (
+        daily_returns.std(axis=0, ddof=1) * np.sqrt(prices_per_year))
+
+  max_drawdowns = (
+      1 - window_prices / np.maximum.accumulate(window_prices, axis=0)
+  ).max(axis=0)
+
+  return (
+      window_returns,
+      rolling_returns.max(axis=0),
+      rolling_returns.min(axis=0),
+      volatilities,
+      max_drawdowns)
+
+
+def _get_correlations(prices: np.ndarray, window_days: int) -> np.ndarray:
+  """Calculates the correlation of the daily returns of each pair of trackers.
+
+  Each pair is correlated over the dates of the latest window on which both
+  trackers have prices.
+
+  Args:
+    prices: Price of each tracker (column) at each date (row), missing (NaN)
+        before its first price.
+    window_days: Number of daily prices in each window.
+
+  Returns:
+    Correlation matrix of the trackers.
+  """
+  tracker_count = prices.shape[1]
+  correlations = np.full((tracker_count, tracker_count), np.nan)
+  daily_returns = np.diff(np.log(prices[-window_days:]), axis=0)
+
+  # Returns are only missing before the first price of each tracker, so
+  # each pair overlaps since the later first return of both, and all pairs
+  # starting on the same date are correlated at once.
+  first_rows = np.isnan(daily_returns).sum(axis=0)
+  for first_row in np.unique(first_rows):
+    if len(daily_returns) - first_row < 2:
+      continue
+    columns = np.flatnonzero(first_rows <= first_row)
+    # Trackers whose price did not change have no defined correlation.
+    with np.errstate(divide='ignore', invalid='ignore'):
+      group_correlations = np.atleast_2d(
+          np.corrcoef(daily_returns[first_row:, columns], rowvar=False))
+    group_pairs = np.maximum.outer(
+        first_rows[columns], first_rows[columns]) == first_row
+    pair_correlations = correlations[np.ix_(columns, columns)]
+    pair_correlations[group_pairs] = group_correlations[group_pairs]
+    correlations[np.ix_(columns, columns)] = pair_correlations
+
+  return correlations
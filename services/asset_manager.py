@@ -1,12 +1,53 @@
 """Manages assets within a portfolio."""
 
+import bisect
+import collections
+import copy
+import datetime
+import fractions
+import itertools
+import math
+from models import adjustment_index
 from models import asset
+from models import corporate_action
+from models import holdings_index
 from models import operation
+from models import operation_totals
 from models import portfolio
 from models import position
+from services import currency_manager
 from services import operation_manager
 from services import portfolio_manager
-from typing import Mapping, Optional, Sequence, Text
+from typing import List, Mapping, Optional, Sequence, Text, Tuple, Union
+
+TotalsKey = Tuple[operation.OperationType, Text]
+IndexKey = Tuple[float, Text]
+OperationIndex = Mapping[operation.OperationType, List[IndexKey]]
+# Asset code, timestamp, type, quantity, price per unit and currency.
+ContentKey = Tuple[
+    Text, datetime.datetime, operation.OperationType, int, float, Text]
+# Ids of the operations with each content.
+ContentIndex = Mapping[ContentKey, List[Text]]
+# POSIX timestamp, order within the same timestamp and operation id.
+HoldingsKey = Tuple[float, int, Text]
+# Quantity and price factors adjusting an operation for corporate actions.
+Adjustment = Tuple[adjustment_index.Factor, adjustment_index.Factor]
+Quantity = Union[int, adjustment_index.Factor]
+
+# Operations changing the units held, in the order they are counted when
+# they happen at the same time: units bought can be sold at once.
+_HOLDINGS_ORDER = {
+    operation.OperationType.BUY: 0,
+    operation.OperationType.SELL: 1,
+}
+
+
+class DuplicateOperationError(ValueError):
+  """Operation matches the contents of an existing operation."""
+
+
+class OversellError(ValueError):
+  """Operation would leave fewer units held than sold at some date."""
 
 
 def add_asset(
@@ -27,37 +68,117 @@ def add_asset(
 
   Raises:
     ValueError: asset already exists in portfolio.
+    ExchangeRateError: asset currency can not be converted to the portfolio
+        currency.
 
   Returns:
     New Asset created.
   """
-  if contains_asset(managed_portfolio, asset_code):
-    raise ValueError(f'Asset {asset_code} already exists.')
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    if contains_asset(managed_portfolio, asset_code):
+      raise ValueError(f'Asset {asset_code} already exists.')
+    _check_asset_currency(managed_portfolio, None, asset_currency)
 
-  new_asset = asset.Asset(asset_code, asset_name, asset_price, asset_currency)
-  managed_portfolio.assets[asset_code] = new_asset
-  portfolio_manager.store_portfolio(managed_portfolio)
+    new_asset = asset.Asset(
+        asset_code, asset_name, asset_price, asset_currency)
+    managed_portfolio.assets[asset_code] = new_asset
+    portfolio_manager.store_portfolio(managed_portfolio)
 
   return new_asset
 
 
+def add_corporate_action(managed_asset: asset.Asset,
+                         asset_action: corporate_action.CorporateAction):
+  """Adds a corporate action to the asset.
+
+  Operations are not rewritten: they are adjusted when positions are
+  calculated. Only the holdings index is built again, if the action changes
+  units and operations after it were already added.
+
+  Args:
+    managed_asset: Asset affected by the action.
+    asset_action: Corporate action to add.
+
+  Raises:
+    ValueError: action already added, or its ratio is not valid.
+    OversellError: action leaves later sells with more units than held,
+        e.g. a reverse split before them.
+  """
+  asset_actions = get_corporate_actions(managed_asset)
+
+  action_id = asset_action.get_id()
+  if action_id in asset_actions:
+    raise ValueError(f'{asset_action} already exists in {managed_asset}.')
+
+  if not 0 < asset_action.ratio < math.inf:
+    raise ValueError(f'{asset_action} ratio must be positive.')
+  if (asset_action.action_type == corporate_action.CorporateActionType.SPIN_OFF
+          and asset_action.ratio > 1):
+    raise ValueError(f'{asset_action} can not keep more than all the value.')
+
+  asset_actions[action_id] = asset_action
+  try:
+    _update_adjustments(managed_asset, asset_action)
+  except OversellError:
+    del asset_actions[action_id]
+    _update_adjustments(managed_asset, asset_action)
+    raise
+  managed_asset.increment_version()
+
+
 def add_operation(
-        managed_asset: asset.Asset, asset_operation: operation.Operation):
+        managed_asset: asset.Asset, asset_operation: operation.Operation,
+        allow_duplicate: bool = False):
   """Adds a new operation to the asset and updates position.
 
   Args:
     managed_asset: Asset for which operation happened.
     asset_operation: Operation was made.
+    allow_duplicate: If True, adds operation even if another operation has
+        the same contents, e.g. two identical trades at the same time.
 
   Raises:
     ValueError: operation already added to position.
+    DuplicateOperationError: another operation has the same contents, as
+        when a trade is imported twice, and duplicates are not allowed.
+    OversellError: operation sells more units than held at its date, or
+        leaves later sells with more units than held.
+    ExchangeRateError: operation price can not be converted to the asset
+        currency.
   """
   asset_operations = get_operations(managed_asset)
+  asset_totals = get_operation_totals(managed_asset)
+  asset_index = get_operation_index(managed_asset)
+  asset_contents = get_operation_contents(managed_asset)
+  asset_holdings = get_holdings_index(managed_asset)
 
-  if asset_operation in asset_operations.values():
+  operation_id = asset_operation.get_id()
+  if operation_id in asset_operations:
     raise ValueError(f'{asset_operation} already exists in {managed_asset}.')
 
-  asset_operations[asset_operation.get_id()] = asset_operation
+  content_key = get_content_key(asset_operation)
+  if content_key in asset_contents and not allow_duplicate:
+    raise DuplicateOperationError(
+        f'{asset_operation} duplicates operation '
+        f'{asset_contents[content_key][0]} in {managed_asset}.')
+
+  _check_currency(managed_asset, asset_operation)
+
+  if asset_operation.operation_type == operation.OperationType.SELL:
+    lowest_quantity = asset_holdings.get_lowest_quantity(
+        get_holdings_key(asset_operation))
+    if lowest_quantity < _get_initial_quantity(asset_operation):
+      raise OversellError(
+          f'{asset_operation} sells more units than held: {managed_asset} '
+          f'holds {_get_quantity(asset_operation, lowest_quantity)} units '
+          'from its date on.')
+
+  asset_operations[operation_id] = asset_operation
+  _add_operation_to_totals(asset_totals, asset_operation)
+  _add_operation_to_index(asset_index, asset_operation)
+  asset_contents.setdefault(content_key, []).append(operation_id)
+  _add_operation_to_holdings(asset_holdings, asset_operation)
+  managed_asset.increment_version()
 
 
 def contains_asset(
@@ -75,6 +196,21 @@ def contains_asset(
   return asset_code in portfolio_assets
 
 
+def contains_operation(managed_asset: asset.Asset,
+                       asset_operation: operation.Operation) -> bool:
+  """Returns whether an operation belongs to the asset.
+
+  Args:
+    managed_asset: Asset where to search for operation.
+    asset_operation: Operation to check.
+
+  Returns:
+    Whether operation is one of the asset operations.
+  """
+  asset_operations = get_operations(managed_asset)
+  return asset_operations.get(asset_operation.get_id()) is asset_operation
+
+
 def delete_asset(managed_portfolio: portfolio.Portfolio,
                  managed_asset: asset.Asset):
   """Deletes an asset from the portfolio.
@@ -90,17 +226,48 @@ def delete_asset(managed_portfolio: portfolio.Portfolio,
     Removed asset.
   """
   asset_id = managed_asset.get_id()
-  if asset_id not in managed_portfolio.assets.keys():
-    raise ValueError(f'{managed_asset} does not exist in {managed_portfolio}')
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    if asset_id not in managed_portfolio.assets.keys():
+      raise ValueError(
+          f'{managed_asset} does not exist in {managed_portfolio}')
 
-  # There is no need to remove operations as pickle will drop the asset and
-  # all the operations linked to it.
-  del managed_portfolio.assets[asset_id]
-  portfolio_manager.store_portfolio(managed_portfolio)
+    # There is no need to remove operations as pickle will drop the asset
+    # and all the operations linked to it.
+    del managed_portfolio.assets[asset_id]
+    portfolio_manager.store_portfolio(managed_portfolio)
 
   return managed_asset
 
 
+def delete_corporate_action(managed_asset: asset.Asset,
+                            asset_action: corporate_action.CorporateAction):
+  """Removes a corporate action from the asset.
+
+  Args:
+    managed_asset: Asset affected by the action.
+    asset_action: Corporate action to remove.
+
+  Raises:
+    ValueError: action does not exist for given asset.
+    OversellError: removing the action leaves later sells with more units
+        than held, e.g. sells of the units from a split.
+  """
+  asset_actions = get_corporate_actions(managed_asset)
+
+  action_id = asset_action.get_id()
+  if asset_actions.get(action_id) is not asset_action:
+    raise ValueError(f'{asset_action} does not exist for {managed_asset}.')
+
+  del asset_actions[action_id]
+  try:
+    _update_adjustments(managed_asset, asset_action)
+  except OversellError:
+    asset_actions[action_id] = asset_action
+    _update_adjustments(managed_asset, asset_action)
+    raise
+  managed_asset.increment_version()
+
+
 def delete_operation(
         managed_asset: asset.Asset, asset_operation: operation.Operation):
   """Removes an existing operation from the asset and updates position.
@@ -111,14 +278,39 @@ def delete_operation(
 
   Raises:
     ValueError: operation does not exist for given asset and portfolio.
+    OversellError: removing the operation leaves later sells with more units
+        than held.
   """
   asset_operations = get_operations(managed_asset)
+  asset_totals = get_operation_totals(managed_asset)
+  asset_index = get_operation_index(managed_asset)
+  asset_contents = get_operation_contents(managed_asset)
+  asset_holdings = get_holdings_index(managed_asset)
 
-  if asset_operation not in asset_operations.values():
+  if not contains_operation(managed_asset, asset_operation):
     raise ValueError(f'{asset_operation} does not exist for {managed_asset}.')
 
+  if asset_operation.operation_type == operation.OperationType.BUY:
+    holdings_key = get_holdings_key(asset_operation)
+    asset_holdings.remove(holdings_key)
+    lowest_quantity = asset_holdings.get_lowest_quantity(holdings_key)
+    if lowest_quantity < 0:
+      _add_operation_to_holdings(asset_holdings, asset_operation)
+      raise OversellError(
+          f'Deleting {asset_operation} leaves later sells of '
+          f'{managed_asset} with '
+          f'{_get_quantity(asset_operation, -lowest_quantity)} more units '
+          'than held.')
+  else:
+    _remove_operation_from_holdings(asset_holdings, asset_operation)
+
   operation_id = asset_operation.get_id()
   del asset_operations[operation_id]
+  _remove_operation_from_totals(
+      asset_totals, asset_operations.values(), asset_operation)
+  _remove_operation_from_index(asset_index, asset_operation)
+  _remove_operation_from_contents(asset_contents, asset_operation)
+  managed_asset.increment_version()
 
 
 def get_asset(managed_portfolio: portfolio.Portfolio,
@@ -156,6 +348,46 @@ def get_assets(
   return managed_portfolio.assets
 
 
+def get_corporate_action(
+        managed_asset: asset.Asset,
+        action_id: Text) -> corporate_action.CorporateAction:
+  """Gets the corporate action for the given id.
+
+  Args:
+    managed_asset: Asset from which to retrieve action.
+    action_id: Corporate action id to retrieve.
+
+  Raises:
+    ValueError: action id not found.
+
+  Returns:
+    Corporate action for given id.
+  """
+  asset_actions = get_corporate_actions(managed_asset)
+  if action_id not in asset_actions:
+    raise ValueError(
+        f'Corporate action {action_id} not found in {managed_asset}.')
+  return asset_actions[action_id]
+
+
+def get_corporate_actions(
+        managed_asset: asset.Asset
+) -> Mapping[Text, corporate_action.CorporateAction]:
+  """Gets corporate actions of a given asset.
+
+  Args:
+    managed_asset: Asset for which to retrieve actions.
+
+  Returns:
+    Map of corporate actions of the asset to their ids.
+  """
+  if getattr(managed_asset, 'corporate_actions', None) is None:
+    # Assets stored before corporate actions were kept have none.
+    managed_asset.corporate_actions = {}
+
+  return managed_asset.corporate_actions
+
+
 def get_operation(managed_asset: asset.Asset,
                   operation_id: Text) -> operation.Operation:
   """Gets the operation for the given id.
@@ -186,6 +418,219 @@ def get_operations(
   return managed_asset.operations
 
 
+def get_operation_totals(
+        managed_asset: asset.Asset
+) -> Mapping[TotalsKey, operation_totals.OperationTotals]:
+  """Gets running totals of the asset operations.
+
+  Args:
+    managed_asset: Asset for which to retrieve totals.
+
+  Returns:
+    Map of operation totals to their operation type and currency.
+  """
+  if getattr(managed_asset, 'operation_totals', None) is None:
+    # Assets stored before totals were kept need them rebuilt once.
+    managed_asset.operation_totals = {}
+    for asset_operation in get_operations(managed_asset).values():
+      _add_operation_to_totals(managed_asset.operation_totals, asset_operation)
+
+  return managed_asset.operation_totals
+
+
+def get_operation_index(managed_asset: asset.Asset) -> OperationIndex:
+  """Gets the index of the asset operations by type and date.
+
+  Args:
+    managed_asset: Asset for which to retrieve index.
+
+  Returns:
+    Map of operation types and their (POSIX timestamp, operation id) keys,
+    sorted by date.
+  """
+  if getattr(managed_asset, 'operation_index', None) is None:
+    # Assets stored before operations were indexed need it built once.
+    managed_asset.operation_index = {}
+    for asset_operation in get_operations(managed_asset).values():
+      _add_operation_to_index(managed_asset.operation_index, asset_operation)
+
+  return managed_asset.operation_index
+
+
+def get_operation_contents(managed_asset: asset.Asset) -> ContentIndex:
+  """Gets the index of the asset operations by their contents.
+
+  Args:
+    managed_asset: Asset for which to retrieve index.
+
+  Returns:
+    Map of operation contents and the ids of operations with them.
+  """
+  if getattr(managed_asset, 'operation_contents', None) is None:
+    # Assets stored before contents were indexed need it built once.
+    managed_asset.operation_contents = {}
+    for asset_operation in get_operations(managed_asset).values():
+      managed_asset.operation_contents.setdefault(
+          get_content_key(asset_operation), []).append(
+              asset_operation.get_id())
+
+  return managed_asset.operation_contents
+
+
+def get_holdings_index(
+        managed_asset: asset.Asset) -> holdings_index.HoldingsIndex:
+  """Gets the index of the units held of the asset over time.
+
+  Args:
+    managed_asset: Asset for which to retrieve index.
+
+  Returns:
+    Index of the changes of units held by buy and sell operations.
+  """
+  if getattr(managed_asset, 'holdings_index', None) is None:
+    # Assets stored before holdings were indexed need it built once.
+    managed_asset.holdings_index = holdings_index.HoldingsIndex()
+    for asset_operation in get_operations(managed_asset).values():
+      _add_operation_to_holdings(
+          managed_asset.holdings_index, asset_operation)
+
+  return managed_asset.holdings_index
+
+
+def get_adjustment_index(
+        managed_asset: asset.Asset) -> adjustment_index.AdjustmentIndex:
+  """Gets the cumulative adjustments of the asset corporate actions.
+
+  Args:
+    managed_asset: Asset for which to retrieve index.
+
+  Returns:
+    Index of the quantity and price factors of corporate actions by date.
+  """
+  if getattr(managed_asset, 'adjustment_index', None) is None:
+    # Built again when actions change, or once for assets stored before
+    # corporate actions were kept.
+    managed_asset.adjustment_index = adjustment_index.AdjustmentIndex(
+        (asset_action.timestamp.timestamp(),
+         *get_corporate_action_factors(asset_action))
+        for asset_action in get_corporate_actions(managed_asset).values())
+
+  return managed_asset.adjustment_index
+
+
+def get_simulated_asset(
+        managed_asset: asset.Asset,
+        new_operations: Sequence[operation.Operation]) -> asset.Asset:
+  """Gets a view of the asset as if operations were added to it.
+
+  The asset is not changed. The view reads the asset operations with the new
+  ones on top, and only copies running totals, so the operation history is
+  not copied.
+
+  Args:
+    managed_asset: Asset on which to simulate operations.
+    new_operations: Operations to simulate.
+
+  Raises:
+    OversellError: operations sell more units than held at their date, or
+        leave later sells with more units than held.
+    ExchangeRateError: operation prices can not be converted to the asset
+        currency.
+
+  Returns:
+    Copy of the asset with the new operations, from which to calculate
+    positions.
+  """
+  for new_operation in new_operations:
+    _check_currency(managed_asset, new_operation)
+  _check_holdings(managed_asset, new_operations)
+
+  simulated_asset = copy.copy(managed_asset)
+  simulated_asset.operations = collections.ChainMap(
+      {op.get_id(): op for op in new_operations},
+      get_operations(managed_asset))
+  simulated_asset.operation_totals = {
+      totals_key: copy.copy(totals)
+      for totals_key, totals in get_operation_totals(managed_asset).items()
+  }
+  for new_operation in new_operations:
+    _add_operation_to_totals(simulated_asset.operation_totals, new_operation)
+
+  # Other indexes are not needed for positions. They are built from the
+  # view if requested, rather than changing those of the asset.
+  simulated_asset.operation_index = None
+  simulated_asset.operation_contents = None
+  simulated_asset.holdings_index = None
+
+  return simulated_asset
+
+
+def get_content_key(asset_operation: operation.Operation) -> ContentKey:
+  """Gets the key by which operations with the same contents are found."""
+  return (
+      asset_operation.managed_asset.get_id(),
+      asset_operation.timestamp,
+      asset_operation.operation_type,
+      asset_operation.quantity,
+      asset_operation.price_per_unit,
+      asset_operation.operation_currency,
+  )
+
+
+def get_index_key(asset_operation: operation.Operation) -> IndexKey:
+  """Gets the key by which an operation is sorted in the index."""
+  return (asset_operation.timestamp.timestamp(), asset_operation.get_id())
+
+
+def get_holdings_key(asset_operation: operation.Operation) -> HoldingsKey:
+  """Gets the key by which an operation is sorted in the holdings index."""
+  return (
+      asset_operation.timestamp.timestamp(),
+      _HOLDINGS_ORDER.get(asset_operation.operation_type, 0),
+      asset_operation.get_id(),
+  )
+
+
+def get_adjustment_factors(asset_operation: operation.Operation) -> Adjustment:
+  """Gets the factors adjusting an operation for later corporate actions.
+
+  Dividends keep the value paid, so only their units are adjusted.
+
+  Args:
+    asset_operation: Operation to adjust.
+
+  Returns:
+    Factors by which to multiply the operation quantity and price, to express
+    them in the current units of the asset.
+  """
+  managed_asset = asset_operation.managed_asset
+  quantity_factor, price_factor = get_adjustment_index(
+      managed_asset).get_factors(asset_operation.timestamp.timestamp())
+  if asset_operation.operation_type == operation.OperationType.DIVIDEND:
+    price_factor = 1 / quantity_factor
+  return (quantity_factor, price_factor)
+
+
+def get_corporate_action_factors(
+        asset_action: corporate_action.CorporateAction) -> Adjustment:
+  """Gets the factors by which a corporate action changes units and prices.
+
+  Args:
+    asset_action: Corporate action to apply.
+
+  Returns:
+    Factors by which to multiply quantities and prices before the action.
+  """
+  # Ratios are read as written, e.g. 0.8237 as 8237/10000.
+  ratio = fractions.Fraction(str(asset_action.ratio))
+  action_type = asset_action.action_type
+  if action_type == corporate_action.CorporateActionType.SPLIT:
+    return (ratio, 1 / ratio)
+  elif action_type == corporate_action.CorporateActionType.REVERSE_SPLIT:
+    return (1 / ratio, ratio)
+  return (adjustment_index.Factor(1), ratio)
+
+
 def update_asset(managed_portfolio: portfolio.Portfolio,
                  managed_asset: asset.Asset,
                  asset_name: Optional[Text] = None,
@@ -199,16 +644,318 @@ def update_asset(managed_portfolio: portfolio.Portfolio,
     asset_price: Price of the asset.
     asset_currency: Currency of the asset price.
 
+  Raises:
+    ExchangeRateError: asset currency can not be converted to the portfolio
+        currency, or operation prices can not be converted to it.
+
   Returns:
     Asset updated.
   """
-  if asset_name and asset_name != managed_asset.name:
-    managed_asset.name = asset_name
-  if asset_price and asset_price != managed_asset.current_price:
-    managed_asset.current_price = asset_price
-  if asset_currency and asset_currency != managed_asset.currency:
-    managed_asset.currency = asset_currency
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    if asset_currency and asset_currency != managed_asset.currency:
+      _check_asset_currency(managed_portfolio, managed_asset, asset_currency)
+
+    if asset_name and asset_name != managed_asset.name:
+      managed_asset.name = asset_name
+    if asset_price and asset_price != managed_asset.current_price:
+      managed_asset.current_price = asset_price
+    if asset_currency and asset_currency != managed_asset.currency:
+      managed_asset.currency = asset_currency
 
-  portfolio_manager.store_portfolio(managed_portfolio)
+    managed_asset.increment_version()
+    portfolio_manager.store_portfolio(managed_portfolio)
 
   return managed_asset
+
+
+def _add_operation_to_totals(
+        asset_totals: Mapping[TotalsKey, operation_totals.OperationTotals],
+        asset_operation: operation.Operation):
+  """Adds an operation to the running totals of an asset.
+
+  Args:
+    asset_totals: Running totals of the asset.
+    asset_operation: Operation to add.
+  """
+  totals_key = _get_totals_key(asset_operation)
+  totals = asset_totals.setdefault(
+      totals_key, operation_totals.OperationTotals())
+
+  timestamp = asset_operation.timestamp
+  totals.quantity += asset_operation.quantity
+  totals.value += asset_operation.quantity * asset_operation.price_per_unit
+  totals.count += 1
+  if not totals.first_timestamp or timestamp < totals.first_timestamp:
+    totals.first_timestamp = timestamp
+  if not totals.last_timestamp or timestamp > totals.last_timestamp:
+    totals.last_timestamp = timestamp
+
+
+def _remove_operation_from_totals(
+        asset_totals: Mapping[TotalsKey, operation_totals.OperationTotals],
+        remaining_operations: Sequence[operation.Operation],
+        asset_operation: operation.Operation):
+  """Removes an operation from the running totals of an asset.
+
+  Only removing the earliest or latest operation requires going through the
+  remaining operations to find the new boundaries.
+
+  Args:
+    asset_totals: Running totals of the asset.
+    remaining_operations: Operations of the asset after removal.
+    asset_operation: Operation to remove.
+  """
+  totals_key = _get_totals_key(asset_operation)
+  totals = asset_totals[totals_key]
+
+  totals.quantity -= asset_operation.quantity
+  totals.value -= asset_operation.quantity * asset_operation.price_per_unit
+  totals.count -= 1
+  if not totals.count:
+    del asset_totals[totals_key]
+    return
+
+  timestamp = asset_operation.timestamp
+  if timestamp in (totals.first_timestamp, totals.last_timestamp):
+    timestamps = [
+        op.timestamp for op in remaining_operations
+        if _get_totals_key(op) == totals_key
+    ]
+    totals.first_timestamp = min(timestamps)
+    totals.last_timestamp = max(timestamps)
+
+
+def _add_operation_to_index(asset_index: OperationIndex,
+                            asset_operation: operation.Operation):
+  """Adds an operation to the index of an asset, keeping it sorted.
+
+  Args:
+    asset_index: Index of the asset operations.
+    asset_operation: Operation to add.
+  """
+  index_keys = asset_index.setdefault(asset_operation.operation_type, [])
+  bisect.insort(index_keys, get_index_key(asset_operation))
+
+
+def _remove_operation_from_index(asset_index: OperationIndex,
+                                 asset_operation: operation.Operation):
+  """Removes an operation from the index of an asset.
+
+  Args:
+    asset_index: Index of the asset operations.
+    asset_operation: Operation to remove.
+  """
+  index_keys = asset_index.get(asset_operation.operation_type, [])
+  index_key = get_index_key(asset_operation)
+  key_position = bisect.bisect_left(index_keys, index_key)
+  if key_position < len(index_keys) and index_keys[key_position] == index_key:
+    del index_keys[key_position]
+
+
+def _remove_operation_from_contents(asset_contents: ContentIndex,
+                                    asset_operation: operation.Operation):
+  """Removes an operation from the contents index of an asset.
+
+  Args:
+    asset_contents: Index of the asset operations by their contents.
+    asset_operation: Operation to remove.
+  """
+  content_key = get_content_key(asset_operation)
+  operation_ids = asset_contents.get(content_key, [])
+  if asset_operation.get_id() in operation_ids:
+    operation_ids.remove(asset_operation.get_id())
+  if not operation_ids:
+    asset_contents.pop(content_key, None)
+
+
+def _add_operation_to_holdings(asset_holdings: holdings_index.HoldingsIndex,
+                               asset_operation: operation.Operation):
+  """Adds the units bought or sold by an operation to the holdings index.
+
+  Args:
+    asset_holdings: Index of the units held of the asset.
+    asset_operation: Operation to add. Dividends are not added.
+  """
+  if asset_operation.operation_type == operation.OperationType.BUY:
+    asset_holdings.add(
+        get_holdings_key(asset_operation),
+        _get_initial_quantity(asset_operation))
+  elif asset_operation.operation_type == operation.OperationType.SELL:
+    asset_holdings.add(
+        get_holdings_key(asset_operation),
+        -_get_initial_quantity(asset_operation))
+
+
+def _remove_operation_from_holdings(
+        asset_holdings: holdings_index.HoldingsIndex,
+        asset_operation: operation.Operation):
+  """Removes the units bought or sold by an operation from the holdings index.
+
+  Args:
+    asset_holdings: Index of the units held of the asset.
+    asset_operation: Operation to remove.
+  """
+  if asset_operation.operation_type in _HOLDINGS_ORDER:
+    asset_holdings.remove(get_holdings_key(asset_operation))
+
+
+def _get_totals_key(asset_operation: operation.Operation) -> TotalsKey:
+  """Gets the key under which an operation is added up."""
+  return (asset_operation.operation_type, asset_operation.operation_currency)
+
+
+def _check_asset_currency(managed_portfolio: portfolio.Portfolio,
+                          managed_asset: Optional[asset.Asset],
+                          asset_currency: Text):
+  """Checks an asset currency can be converted as positions need.
+
+  Portfolio summaries convert positions to the portfolio currency, and
+  positions convert operation prices to the asset currency.
+
+  Args:
+    managed_portfolio: Portfolio where asset is.
+    managed_asset: Asset whose currency changes, or None if new.
+    asset_currency: Currency to check.
+
+  Raises:
+    ExchangeRateError: no exchange rate found for the currencies.
+  """
+  if not asset_currency:
+    return
+  currency_manager.get_exchange_rate(
+      asset_currency, managed_portfolio.currency)
+  if not managed_asset:
+    return
+  for _, operation_currency in get_operation_totals(managed_asset):
+    currency_manager.get_exchange_rate(operation_currency, asset_currency)
+
+
+def _check_currency(managed_asset: asset.Asset,
+                    asset_operation: operation.Operation):
+  """Checks operation price can be converted to the asset currency.
+
+  Positions add up operation prices in the asset currency, so operations in
+  a currency without exchange rates would make them fail.
+
+  Args:
+    managed_asset: Asset for which operation happened.
+    asset_operation: Operation to check.
+
+  Raises:
+    ExchangeRateError: no exchange rate found for the currencies.
+  """
+  if not managed_asset.currency:
+    return
+  currency_manager.get_exchange_rate(
+      asset_operation.operation_currency, managed_asset.currency,
+      asset_operation.timestamp)
+
+
+def _check_holdings(managed_asset: asset.Asset,
+                    new_operations: Sequence[operation.Operation]):
+  """Checks that operations would not sell more units than held.
+
+  Args:
+    managed_asset: Asset to which operations would be added.
+    new_operations: Operations to check, without adding them.
+
+  Raises:
+    OversellError: operations sell more units than held at some date.
+  """
+  holdings_changes = sorted(
+      (get_holdings_key(new_operation), new_operation)
+      for new_operation in new_operations
+      if new_operation.operation_type in _HOLDINGS_ORDER)
+  asset_holdings = get_holdings_index(managed_asset)
+
+  # Units of the new operations are added to those held between each of
+  # them and the next one.
+  new_quantity = 0
+  end_keys = [holdings_key for holdings_key, _ in holdings_changes[1:]]
+  for (holdings_key, new_operation), end_key in itertools.zip_longest(
+          holdings_changes, end_keys):
+    quantity = _get_initial_quantity(new_operation)
+    if new_operation.operation_type == operation.OperationType.SELL:
+      quantity = -quantity
+    new_quantity += quantity
+
+    lowest_quantity = new_quantity + asset_holdings.get_lowest_quantity(
+        holdings_key, end_key)
+    if lowest_quantity < 0:
+      raise OversellError(
+          f'{new_operation} leaves {managed_asset} with '
+          f'{_get_quantity(new_operation, -lowest_quantity)} more units sold '
+          'than held from its date on.')
+
+
+def _get_initial_quantity(asset_operation: operation.Operation) -> Quantity:
+  """Gets the quantity of an operation in units before corporate actions.
+
+  Holdings are indexed in these units, which do not change when actions are
+  added after all operations, e.g. a split recorded when it happens.
+
+  Args:
+    asset_operation: Operation whose quantity to adjust.
+
+  Returns:
+    Quantity in units before all corporate actions of the asset.
+  """
+  quantity_factor = get_adjustment_index(
+      asset_operation.managed_asset).get_initial_quantity_factor(
+          asset_operation.timestamp.timestamp())
+  if quantity_factor == 1:
+    return asset_operation.quantity
+  return asset_operation.quantity * quantity_factor
+
+
+def _get_quantity(asset_operation: operation.Operation,
+                  initial_quantity: Quantity) -> float:
+  """Gets a quantity before corporate actions in the units of an operation.
+
+  Args:
+    asset_operation: Operation whose units to use.
+    initial_quantity: Quantity in units before all corporate actions.
+
+  Returns:
+    Quantity in units at the date of the operation.
+  """
+  quantity_factor = get_adjustment_index(
+      asset_operation.managed_asset).get_initial_quantity_factor(
+          asset_operation.timestamp.timestamp())
+  if quantity_factor == 1:
+    return initial_quantity
+  return float(initial_quantity / quantity_factor)
+
+
+def _update_adjustments(managed_asset: asset.Asset,
+                        asset_action: corporate_action.CorporateAction):
+  """Updates the indexes of an asset after one of its actions changed.
+
+  Args:
+    managed_asset: Asset whose actions changed.
+    asset_action: Corporate action added or removed.
+
+  Raises:
+    OversellError: operations after the action sell more units than held.
+  """
+  managed_asset.adjustment_index = None
+
+  quantity_factor, _ = get_corporate_action_factors(asset_action)
+  if quantity_factor == 1:
+    return
+
+  # Operations at or after the action are indexed in other units now.
+  asset_index = get_operation_index(managed_asset)
+  action_timestamp = asset_action.timestamp.timestamp()
+  if any(
+      asset_index.get(operation_type) and
+      asset_index[operation_type][-1][0] >= action_timestamp
+      for operation_type in _HOLDINGS_ORDER):
+    managed_asset.holdings_index = None
+    # Keys of operations at the action date sort after its timestamp alone.
+    lowest_quantity = get_holdings_index(managed_asset).get_lowest_quantity(
+        (action_timestamp,))
+    if lowest_quantity < 0:
+      raise OversellError(
+          f'{asset_action} leaves later sells of {managed_asset} with more '
+          'units than held.')
@@ -0,0 +1,329 @@
+"""Consolidates positions of the same trackers across portfolios."""
+
+import collections
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
+import os
+import threading
+from models import consolidated_position
+from models import portfolio
+from services import currency_manager
+from services import metrics_manager
+from services import portfolio_manager
+from services import position_manager
+from typing import List, Mapping, Optional, Sequence, Text, Tuple
+
+# Number of processes computing positions. Below two, positions are computed
+# in the calling process.
+_WORKERS_ENVIRONMENT_VARIABLE = 'FINANCE_TRACKER_CONSOLIDATION_WORKERS'
+# Consolidations kept for different selections of portfolios.
+_MAX_CACHED_CONSOLIDATIONS = 32
+
+# Tracker, currency, quantity, market value, realized P&L, unrealized P&L,
+# dividends, cost basis and sold cost basis of an asset position.
+PositionRow = Tuple[Text, Text, int, float, float, float, float, float, float]
+
+# Position rows of each portfolio and valuation method, together with the
+# portfolio and exchange rates version they were computed at.
+_PORTFOLIO_ROWS = {}
+# Consolidated positions of each selection of portfolio versions, valuation
+# method and exchange rates version.
+_CONSOLIDATIONS = collections.OrderedDict()
+_CONSOLIDATIONS_LOCK = threading.Lock()
+
+_EXECUTOR = None
+# Exchange rates version at which the executor processes were started.
+_EXECUTOR_RATES_VERSION = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_consolidated_positions(
+    managed_portfolios: Sequence[portfolio.Portfolio],
+    valuation_method: position_manager.ValuationMethod = (
+        position_manager.ValuationMethod.FIFO)
+) -> List[consolidated_position.ConsolidatedPosition]:
+  """Gets positions across portfolios, merged by tracker and currency.
+
+  Results are cached on the version of every portfolio. Portfolios which
+  changed since they were last consolidated are computed in parallel
+  processes.
+
+  Args:
+    managed_portfolios: Portfolios from which to consolidate positions.
+    valuation_method: Inventory valuation method to calculate returns.
+
+  Returns:
+    Consolidated positions, sorted by tracker and currency.
+  """
+  rates_version = currency_manager.get_rates_version()
+  portfolio_versions = tuple(sorted(
+      (managed_portfolio.get_id(), managed_portfolio.get_version())
+      for managed_portfolio in managed_portfolios))
+  cache_key = (portfolio_versions, valuation_method, rates_version)
+
+  with _CONSOLIDATIONS_LOCK:
+    if cache_key in _CONSOLIDATIONS:
+      _CONSOLIDATIONS.move_to_end(cache_key)
+      return _CONSOLIDATIONS[cache_key]
+
+  with metrics_manager.span('consolidate_positions'):
+    portfolio_rows = _get_portfolios_rows(
+        managed_portfolios, valuation_method, rates_version)
+    consolidated_positions = _merge_position_rows(portfolio_rows)
+
+  with _CONSOLIDATIONS_LOCK:
+    _CONSOLIDATIONS[cache_key] = consolidated_positions
+    while len(_CONSOLIDATIONS) > _MAX_CACHED_CONSOLIDATIONS:
+      _CONSOLIDATIONS.popitem(last=False)
+
+  return consolidated_positions
+
+
+def get_position_rows(
+    managed_portfolio: portfolio.Portfolio,
+    valuation_method: position_manager.ValuationMethod
+) -> List[PositionRow]:
+  """Gets the positions of a portfolio as rows of values to consolidate.
+
+  Args:
+    managed_portfolio: Portfolio from which to obtain positions.
+    valuation_method: Inventory valuation method to calculate returns.
+
+  Returns:
+    Position rows of all assets in the portfolio.
+  """
+  portfolio_positions = position_manager.get_positions(
+      managed_portfolio, valuation_method)
+  return [
+      (
+          managed_asset.get_tracker(),
+          managed_asset.currency or managed_portfolio.currency,
+          asset_position.quantity,
+          asset_position.market_value,
+          asset_position.realized_pl,
+          asset_position.unrealized_pl,
+          asset_position.dividends,
+          asset_position.cost_basis,
+          asset_position.sold_cost_basis,
+      )
+      for managed_asset, asset_position in portfolio_positions.items()
+  ]
+
+
+def _get_portfolios_rows(
+    managed_portfolios: Sequence[portfolio.Portfolio],
+    valuation_method: position_manager.ValuationMethod,
+    rates_version: int
+) -> Mapping[Text, List[PositionRow]]:
+  """Gets position rows of many portfolios, computing only changed ones.
+
+  Args:
+    managed_portfolios: Portfolios from which to obtain positions.
+    valuation_method: Inventory valuation method to calculate returns.
+    rates_version: Version of the exchange rates.
+
+  Returns:
+    Map of portfolio ids and their position rows.
+  """
+  portfolio_rows = {}
+  changed_portfolios = {}
+  for managed_portfolio in managed_portfolios:
+    cache_key = (managed_portfolio.get_id(), valuation_method)
+    version = (managed_portfolio.get_version(), rates_version)
+    cached_version, rows = _PORTFOLIO_ROWS.get(cache_key, (None, None))
+    if cached_version == version:
+      portfolio_rows[managed_portfolio.get_id()] = rows
+    else:
+      changed_portfolios[managed_portfolio] = version
+
+  computed_rows = _compute_portfolios_rows(
+      list(changed_portfolios), valuation_method, rates_version)
+  for managed_portfolio, version in changed_portfolios.items():
+    rows = computed_rows[managed_portfolio.get_id()]
+    _PORTFOLIO_ROWS[(managed_portfolio.get_id(), valuation_method)] = (
+        version, rows)
+    portfolio_rows[managed_portfolio.get_id()] = rows
+
+  return portfolio_rows
+
+
+def _compute_portfolios_rows(
+    managed_portfolios: Sequence[portfolio.Portfolio],
+    valuation_method: position_manager.ValuationMethod,
+    rates_version: int
+) -> Mapping[Text, List[PositionRow]]:
+  """Computes position rows of many portfolios in parallel processes.
+
+  Processes load each stored portfolio themselves, so portfolios are not
+  sent to them. Portfolios not stored at their current version, or which fail
+  to be computed in other processes, are computed in this process.
+
+  Args:
+    managed_portfolios: Portfolios from which to obtain positions.
+    valuation_method: Inventory valuation method to calculate returns.
+    rates_version: Version of the exchange rates.
+
+  Returns:
+    Map of portfolio ids and their position rows.
+  """
+  executor = None
+  if len(managed_portfolios) > 1:
+    executor = _get_executor(rates_version)
+
+  stored_rows = {}
+  if executor:
+    storage_path = portfolio_manager.get_storage_path()
+    try:
+      stored_rows = {
+          managed_portfolio.get_id(): executor.submit(
+              _compute_stored_portfolio_rows, storage_path,
+              managed_portfolio.get_id(), managed_portfolio.get_version(),
+              valuation_method)
+          for managed_portfolio in managed_portfolios
+      }
+    except concurrent.futures.process.BrokenProcessPool as error:
+      print(f'Unable to compute positions in other processes: {error}')
+      _shutdown_executor(executor)
+
+  portfolio_rows = {}
+  for managed_portfolio in managed_portfolios:
+    portfolio_id = managed_portfolio.get_id()
+    rows = None
+    if portfolio_id in stored_rows:
+      try:
+        rows = stored_rows[portfolio_id].result()
+      except concurrent.futures.process.BrokenProcessPool as error:
+        print(f'Unable to compute {managed_portfolio} positions: {error}')
+        _shutdown_executor(executor)
+      except Exception as error:
+        print(f'Unable to compute {managed_portfolio} positions: {error}')
+
+    if rows is None:
+      rows = get_position_rows(managed_portfolio, valuation_method)
+    portfolio_rows[portfolio_id] = rows
+
+  return portfolio_rows
+
+
+def _compute_stored_portfolio_rows(
+    storage_path: Text,
+    portfolio_id: Text,
+    portfolio_version: int,
+    valuation_method: position_manager.ValuationMethod
+) -> Optional[List[PositionRow]]:
+  """Computes position rows of a stored portfolio, in a worker process.
+
+  Args:
+    storage_path: Folder where portfolios are stored.
+    portfolio_id: Id of the portfolio.
+    portfolio_version: Version of the portfolio to compute.
+    valuation_method: Inventory valuation method to calculate returns.
+
+  Returns:
+    Position rows of all assets in the portfolio. None if the portfolio is
+    not stored at the given version.
+  """
+  if portfolio_manager.get_storage_path() != storage_path:
+    portfolio_manager.set_storage_path(storage_path)
+
+  managed_portfolio = portfolio_manager.load_portfolio(portfolio_id)
+  if (not managed_portfolio or
+      managed_portfolio.get_version() != portfolio_version):
+    return None
+
+  return get_position_rows(managed_portfolio, valuation_method)
+
+
+def _merge_position_rows(
+    portfolio_rows: Mapping[Text, Sequence[PositionRow]]
+) -> List[consolidated_position.ConsolidatedPosition]:
+  """Adds up position rows of the same tracker and currency.
+
+  Args:
+    portfolio_rows: Map of portfolio ids and their position rows.
+
+  Returns:
+    Consolidated positions, sorted by tracker and currency.
+  """
+  totals = {}
+  holders = {}
+  for portfolio_id, rows in portfolio_rows.items():
+    for tracker, currency, *values in rows:
+      position_key = (tracker, currency)
+      position_totals = totals.get(position_key)
+      totals[position_key] = (
+          values if position_totals is None else
+          [total + value for total, value in zip(position_totals, values)])
+      holders.setdefault(position_key, {})[portfolio_id] = True
+
+  consolidated_positions = []
+  for position_key, position_totals in sorted(totals.items()):
+    tracker, currency = position_key
+    (quantity, market_value, realized_pl, unrealized_pl, dividends,
+     cost_basis, sold_cost_basis) = position_totals
+    consolidated_positions.append(consolidated_position.ConsolidatedPosition(
+        tracker,
+        currency,
+        list(holders[position_key]),
+        quantity,
+        market_value,
+        realized_pl,
+        realized_pl / sold_cost_basis if sold_cost_basis > 0 else 0,
+        unrealized_pl,
+        unrealized_pl / cost_basis if cost_basis > 0 else 0,
+        dividends,
+        cost_basis,
+        sold_cost_basis))
+
+  return consolidated_positions
+
+
+def _get_executor(rates_version: int
+                  ) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+  """Gets the pool of processes computing positions.
+
+  Processes are started again when exchange rates change, so they load the
+  latest rates.
+
+  Args:
+    rates_version: Version of the exchange rates.
+
+  Returns:
+    Pool of processes. None if positions are computed in this process.
+  """
+  global _EXECUTOR
+  global _EXECUTOR_RATES_VERSION
+
+  workers = int(os.environ.get(
+      _WORKERS_ENVIRONMENT_VARIABLE, os.cpu_count() or 1))
+  if workers < 2:
+    return None
+
+  with _EXECUTOR_LOCK:
+    if _EXECUTOR and _EXECUTOR_RATES_VERSION != rates_version:
+      _EXECUTOR.shutdown(wait=False)
+      _EXECUTOR = None
+
+    if not _EXECUTOR:
+      # Processes are spawned rather than forked, as forking copies the
+      # locks held by other threads of this process.
+      _EXECUTOR = concurrent.futures.ProcessPoolExecutor(
+          workers, mp_context=multiprocessing.get_context('spawn'))
+      _EXECUTOR_RATES_VERSION = rates_version
+
+    return _EXECUTOR
+
+
+def _shutdown_executor(executor: concurrent.futures.ProcessPoolExecutor):
+  """Shuts down a pool of processes, so a new one is started next time.
+
+  Args:
+    executor: Pool of processes, e.g. one where a process terminated.
+  """
+  global _EXECUTOR
+
+  with _EXECUTOR_LOCK:
+    if _EXECUTOR is executor:
+      _EXECUTOR = None
+  executor.shutdown(wait=False)
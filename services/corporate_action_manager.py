@@ -0,0 +1,97 @@
+"""Manages corporate actions of assets in a portfolio."""
+
+import datetime
+from models import asset
+from models import corporate_action
+from models import portfolio
+from services import asset_manager
+from services import portfolio_manager
+from typing import List, Text
+
+
+def add_corporate_action(
+    managed_portfolio: portfolio.Portfolio,
+    managed_asset: asset.Asset,
+    timestamp: datetime.datetime,
+    action_type: corporate_action.CorporateActionType,
+    ratio: float
+) -> corporate_action.CorporateAction:
+  """Records a corporate action of an asset within a portfolio.
+
+  Args:
+    managed_portfolio: Portfolio where asset is.
+    managed_asset: Asset affected by the action.
+    timestamp: Date and time when action took effect.
+    action_type: Type of corporate action.
+    ratio: Units after a split for each unit before, units before a reverse
+        split for each unit after, or fraction of the value kept after a
+        spin-off.
+
+  Raises:
+    ValueError: ratio is not valid for the action type.
+    OversellError: action leaves later sells with more units than held.
+
+  Returns:
+    Created corporate action.
+  """
+  new_action = corporate_action.CorporateAction(
+      managed_asset, timestamp, action_type, ratio)
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    asset_manager.add_corporate_action(managed_asset, new_action)
+    portfolio_manager.store_portfolio(managed_portfolio)
+  return new_action
+
+
+def delete_corporate_action(
+    managed_portfolio: portfolio.Portfolio,
+    action_to_remove: corporate_action.CorporateAction):
+  """Removes a corporate action from a portfolio.
+
+  Args:
+    managed_portfolio: Portfolio from which to remove action.
+    action_to_remove: Corporate action to remove.
+
+  Raises:
+    ValueError: action not found in its asset.
+    OversellError: removing the action leaves later sells with more units
+        than held.
+  """
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    asset_manager.delete_corporate_action(
+        action_to_remove.managed_asset, action_to_remove)
+    portfolio_manager.store_portfolio(managed_portfolio)
+
+
+def get_corporate_action_type(
+        action_type_name: Text) -> corporate_action.CorporateActionType:
+  """Gets a corporate action type based on name.
+
+  Args:
+    action_type_name: Name of the type of corporate action, e.g. split or
+        reverse_split.
+
+  Raises:
+    ValueError: unknown corporate action type.
+
+  Returns:
+    Type of the corporate action.
+  """
+  type_name = action_type_name.upper().replace('-', '_')
+  if type_name not in corporate_action.CorporateActionType.__members__:
+    raise ValueError(f'Unknown corporate action type: {action_type_name}.')
+  return corporate_action.CorporateActionType[type_name]
+
+
+def get_corporate_actions(
+        managed_asset: asset.Asset) -> List[corporate_action.CorporateAction]:
+  """Gets the corporate actions of an asset.
+
+  Args:
+    managed_asset: Asset for which to retrieve actions.
+
+  Returns:
+    Corporate actions of the asset, sorted by date.
+  """
+  return sorted(
+      asset_manager.get_corporate_actions(managed_asset).values(),
+      key=lambda asset_action: asset_action.timestamp)
@@ -0,0 +1,345 @@
+"""Converts values between currencies using locally stored exchange rates."""
+
+import datetime
+import functools
+import glob
+import hashlib
+import os
+import numpy as np
+
+from services import file_manager
+from typing import Mapping, Optional, Sequence, Text, Tuple, Union
+
+_EXCHANGE_RATE_STORAGE_PATH = 'exchange_rates'
+_EXCHANGE_RATE_GLOB_FILES = f'{_EXCHANGE_RATE_STORAGE_PATH}/*.csv'
+_EXCHANGE_RATE_FILE_HEADER = 'date,rate'
+_PAIR_SEPARATOR = '_'
+# Currency through which rates are crossed when a pair is not stored.
+_PIVOT_CURRENCY = 'USD'
+_RATE_CACHE_SIZE = 65536
+
+CurrencyPair = Tuple[Text, Text]
+PairRates = Mapping[datetime.date, float]
+
+# Rates of each currency pair by date. Rates are how many units of the second
+# currency are worth one unit of the first currency.
+_EXCHANGE_RATES = {}
+# Sorted timestamps and rates of each pair, built on demand for lookups.
+_RATE_INDEX = {}
+_LOADED = False
+# Changes every time stored rates change, so derived values can be cached.
+_RATES_VERSION = 0
+# Rates version and digest of the rates at that version.
+_RATES_FINGERPRINT = (None, None)
+
+
+class ExchangeRateError(ValueError):
+  """No exchange rate is stored between two currencies."""
+
+
+def convert_value(value: float, from_currency: Text, to_currency: Text,
+                  date: Optional[datetime.date] = None) -> float:
+  """Converts a value from one currency to another.
+
+  Args:
+    value: Value to convert.
+    from_currency: Currency in which value is expressed.
+    to_currency: Currency to which convert the value.
+    date: Date of the exchange rate to use. Defaults to latest rate.
+
+  Raises:
+    ExchangeRateError: no exchange rate found for the currencies.
+
+  Returns:
+    Value expressed in the new currency.
+  """
+  return value * get_exchange_rate(from_currency, to_currency, date)
+
+
+def convert_values(values: np.ndarray,
+                   from_currencies: Union[Text, Sequence[Text]],
+                   to_currency: Text,
+                   timestamps: Optional[np.ndarray] = None) -> np.ndarray:
+  """Converts an array of values to a currency at once.
+
+  Args:
+    values: Values to convert.
+    from_currencies: Currency of each value, or a single one for all of them.
+    to_currency: Currency to which convert the values.
+    timestamps: POSIX timestamp of the rate to use for each value. Defaults to
+        latest rates.
+
+  Raises:
+    ExchangeRateError: no exchange rate found for the currencies.
+
+  Returns:
+    Values expressed in the new currency.
+  """
+  values = np.asarray(values, dtype=float)
+  if isinstance(from_currencies, str):
+    from_currencies = np.full(values.shape, from_currencies, dtype=object)
+  else:
+    from_currencies = np.asarray(from_currencies, dtype=object)
+
+  rates = np.ones(values.shape)
+  for from_currency in set(from_currencies.tolist()):
+    if is_same_currency(from_currency, to_currency):
+      continue
+    currency_mask = from_currencies == from_currency
+    currency_timestamps = (
+        timestamps[currency_mask] if timestamps is not None else None)
+    rates[currency_mask] = _get_exchange_rates(
+        from_currency, to_currency, currency_timestamps,
+        int(currency_mask.sum()))
+
+  return values * rates
+
+
+def get_exchange_rate(from_currency: Text, to_currency: Text,
+                      date: Optional[datetime.date] = None) -> float:
+  """Gets the exchange rate between two currencies.
+
+  Rates are looked up for the latest date on or before the given date. Dates
+  before the first stored rate use the first stored rate.
+
+  Args:
+    from_currency: Currency to convert from.
+    to_currency: Currency to convert to.
+    date: Date of the exchange rate. Defaults to latest rate.
+
+  Raises:
+    ExchangeRateError: no exchange rate found for the currencies.
+
+  Returns:
+    Units of to_currency worth one unit of from_currency.
+  """
+  if is_same_currency(from_currency, to_currency):
+    return 1.0
+
+  if isinstance(date, datetime.datetime):
+    date = date.date()
+
+  return _get_cached_exchange_rate(
+      from_currency.upper(), to_currency.upper(), date)
+
+
+def get_exchange_rates() -> Mapping[CurrencyPair, PairRates]:
+  """Gets all the stored exchange rates.
+
+  Returns:
+    Map of currency pairs and their rates by date.
+  """
+  global _LOADED
+
+  if not _LOADED:
+    for rates_filename in glob.glob(_EXCHANGE_RATE_GLOB_FILES):
+      load_exchange_rates(rates_filename)
+    _LOADED = True
+
+  return _EXCHANGE_RATES
+
+
+def get_rates_version() -> int:
+  """Gets the version of the stored rates, which changes when they change."""
+  get_exchange_rates()
+  return _RATES_VERSION
+
+
+def get_rates_fingerprint() -> Text:
+  """Gets a digest of the stored rates, which changes when they change.
+
+  Unlike the rates version, the digest is the same across processes and
+  restarts, so it can be stored with values derived from the rates.
+  """
+  global _RATES_FINGERPRINT
+
+  rates_version = get_rates_version()
+  fingerprint_version, fingerprint = _RATES_FINGERPRINT
+  if fingerprint_version != rates_version:
+    rates_digest = hashlib.sha256()
+    for currency_pair, pair_rates in sorted(_EXCHANGE_RATES.items()):
+      rates_digest.update(
+          repr((currency_pair, sorted(pair_rates.items()))).encode())
+    fingerprint = rates_digest.hexdigest()
+    _RATES_FINGERPRINT = (rates_version, fingerprint)
+
+  return fingerprint
+
+
+def load_exchange_rates(rates_filename: Text):
+  """Loads exchange rates of a currency pair from a file.
+
+  File must be named after the pair (e.g. EUR_USD.csv) and contain one
+  `date,rate` line per ISO date.
+
+  Args:
+    rates_filename: File from which to load rates.
+
+  Raises:
+    ValueError: file name or contents are not valid.
+  """
+  pair_name, _ = os.path.splitext(os.path.basename(rates_filename))
+  currency_pair = tuple(pair_name.upper().split(_PAIR_SEPARATOR))
+  if len(currency_pair) != 2:
+    raise ValueError(f'Unknown currency pair in {rates_filename}.')
+
+  rates_content = file_manager.get_file_text_content(rates_filename)
+  pair_rates = _EXCHANGE_RATES.setdefault(currency_pair, {})
+  for line in rates_content.splitlines():
+    line = line.strip()
+    if not line or line == _EXCHANGE_RATE_FILE_HEADER:
+      continue
+    rate_date, rate = line.split(',')
+    pair_rates[datetime.date.fromisoformat(rate_date)] = float(rate)
+
+  _clear_cache()
+
+
+def set_exchange_rate(from_currency: Text, to_currency: Text, rate: float,
+                      date: Optional[datetime.date] = None):
+  """Sets and stores the exchange rate of a currency pair.
+
+  Args:
+    from_currency: Currency to convert from.
+    to_currency: Currency to convert to.
+    rate: Units of to_currency worth one unit of from_currency.
+    date: Date of the exchange rate. Defaults to today.
+
+  Raises:
+    ValueError: rate is not positive.
+  """
+  if rate <= 0:
+    raise ValueError(f'Exchange rate must be positive, got {rate}.')
+
+  if isinstance(date, datetime.datetime):
+    date = date.date()
+  date = date or datetime.date.today()
+
+  currency_pair = (from_currency.upper(), to_currency.upper())
+  pair_rates = get_exchange_rates().setdefault(currency_pair, {})
+  pair_rates[date] = rate
+
+  _clear_cache()
+  _store_exchange_rates(currency_pair)
+
+
+def _store_exchange_rates(currency_pair: CurrencyPair):
+  """Stores the exchange rates of a currency pair.
+
+  Args:
+    currency_pair: Pair of currencies to store.
+  """
+  pair_rates = _EXCHANGE_RATES[currency_pair]
+  rate_lines = [_EXCHANGE_RATE_FILE_HEADER] + [
+      f'{rate_date.isoformat()},{rate}'
+      for rate_date, rate in sorted(pair_rates.items())
+  ]
+
+  rates_filename = (
+      f'{_EXCHANGE_RATE_STORAGE_PATH}/'
+      f'{_PAIR_SEPARATOR.join(currency_pair)}.csv')
+  file_manager.create_file(rates_filename, contents='\n'.join(rate_lines))
+
+
+def _clear_cache():
+  """Clears cached rates after stored rates change."""
+  global _RATES_VERSION
+
+  _RATES_VERSION += 1
+  _RATE_INDEX.clear()
+  _get_cached_exchange_rate.cache_clear()
+
+
+def is_same_currency(from_currency: Text, to_currency: Text) -> bool:
+  """Returns whether no conversion is needed between two currencies.
+
+  Missing currencies are considered to be the same currency.
+  """
+  if not from_currency or not to_currency:
+    return True
+  return from_currency.upper() == to_currency.upper()
+
+
+@functools.lru_cache(maxsize=_RATE_CACHE_SIZE)
+def _get_cached_exchange_rate(from_currency: Text, to_currency: Text,
+                              date: Optional[datetime.date]) -> float:
+  """Gets the exchange rate of a pair on a date, cached by pair and date."""
+  timestamps = (
+      np.array([_get_date_timestamp(date)]) if date is not None else None)
+  (rate,) = _get_exchange_rates(from_currency, to_currency, timestamps, 1)
+  return float(rate)
+
+
+def _get_exchange_rates(from_currency: Text, to_currency: Text,
+                        timestamps: Optional[np.ndarray],
+                        count: int) -> np.ndarray:
+  """Gets exchange rates of a pair for many timestamps at once.
+
+  Pairs which are not stored are resolved through their inverse pair or by
+  crossing them through the pivot currency.
+
+  Args:
+    from_currency: Currency to convert from.
+    to_currency: Currency to convert to.
+    timestamps: POSIX timestamp of each rate, None for latest rates.
+    count: Number of rates to get.
+
+  Raises:
+    ExchangeRateError: no exchange rate found for the currencies.
+
+  Returns:
+    Exchange rate at each timestamp.
+  """
+  from_currency, to_currency = from_currency.upper(), to_currency.upper()
+  exchange_rates = get_exchange_rates()
+
+  # Pairs whose files have no rates yet are not stored.
+  if exchange_rates.get((from_currency, to_currency)):
+    return _lookup_rates((from_currency, to_currency), timestamps, count)
+
+  if exchange_rates.get((to_currency, from_currency)):
+    return 1 / _lookup_rates((to_currency, from_currency), timestamps, count)
+
+  if _PIVOT_CURRENCY not in (from_currency, to_currency):
+    try:
+      return (
+          _get_exchange_rates(
+              from_currency, _PIVOT_CURRENCY, timestamps, count) *
+          _get_exchange_rates(
+              _PIVOT_CURRENCY, to_currency, timestamps, count))
+    except ExchangeRateError:
+      pass
+
+  raise ExchangeRateError(
+      f'No exchange rate found from {from_currency} to {to_currency}.')
+
+
+def _lookup_rates(currency_pair: CurrencyPair,
+                  timestamps: Optional[np.ndarray], count: int) -> np.ndarray:
+  """Looks up stored rates of a pair for many timestamps with a binary search.
+
+  Args:
+    currency_pair: Stored pair of currencies.
+    timestamps: POSIX timestamp of each rate, None for latest rates.
+    count: Number of rates to get.
+
+  Returns:
+    Rate at each timestamp.
+  """
+  if currency_pair not in _RATE_INDEX:
+    pair_rates = sorted(_EXCHANGE_RATES[currency_pair].items())
+    _RATE_INDEX[currency_pair] = (
+        np.array([_get_date_timestamp(date) for date, _ in pair_rates]),
+        np.array([rate for _, rate in pair_rates]))
+
+  rate_timestamps, rates = _RATE_INDEX[currency_pair]
+  if timestamps is None:
+    return np.full(count, rates[-1])
+
+  rate_positions = np.searchsorted(rate_timestamps, timestamps, side='right')
+  return rates[np.maximum(rate_positions - 1, 0)]
+
+
+def _get_date_timestamp(date: datetime.date) -> float:
+  """Gets the POSIX timestamp of the start of a date in local time."""
+  return datetime.datetime.combine(date, datetime.time()).timestamp()
@@ -2,7 +2,16 @@
 
 import enum
 import os
-from typing import Optional, Text, Union
+import tempfile
+from typing import IO, Optional, Text, Tuple, Union
+
+try:
+  import fcntl
+except ImportError:  # Not available on Windows.
+  fcntl = None
+
+# Identifies a version of a file: inode, size and modification time.
+FileSignature = Tuple[int, int, int]
 
 
 class OpenMode(enum.Enum):
@@ -47,6 +56,66 @@ def create_file(filename: Text, contents: Optional[Text] = None,
   return _write_file_contents(filename, contents, write_mode)
 
 
+def delete_file(filename: Text):
+  """Deletes a file, if it exists.
+
+  Args:
+    filename: Name of the file to delete.
+  """
+  absolute_filename = _get_absolute_filename(filename)
+  try:
+    os.remove(absolute_filename)
+  except FileNotFoundError:
+    pass
+
+
+def get_file_signature(filename: Text) -> Optional[FileSignature]:
+  """Gets a signature which changes whenever a file or folder is replaced.
+
+  Args:
+    filename: Name of the file or folder.
+
+  Returns:
+    Signature of the file. None if it does not exist.
+  """
+  absolute_filename = _get_absolute_filename(filename)
+  try:
+    file_stat = os.stat(absolute_filename)
+  except FileNotFoundError:
+    return None
+  return (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+
+
+def acquire_lock(filename: Text, blocking: bool = True) -> Optional[IO]:
+  """Locks a file, so only one process at a time holds it.
+
+  The lock is released when the returned file is closed or the process ends.
+  Where file locks are not supported, the lock is always acquired.
+
+  Args:
+    filename: Name of the lock file. It is created if it does not exist.
+    blocking: If True, waits for other processes to release the lock.
+
+  Returns:
+    Open lock file. None if not blocking and another process holds the lock.
+  """
+  absolute_filename = _get_absolute_filename(filename)
+  _create_folders_for_file(absolute_filename)
+
+  lock_file = open(absolute_filename, 'a')
+  if not fcntl:
+    return lock_file
+
+  lock_operation = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+  try:
+    fcntl.flock(lock_file, lock_operation)
+  except BlockingIOError:
+    lock_file.close()
+    return None
+
+  return lock_file
+
+
 def _create_folders_for_file(filename):
   """Creates all folders in filename path.
 
@@ -137,9 +206,18 @@ def _write_file_contents(filename: Text, contents: Union[Text, bytes],
     raise ValueError(f'Unknown write mode {write_mode}.')
 
   absolute_filename = _get_absolute_filename(filename)
-
-  new_file = open(absolute_filename, write_mode.value)
-  new_file.write(contents)
-  new_file.close()
+  file_folder, file_basename = os.path.split(absolute_filename)
+
+  # Contents are written to a hidden file which then replaces the file, so
+  # other processes never read partially written files.
+  temporary_descriptor, temporary_filename = tempfile.mkstemp(
+      prefix=f'.{file_basename}.', suffix='.tmp', dir=file_folder)
+  try:
+    with os.fdopen(temporary_descriptor, write_mode.value) as new_file:
+      new_file.write(contents)
+    os.replace(temporary_filename, absolute_filename)
+  except BaseException:
+    os.remove(temporary_filename)
+    raise
 
   return new_file
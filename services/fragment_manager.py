@@ -0,0 +1,45 @@
+"""Caches rendered fragments of pages, such as rows of large tables."""
+
+import collections
+import threading
+from typing import Callable, Hashable, Text
+
+# Fragments kept before the least recently used ones are dropped.
+_MAX_FRAGMENTS = 50000
+
+_FRAGMENTS = collections.OrderedDict()
+_FRAGMENTS_LOCK = threading.Lock()
+
+
+def get_fragment(fragment_key: Hashable, render: Callable[[], Text]) -> Text:
+  """Gets a rendered fragment, rendering it only if it is not cached.
+
+  Keys must change whenever the rendered content would change, e.g. by
+  including the version of the rendered objects.
+
+  Args:
+    fragment_key: Key identifying the fragment and its contents.
+    render: Renders the fragment when it is not cached.
+
+  Returns:
+    Rendered fragment.
+  """
+  with _FRAGMENTS_LOCK:
+    if fragment_key in _FRAGMENTS:
+      _FRAGMENTS.move_to_end(fragment_key)
+      return _FRAGMENTS[fragment_key]
+
+  fragment = render()
+
+  with _FRAGMENTS_LOCK:
+    _FRAGMENTS[fragment_key] = fragment
+    while len(_FRAGMENTS) > _MAX_FRAGMENTS:
+      _FRAGMENTS.popitem(last=False)
+
+  return fragment
+
+
+def clear():
+  """Drops all cached fragments."""
+  with _FRAGMENTS_LOCK:
+    _FRAGMENTS.clear()
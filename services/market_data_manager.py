@@ -0,0 +1,179 @@
+"""Fetches and keeps the latest market data of trackers."""
+
+import asyncio
+import os
+from models import market_data
+from services import market_data_provider
+from services import metrics_manager
+from typing import Iterable, Mapping, Optional, Sequence, Text
+
+_PROVIDER_ENVIRONMENT_VARIABLE = 'FINANCE_TRACKER_MARKET_DATA_PROVIDER'
+_PROVIDERS = {
+    'yahoo': market_data_provider.YahooMarketDataProvider,
+    'fake': market_data_provider.FakeMarketDataProvider,
+}
+_DEFAULT_PROVIDER = 'yahoo'
+
+_QUOTE_BATCH_SIZE = 50
+_MAX_CONCURRENT_REQUESTS = 8
+
+_PROVIDER = None
+# Latest market data fetched for each tracker.
+_MARKET_DATA = {}
+
+
+def get_provider() -> market_data_provider.MarketDataProvider:
+  """Gets the provider used to fetch market data.
+
+  Unless set, it is chosen by the FINANCE_TRACKER_MARKET_DATA_PROVIDER
+  environment variable (yahoo or fake).
+
+  Raises:
+    ValueError: unknown provider name.
+
+  Returns:
+    Market data provider.
+  """
+  global _PROVIDER
+
+  if not _PROVIDER:
+    provider_name = os.environ.get(
+        _PROVIDER_ENVIRONMENT_VARIABLE, _DEFAULT_PROVIDER).lower()
+    if provider_name not in _PROVIDERS:
+      raise ValueError(f'Unknown market data provider: {provider_name}.')
+    _PROVIDER = _PROVIDERS[provider_name]()
+
+  return _PROVIDER
+
+
+def set_provider(provider: market_data_provider.MarketDataProvider):
+  """Sets the provider used to fetch market data.
+
+  Args:
+    provider: Market data provider to use.
+  """
+  global _PROVIDER
+  _PROVIDER = provider
+
+
+def get_market_data(tracker: Text) -> Optional[market_data.MarketData]:
+  """Gets the latest market data fetched for a tracker.
+
+  Args:
+    tracker: Tracker for which to get market data.
+
+  Returns:
+    Latest market data. None if it was never fetched.
+  """
+  return _MARKET_DATA.get(tracker)
+
+
+def fetch_market_data(
+        trackers: Iterable[Text],
+        include_stats: bool = True) -> Mapping[Text, market_data.MarketData]:
+  """Fetches market data of many trackers at once.
+
+  Args:
+    trackers: Trackers for which to fetch market data.
+    include_stats: Whether to fetch fundamentals besides prices.
+
+  Returns:
+    Map of trackers and their market data.
+  """
+  return asyncio.run(fetch_market_data_async(trackers, include_stats))
+
+
+async def fetch_market_data_async(
+        trackers: Iterable[Text],
+        include_stats: bool = True) -> Mapping[Text, market_data.MarketData]:
+  """Fetches market data of many trackers concurrently.
+
+  Quotes are batched when the provider supports it. Fundamentals are fetched
+  at the same time as quotes, sharing a limit of concurrent requests.
+
+  Args:
+    trackers: Trackers for which to fetch market data.
+    include_stats: Whether to fetch fundamentals besides prices.
+
+  Returns:
+    Map of trackers and their market data.
+  """
+  trackers = list(dict.fromkeys(trackers))
+  provider = get_provider()
+  semaphore = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+
+  stats_requests = [
+      _fetch_stats_table(provider, tracker, semaphore)
+      for tracker in trackers
+  ] if include_stats else []
+
+  with metrics_manager.span('fetch_market_data'):
+    quotes, *stats_tables = await asyncio.gather(
+        _fetch_quotes(provider, trackers, semaphore), *stats_requests)
+  if not include_stats:
+    stats_tables = [None] * len(trackers)
+
+  fetched_market_data = {
+      tracker: market_data.MarketData(
+          tracker, quotes.get(tracker), stats_table)
+      for tracker, stats_table in zip(trackers, stats_tables)
+  }
+  _MARKET_DATA.update(fetched_market_data)
+
+  return fetched_market_data
+
+
+async def _fetch_quotes(
+        provider: market_data_provider.MarketDataProvider,
+        trackers: Sequence[Text],
+        semaphore: asyncio.Semaphore) -> market_data_provider.Quotes:
+  """Fetches quotes of all trackers in as few requests as possible.
+
+  Args:
+    provider: Provider from which to fetch quotes.
+    trackers: Trackers for which to fetch quotes.
+    semaphore: Limit of concurrent requests.
+
+  Returns:
+    Map of trackers and their prices.
+  """
+  batch_size = _QUOTE_BATCH_SIZE if provider.supports_batch_quotes else 1
+  batches = [
+      trackers[start:start + batch_size]
+      for start in range(0, len(trackers), batch_size)
+  ]
+
+  async def fetch_batch(batch):
+    async with semaphore:
+      try:
+        return await provider.get_quotes(batch)
+      except Exception as error:
+        print(f'Unable to fetch prices of {", ".join(batch)}: {error}')
+        return {}
+
+  quotes = {}
+  for batch_quotes in await asyncio.gather(*map(fetch_batch, batches)):
+    quotes.update(batch_quotes)
+  return quotes
+
+
+async def _fetch_stats_table(
+        provider: market_data_provider.MarketDataProvider,
+        tracker: Text,
+        semaphore: asyncio.Semaphore) -> Optional[market_data.StatsTable]:
+  """Fetches the fundamentals of a tracker.
+
+  Args:
+    provider: Provider from which to fetch fundamentals.
+    tracker: Tracker for which to fetch fundamentals.
+    semaphore: Limit of concurrent requests.
+
+  Returns:
+    Rows of (attribute name, raw value). None if they were not fetched.
+  """
+  async with semaphore:
+    try:
+      return await provider.get_stats_table(tracker)
+    except Exception as error:
+      print(f'Unable to fetch {tracker} stats: {error}')
+      return None
@@ -0,0 +1,159 @@
+"""Providers of quotes and fundamentals for asset trackers."""
+
+import abc
+import asyncio
+import importlib
+import json
+import math
+from models import market_data
+from services import file_manager
+from typing import Any, Mapping, Optional, Sequence, Text
+
+_FIXTURES_PATH = 'fixtures/market_data'
+# Loading it pulls pandas and requests_html, so it is only loaded when used.
+_YAHOO_STOCK_INFO_MODULE = 'yahoo_fin.stock_info'
+
+Quotes = Mapping[Text, Optional[float]]
+
+
+class MarketDataProvider(abc.ABC):
+  """Source of market data for trackers."""
+
+  # Whether many trackers can be quoted within a single request.
+  supports_batch_quotes = False
+
+  @abc.abstractmethod
+  async def get_quotes(self, trackers: Sequence[Text]) -> Quotes:
+    """Gets live prices of the given trackers.
+
+    Providers which do not support batch quotes are called with one tracker
+    at a time.
+
+    Args:
+      trackers: Trackers for which to get prices.
+
+    Returns:
+      Map of trackers and their prices. None if a price was not found.
+    """
+
+  @abc.abstractmethod
+  async def get_stats_table(
+          self, tracker: Text) -> Optional[market_data.StatsTable]:
+    """Gets the fundamentals of a tracker.
+
+    Args:
+      tracker: Tracker for which to get fundamentals.
+
+    Returns:
+      Rows of (attribute name, raw value). None if they were not found.
+    """
+
+
+class YahooMarketDataProvider(MarketDataProvider):
+  """Fetches market data from Yahoo Finance."""
+
+  supports_batch_quotes = False
+
+  async def get_quotes(self, trackers: Sequence[Text]) -> Quotes:
+    """Gets live prices of the given trackers from Yahoo Finance."""
+    prices = await asyncio.gather(*[
+        asyncio.to_thread(self._get_live_price, tracker)
+        for tracker in trackers
+    ])
+    return dict(zip(trackers, prices))
+
+  async def get_stats_table(
+          self, tracker: Text) -> Optional[market_data.StatsTable]:
+    """Gets the fundamentals of a tracker from Yahoo Finance."""
+    return await asyncio.to_thread(self._get_stats_table, tracker)
+
+  def _get_live_price(self, tracker: Text) -> Optional[float]:
+    """Gets the live price of a tracker, blocking until it is fetched."""
+    try:
+      price = float(_get_yahoo_stock_info().get_live_price(tracker))
+    except AssertionError:
+      return None
+    return None if math.isnan(price) else price
+
+  def _get_stats_table(
+          self, tracker: Text) -> Optional[market_data.StatsTable]:
+    """Gets the fundamentals of a tracker, blocking until they are fetched."""
+    try:
+      stock_data = _get_yahoo_stock_info().get_stats(tracker)
+    except Exception:
+      return None
+
+    if stock_data.empty:
+      return []
+
+    return list(zip(stock_data['Attribute'], stock_data['Value']))
+
+
+def _get_yahoo_stock_info():
+  """Gets the Yahoo Finance stock info module, importing it on first use."""
+  return importlib.import_module(_YAHOO_STOCK_INFO_MODULE)
+
+
+class FakeMarketDataProvider(MarketDataProvider):
+  """Serves market data from local fixture files, for offline use.
+
+  Each tracker is read from a `<tracker>.json` file with a `price` and a
+  `stats` list of [attribute name, raw value] rows.
+  """
+
+  supports_batch_quotes = True
+
+  def __init__(self, fixtures_path: Text = _FIXTURES_PATH,
+               latency: float = 0.0,
+               fallback_tracker: Optional[Text] = None):
+    """Instantiates the fake provider.
+
+    Args:
+      fixtures_path: Folder where fixture files are stored.
+      latency: Seconds each request takes, to simulate network calls.
+      fallback_tracker: Tracker whose fixture is served for trackers without
+          their own fixture. If not set, they are not found.
+    """
+    self._fixtures_path = fixtures_path
+    self._latency = latency
+    self._fallback_tracker = fallback_tracker
+    self._fixtures = {}
+
+  async def get_quotes(self, trackers: Sequence[Text]) -> Quotes:
+    """Gets prices of the given trackers from fixtures."""
+    await asyncio.sleep(self._latency)
+    return {
+        tracker: self._get_fixture(tracker).get('price')
+        for tracker in trackers
+    }
+
+  async def get_stats_table(
+          self, tracker: Text) -> Optional[market_data.StatsTable]:
+    """Gets the fundamentals of a tracker from fixtures."""
+    await asyncio.sleep(self._latency)
+    stats_rows = self._get_fixture(tracker).get('stats')
+    if stats_rows is None:
+      return None
+    return [tuple(stats_row) for stats_row in stats_rows]
+
+  def _get_fixture(self, tracker: Text) -> Mapping[Text, Any]:
+    """Gets the fixture of a tracker, reading its file only once.
+
+    Args:
+      tracker: Tracker for which to get fixture.
+
+    Returns:
+      Fixture contents. Empty if tracker has no fixture.
+    """
+    if tracker not in self._fixtures:
+      try:
+        fixture_content = file_manager.get_file_text_content(
+            f'{self._fixtures_path}/{tracker}.json')
+        self._fixtures[tracker] = json.loads(fixture_content)
+      except FileNotFoundError:
+        self._fixtures[tracker] = (
+            self._get_fixture(self._fallback_tracker)
+            if self._fallback_tracker and tracker != self._fallback_tracker
+            else {})
+
+    return self._fixtures[tracker]
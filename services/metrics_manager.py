@@ -0,0 +1,228 @@
+"""Times requests and slow operations into histograms exposed as metrics."""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, List, Mapping, Optional, Text, Tuple
+
+# Metrics are only recorded when this variable is set to a true value.
+_METRICS_ENVIRONMENT_VARIABLE = 'FINANCE_TRACKER_METRICS'
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+REQUEST_DURATION_METRIC = 'finance_tracker_request_duration_seconds'
+SPAN_DURATION_METRIC = 'finance_tracker_span_duration_seconds'
+_METRIC_DESCRIPTIONS = {
+    REQUEST_DURATION_METRIC: 'Duration of HTTP requests in seconds.',
+    SPAN_DURATION_METRIC: 'Duration of internal operations in seconds.',
+}
+# Upper bounds, in seconds, of the histogram buckets.
+_BUCKETS = [
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+]
+
+Labels = Tuple[Tuple[Text, Text], ...]
+
+_ENABLED = (
+    os.environ.get(_METRICS_ENVIRONMENT_VARIABLE, '').lower() in _TRUE_VALUES)
+# Observations of each metric and labels: bucket counts, sum and count.
+_HISTOGRAMS = {}
+_HISTOGRAMS_LOCK = threading.Lock()
+
+
+class _Span(object):
+  """Times the code run within it into the span duration metric."""
+
+  def __init__(self, span_name: Text):
+    self._labels = (('span', span_name),)
+    self._start_time = None
+
+  def __enter__(self):
+    self._start_time = time.perf_counter()
+    return self
+
+  def __exit__(self, *exception_info):
+    observe(
+        SPAN_DURATION_METRIC, time.perf_counter() - self._start_time,
+        self._labels)
+    return False
+
+
+class _DisabledSpan(object):
+  """Does nothing, so spans cost almost nothing when metrics are disabled."""
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception_info):
+    return False
+
+
+_DISABLED_SPAN = _DisabledSpan()
+
+
+def is_enabled() -> bool:
+  """Returns whether metrics are being recorded."""
+  return _ENABLED
+
+
+def set_enabled(enabled: bool):
+  """Starts or stops recording metrics.
+
+  Args:
+    enabled: Whether to record metrics.
+  """
+  global _ENABLED
+  _ENABLED = enabled
+
+
+def span(span_name: Text):
+  """Times the code run within a `with` block.
+
+  Args:
+    span_name: Name of the timed operation.
+
+  Returns:
+    Context manager timing its block.
+  """
+  if not _ENABLED:
+    return _DISABLED_SPAN
+  return _Span(span_name)
+
+
+def timed(span_name: Text) -> Callable:
+  """Decorates a function so each call is timed.
+
+  Args:
+    span_name: Name of the timed operation.
+
+  Returns:
+    Decorator of the function to time.
+  """
+  def decorator(function):
+    @functools.wraps(function)
+    def timed_function(*args, **kwargs):
+      if not _ENABLED:
+        return function(*args, **kwargs)
+      with _Span(span_name):
+        return function(*args, **kwargs)
+    return timed_function
+  return decorator
+
+
+def observe(metric_name: Text, seconds: float, labels: Labels = ()):
+  """Records a duration into a histogram.
+
+  Args:
+    metric_name: Name of the histogram.
+    seconds: Observed duration.
+    labels: Pairs of label names and values of the observation.
+  """
+  bucket_index = bisect.bisect_left(_BUCKETS, seconds)
+  with _HISTOGRAMS_LOCK:
+    bucket_counts, total = _HISTOGRAMS.setdefault(
+        (metric_name, labels), ([0] * (len(_BUCKETS) + 1), [0.0, 0]))
+    bucket_counts[bucket_index] += 1
+    total[0] += seconds
+    total[1] += 1
+
+
+def get_histograms() -> Mapping[Tuple[Text, Labels], Mapping]:
+  """Gets a copy of the recorded histograms.
+
+  Returns:
+    Map of metric name and labels, and their cumulative bucket counts, sum
+    and count of observations.
+  """
+  with _HISTOGRAMS_LOCK:
+    histograms = {
+        histogram_key: (list(bucket_counts), list(total))
+        for histogram_key, (bucket_counts, total) in _HISTOGRAMS.items()
+    }
+
+  return {
+      histogram_key: {
+          'buckets': _get_cumulative_counts(bucket_counts),
+          'sum': histogram_sum,
+          'count': histogram_count,
+      }
+      for histogram_key, (bucket_counts, (histogram_sum, histogram_count))
+      in histograms.items()
+  }
+
+
+def get_metrics_text() -> Text:
+  """Gets the recorded histograms in Prometheus text format.
+
+  Returns:
+    Metrics exposition text.
+  """
+  histograms = get_histograms()
+
+  metric_lines = []
+  for metric_name in sorted({name for name, _ in histograms}):
+    metric_lines.append(
+        f'# HELP {metric_name} {_METRIC_DESCRIPTIONS.get(metric_name, "")}')
+    metric_lines.append(f'# TYPE {metric_name} histogram')
+
+    for (histogram_name, labels), histogram in sorted(histograms.items()):
+      if histogram_name != metric_name:
+        continue
+      bucket_bounds = [str(bucket) for bucket in _BUCKETS] + ['+Inf']
+      for bucket_bound, bucket_count in zip(
+              bucket_bounds, histogram['buckets']):
+        bucket_labels = _format_labels(labels + (('le', bucket_bound),))
+        metric_lines.append(
+            f'{metric_name}_bucket{bucket_labels} {bucket_count}')
+      metric_lines.append(
+          f'{metric_name}_sum{_format_labels(labels)} {histogram["sum"]}')
+      metric_lines.append(
+          f'{metric_name}_count{_format_labels(labels)} {histogram["count"]}')
+
+  return '\n'.join(metric_lines) + '\n'
+
+
+def reset():
+  """Forgets all recorded metrics."""
+  with _HISTOGRAMS_LOCK:
+    _HISTOGRAMS.clear()
+
+
+def _get_cumulative_counts(bucket_counts: List[int]) -> List[int]:
+  """Gets how many observations are within each bucket upper bound."""
+  cumulative_counts = []
+  cumulative_count = 0
+  for bucket_count in bucket_counts:
+    cumulative_count += bucket_count
+    cumulative_counts.append(cumulative_count)
+  return cumulative_counts
+
+
+def _format_labels(labels: Labels) -> Text:
+  """Formats labels as {name="value",...}, escaping their values.
+
+  Args:
+    labels: Pairs of label names and values.
+
+  Returns:
+    Formatted labels. Empty if there are no labels.
+  """
+  if not labels:
+    return ''
+
+  formatted_labels = [
+      '{}="{}"'.format(label_name, _escape_label_value(label_value))
+      for label_name, label_value in labels
+  ]
+  return '{' + ','.join(formatted_labels) + '}'
+
+
+def _escape_label_value(label_value: Optional[Text]) -> Text:
+  """Escapes a label value for the Prometheus text format."""
+  return (
+      str(label_value)
+      .replace('\\', '\\\\')
+      .replace('"', '\\"')
+      .replace('\n', '\\n'))
@@ -1,12 +1,37 @@
 """Manages operations in a portfolio."""
 
+import base64
+import bisect
+import collections
 import datetime
+import heapq
+import itertools
+import json
+import threading
 from models import asset
 from models import portfolio
 from models import operation
+from models import operations_page
 from services import asset_manager
 from services import portfolio_manager
-from typing import Mapping, Optional, Sequence, Text
+from typing import Any, Iterator, Mapping, Optional, Sequence, Text, Tuple
+
+# Key of an operation in an asset index: POSIX timestamp and operation id.
+IndexKey = Tuple[float, Text]
+# Key of an operation in a page: POSIX timestamp, operation id and asset code.
+PageKey = Tuple[float, Text, Text]
+
+_QUERY_LIST_SEPARATOR = ','
+_ASCENDING_ORDER = 'asc'
+_DESCENDING_ORDER = 'desc'
+# Idempotency keys remembered per portfolio before the oldest are forgotten.
+_MAX_IDEMPOTENCY_KEYS = 10000
+
+_IDEMPOTENCY_LOCK = threading.Lock()
+
+
+class IdempotencyKeyError(ValueError):
+  """Idempotency key was already used for a different operation."""
 
 
 def add_operation(
@@ -15,7 +40,9 @@ def add_operation(
     timestamp: datetime.datetime,
     operation_type: operation.OperationType,
     quantity: int, price_per_unit: float,
-    operation_currency: Optional[Text] = ''
+    operation_currency: Optional[Text] = '',
+    allow_duplicate: bool = False,
+    idempotency_key: Optional[Text] = None
 ) -> operation.Operation:
   """Creates a new operation within a portfolio.
 
@@ -29,6 +56,20 @@ def add_operation(
           If interests or dividends, use dividend per share or equivalent per
           unit gain.
       operation_currency: Currency in which price is expressed.
+      allow_duplicate: If True, creates operation even if another operation
+          has the same contents.
+      idempotency_key: Key chosen by the client for this operation. When an
+          operation was already created with the same key, it is returned
+          instead of creating it again, e.g. when a request is retried.
+
+    Raises:
+      DuplicateOperationError: another operation has the same contents and
+          duplicates are not allowed.
+      OversellError: operation sells more units than held at its date.
+      IdempotencyKeyError: idempotency_key was used for another operation.
+
+    Returns:
+      Created operation, or the operation created with idempotency_key.
     """
   operation_currency = operation_currency or managed_portfolio.currency
 
@@ -36,8 +77,31 @@ def add_operation(
       managed_asset, timestamp, operation_type, quantity, price_per_unit,
       operation_currency)
 
-  asset_manager.add_operation(managed_asset, new_operation)
-  portfolio_manager.store_portfolio(managed_portfolio)
+  if not idempotency_key:
+    with portfolio_manager.get_portfolio_lock(managed_portfolio):
+      asset_manager.add_operation(
+          managed_asset, new_operation, allow_duplicate)
+      portfolio_manager.store_portfolio(managed_portfolio)
+    return new_operation
+
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    with _IDEMPOTENCY_LOCK:
+      idempotent_operations = get_idempotent_operations(managed_portfolio)
+      if idempotency_key in idempotent_operations:
+        created_operation = idempotent_operations[idempotency_key]
+        if (asset_manager.get_content_key(created_operation) !=
+            asset_manager.get_content_key(new_operation)):
+          raise IdempotencyKeyError(
+              f'Idempotency key {idempotency_key} was used for '
+              f'{created_operation}.')
+        return created_operation
+
+      asset_manager.add_operation(
+          managed_asset, new_operation, allow_duplicate)
+      idempotent_operations[idempotency_key] = new_operation
+      while len(idempotent_operations) > _MAX_IDEMPOTENCY_KEYS:
+        idempotent_operations.popitem(last=False)
+      portfolio_manager.store_portfolio(managed_portfolio)
 
   return new_operation
 
@@ -52,16 +116,35 @@ def delete_operation(managed_portfolio: portfolio.Portfolio,
 
   Raises:
     ValueError: Operation not found in portfolio.
+    OversellError: removing a buy leaves later sells with more units than
+        held.
   """
   managed_asset = operation_to_remove.managed_asset
-  asset_operations = asset_manager.get_operations(managed_asset)
 
-  if operation_to_remove not in asset_operations.values():
-    raise ValueError(
-        f'{operation_to_remove} not found in {managed_asset}.')
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    if not asset_manager.contains_operation(
+            managed_asset, operation_to_remove):
+      raise ValueError(
+          f'{operation_to_remove} not found in {managed_asset}.')
 
-  asset_manager.delete_operation(managed_asset, operation_to_remove)
-  portfolio_manager.store_portfolio(managed_portfolio)
+    asset_manager.delete_operation(managed_asset, operation_to_remove)
+    portfolio_manager.store_portfolio(managed_portfolio)
+
+
+def get_idempotent_operations(managed_portfolio: portfolio.Portfolio
+                              ) -> Mapping[Text, operation.Operation]:
+  """Gets the operations created with an idempotency key.
+
+  Args:
+    managed_portfolio: Portfolio where operations were created.
+
+  Returns:
+    Map of the most recent idempotency keys and their operations, oldest
+    first.
+  """
+  if getattr(managed_portfolio, 'idempotent_operations', None) is None:
+    managed_portfolio.idempotent_operations = collections.OrderedDict()
+  return managed_portfolio.idempotent_operations
 
 
 def get_operation_type(operation_type_name: Text) -> operation.OperationType:
@@ -120,3 +203,217 @@ def get_operations(managed_portfolio: portfolio.Portfolio
     asset_operations = asset_manager.get_operations(managed_asset)
     portfolio_operations.update(asset_operations)
   return portfolio_operations
+
+
+def get_operations_page(
+    managed_portfolio: portfolio.Portfolio,
+    start_timestamp: Optional[float] = None,
+    end_timestamp: Optional[float] = None,
+    asset_codes: Optional[Sequence[Text]] = None,
+    operation_types: Optional[Sequence[operation.OperationType]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[Text] = None,
+    ascending: bool = False
+) -> operations_page.OperationsPage:
+  """Gets a page of the portfolio operations, sorted by date.
+
+  Operations are looked up in the date index of each asset and operation
+  type, and the matching ranges are merged, so only the operations in the
+  page are visited.
+
+  Args:
+    managed_portfolio: Portfolio from which to obtain operations.
+    start_timestamp: POSIX timestamp from which operations are included.
+    end_timestamp: POSIX timestamp before which operations are included.
+    asset_codes: Assets whose operations to include. Defaults to all.
+    operation_types: Types of operations to include. Defaults to all.
+    limit: Maximum number of operations in the page. Defaults to all.
+    cursor: Cursor of the previous page, to continue after it.
+    ascending: Whether to sort oldest operations first.
+
+  Raises:
+    ValueError: unknown asset, invalid limit or invalid cursor.
+
+  Returns:
+    Page of operations.
+  """
+  if limit is not None and limit <= 0:
+    raise ValueError(f'Limit must be positive, got {limit}.')
+
+  if asset_codes:
+    page_assets = [
+        asset_manager.get_asset(managed_portfolio, asset_code)
+        for asset_code in asset_codes
+    ]
+  else:
+    page_assets = list(asset_manager.get_assets(managed_portfolio).values())
+  operation_types = operation_types or list(operation.OperationType)
+  cursor_key = _decode_cursor(cursor) if cursor else None
+
+  index_ranges = []
+  for page_asset in page_assets:
+    asset_index = asset_manager.get_operation_index(page_asset)
+    for operation_type in operation_types:
+      index_keys = asset_index.get(operation_type)
+      if index_keys:
+        index_ranges.append(_get_index_range(
+            index_keys, page_asset.get_id(), start_timestamp, end_timestamp,
+            cursor_key, ascending))
+
+  page_keys = heapq.merge(*index_ranges, reverse=not ascending)
+  if limit is not None:
+    page_keys = list(itertools.islice(page_keys, limit + 1))
+  else:
+    page_keys = list(page_keys)
+
+  next_cursor = None
+  if limit is not None and len(page_keys) > limit:
+    page_keys = page_keys[:limit]
+    next_cursor = _encode_cursor(page_keys[-1])
+
+  assets_by_code = {
+      page_asset.get_id(): page_asset for page_asset in page_assets}
+  page_operations = [
+      asset_manager.get_operations(assets_by_code[asset_code])[operation_id]
+      for _, operation_id, asset_code in page_keys
+  ]
+  return operations_page.OperationsPage(page_operations, next_cursor)
+
+
+def get_operations_query(query_args: Mapping[Text, Text],
+                         default_limit: Optional[int] = None
+                         ) -> Mapping[Text, Any]:
+  """Gets the filters of an operations page from query parameters.
+
+  Dates can be given either as POSIX timestamps (start_timestamp and
+  end_timestamp, end excluded) or as ISO dates (start_date and end_date,
+  end included). Assets and operation types are separated by commas.
+
+  Args:
+    query_args: Query parameters: start_timestamp, end_timestamp,
+        start_date, end_date, asset, operation_type, limit, cursor and order
+        (asc or desc).
+    default_limit: Limit when no limit is given.
+
+  Raises:
+    ValueError: a parameter is not valid.
+
+  Returns:
+    Keyword arguments for get_operations_page.
+  """
+  start_timestamp = None
+  if query_args.get('start_timestamp'):
+    start_timestamp = float(query_args['start_timestamp'])
+  elif query_args.get('start_date'):
+    start_timestamp = _get_date_timestamp(query_args['start_date'])
+
+  end_timestamp = None
+  if query_args.get('end_timestamp'):
+    end_timestamp = float(query_args['end_timestamp'])
+  elif query_args.get('end_date'):
+    end_timestamp = _get_date_timestamp(query_args['end_date'], days=1)
+
+  asset_codes = None
+  if query_args.get('asset'):
+    asset_codes = query_args['asset'].split(_QUERY_LIST_SEPARATOR)
+
+  operation_types = None
+  if query_args.get('operation_type'):
+    operation_types = [
+        get_operation_type(operation_type_name)
+        for operation_type_name
+        in query_args['operation_type'].split(_QUERY_LIST_SEPARATOR)
+    ]
+
+  limit = default_limit
+  if query_args.get('limit'):
+    limit = int(query_args['limit'])
+
+  order = query_args.get('order') or _DESCENDING_ORDER
+  if order not in (_ASCENDING_ORDER, _DESCENDING_ORDER):
+    raise ValueError(f'Unknown order: {order}.')
+
+  return {
+      'start_timestamp': start_timestamp,
+      'end_timestamp': end_timestamp,
+      'asset_codes': asset_codes,
+      'operation_types': operation_types,
+      'limit': limit,
+      'cursor': query_args.get('cursor') or None,
+      'ascending': order == _ASCENDING_ORDER,
+  }
+
+
+def _get_index_range(index_keys: Sequence[IndexKey],
+                     asset_code: Text,
+                     start_timestamp: Optional[float],
+                     end_timestamp: Optional[float],
+                     cursor_key: Optional[IndexKey],
+                     ascending: bool) -> Iterator[PageKey]:
+  """Gets the keys of an index within a date range, in requested order.
+
+  Args:
+    index_keys: Sorted (POSIX timestamp, operation id) keys.
+    asset_code: Asset to which index belongs.
+    start_timestamp: POSIX timestamp from which keys are included.
+    end_timestamp: POSIX timestamp before which keys are included.
+    cursor_key: Last key of the previous page, after which to continue.
+    ascending: Whether to go from oldest to newest keys.
+
+  Returns:
+    Keys in range, with the asset code.
+  """
+  lower_position = 0
+  if start_timestamp is not None:
+    lower_position = bisect.bisect_left(index_keys, (start_timestamp,))
+
+  upper_position = len(index_keys)
+  if end_timestamp is not None:
+    upper_position = bisect.bisect_left(index_keys, (end_timestamp,))
+
+  if cursor_key and ascending:
+    lower_position = max(
+        lower_position, bisect.bisect_right(index_keys, cursor_key))
+  elif cursor_key:
+    upper_position = min(
+        upper_position, bisect.bisect_left(index_keys, cursor_key))
+
+  key_positions = (
+      range(lower_position, upper_position) if ascending else
+      range(upper_position - 1, lower_position - 1, -1))
+  return (
+      (*index_keys[key_position], asset_code)
+      for key_position in key_positions)
+
+
+def _encode_cursor(page_key: PageKey) -> Text:
+  """Encodes the last key of a page into an opaque cursor."""
+  timestamp, operation_id, _ = page_key
+  cursor_content = json.dumps([timestamp, operation_id])
+  return base64.urlsafe_b64encode(cursor_content.encode()).decode()
+
+
+def _decode_cursor(cursor: Text) -> IndexKey:
+  """Decodes a cursor into the index key after which to continue.
+
+  Args:
+    cursor: Cursor of a previous page.
+
+  Raises:
+    ValueError: cursor is not valid.
+
+  Returns:
+    Index key of the last operation of the previous page.
+  """
+  try:
+    timestamp, operation_id = json.loads(
+        base64.urlsafe_b64decode(cursor.encode()))
+    return (float(timestamp), str(operation_id))
+  except (TypeError, ValueError) as error:
+    raise ValueError(f'Invalid cursor: {cursor}.') from error
+
+
+def _get_date_timestamp(iso_date: Text, days: int = 0) -> float:
+  """Gets the POSIX timestamp of the start of an ISO date plus some days."""
+  date = datetime.date.fromisoformat(iso_date) + datetime.timedelta(days=days)
+  return datetime.datetime.combine(date, datetime.time()).timestamp()
@@ -4,17 +4,51 @@ import glob
 import itertools
 import os
 import pickle
+import sys
+import threading
+import time
 from models import asset
 from models import operation
 from models import portfolio
 from models import position
 from services import file_manager
-from typing import Mapping, Optional, Sequence, Text
+from services import metrics_manager
+from typing import Mapping, Optional, Sequence, Text, Tuple
 
 _PORTFOLIO_STORAGE_PATH = 'portfolios'
 _PORTFOLIO_GLOB_FILES = f'{_PORTFOLIO_STORAGE_PATH}/*'
+# Hidden file locked while a portfolio is stored, to check and write it
+# without other processes writing in between.
+_PORTFOLIO_LOCK_FILENAME = '.lock'
+# Storage changed less than these seconds ago is checked on every access, as
+# further changes may not move its modification time.
+_MODIFIED_TIME_RESOLUTION = 2
+# Times progress is logged while loading all portfolios.
+_LOADING_LOG_STEPS = 10
 
 _PORTFOLIOS = {}
+# Signature of each portfolio file when it was last loaded or stored.
+_PORTFOLIO_FILE_SIGNATURES = {}
+# Assets of each portfolio and their versions when it was last loaded or
+# stored, to tell whether it changed since.
+_STORED_ASSET_VERSIONS = {}
+_STORAGE_SIGNATURE = None
+_PORTFOLIOS_LOCK = threading.RLock()
+# Whether all stored portfolios were loaded at least once.
+_IS_LOADED = False
+# Number of loaded portfolios and portfolios to load in the latest load.
+_LOADING_PROGRESS = (0, 0)
+_LOADING_LOCK = threading.Lock()
+# Thread loading portfolios in the background.
+_LOADER = None
+# Lock of each portfolio id, held while it is changed and stored, so it is
+# not serialized halfway through a change made by another thread.
+_PORTFOLIO_CHANGE_LOCKS = {}
+_PORTFOLIO_CHANGE_LOCKS_LOCK = threading.Lock()
+
+
+class StalePortfolioError(ValueError):
+  """Portfolio was changed by another process since it was loaded."""
 
 
 def add_portfolio(portfolio_name: Text) -> portfolio.Portfolio:
@@ -41,44 +75,317 @@ def get_portfolio(portfolio_id: Text) -> portfolio.Portfolio:
   Returns:
     Portfolio. None if it does not exist.
   """
+  if not _IS_LOADED:
+    # Loads only the requested portfolio while others are being loaded.
+    managed_portfolio = load_portfolio(portfolio_id)
+    if not managed_portfolio:
+      raise KeyError(portfolio_id)
+    return managed_portfolio
+
   portfolios = get_portfolios()
   return portfolios[portfolio_id]
 
 
+def get_portfolio_lock(
+        managed_portfolio: portfolio.Portfolio) -> threading.RLock:
+  """Gets the lock to hold while changing a portfolio and storing it.
+
+  Changes which add or remove operations, assets or other entries must hold
+  it until the portfolio is stored, as storing it from another thread (e.g.
+  a background job) holds it while serializing the portfolio.
+
+  Args:
+    managed_portfolio: Portfolio to change.
+
+  Returns:
+    Reentrant lock of the portfolio, shared by all its loaded copies.
+  """
+  with _PORTFOLIO_CHANGE_LOCKS_LOCK:
+    return _PORTFOLIO_CHANGE_LOCKS.setdefault(
+        managed_portfolio.get_id(), threading.RLock())
+
+
+def get_storage_path() -> Text:
+  """Gets the folder where portfolios are stored."""
+  return _PORTFOLIO_STORAGE_PATH
+
+
+def set_storage_path(storage_path: Text):
+  """Sets the folder where portfolios are stored, e.g. for benchmarks.
+
+  Portfolios loaded from the previous folder are forgotten.
+
+  Args:
+    storage_path: Folder where to store and load portfolios.
+  """
+  global _PORTFOLIO_STORAGE_PATH
+  global _PORTFOLIO_GLOB_FILES
+  global _STORAGE_SIGNATURE
+  global _IS_LOADED
+
+  with _LOADING_LOCK, _PORTFOLIOS_LOCK:
+    _PORTFOLIO_STORAGE_PATH = storage_path
+    _PORTFOLIO_GLOB_FILES = f'{storage_path}/*'
+    _STORAGE_SIGNATURE = None
+    _IS_LOADED = False
+    _PORTFOLIOS.clear()
+    _PORTFOLIO_FILE_SIGNATURES.clear()
+    _STORED_ASSET_VERSIONS.clear()
+
+
 def get_portfolios() -> Mapping[Text, portfolio.Portfolio]:
   """Gets all available portfolios.
 
+  Portfolios stored by other processes since they were loaded are loaded
+  again. Waits for portfolios being loaded by other threads.
+
   Returns:
     List of available portfolios.
   """
-  global _PORTFOLIOS
-
-  if not _PORTFOLIOS:
-    portfolio_filenames = glob.glob(_PORTFOLIO_GLOB_FILES)
-    portfolio_list = [
-        _get_portfolio_from_file(portfolio_filename)
-        for portfolio_filename in portfolio_filenames
-    ]
-
-    _PORTFOLIOS = {
-        managed_portfolio.get_id(): managed_portfolio
-        for managed_portfolio in portfolio_list
-    }
+  global _STORAGE_SIGNATURE
+  global _IS_LOADED
+
+  if _IS_LOADED and not _is_storage_changed():
+    return _PORTFOLIOS
+
+  with _LOADING_LOCK:
+    # Portfolios may have been loaded by another thread in the meantime.
+    storage_signature = file_manager.get_file_signature(
+        _PORTFOLIO_STORAGE_PATH)
+    if (not _IS_LOADED or storage_signature != _STORAGE_SIGNATURE or
+        _is_recently_modified(storage_signature)):
+      with metrics_manager.span('load_portfolios'):
+        _load_changed_portfolios()
+      _STORAGE_SIGNATURE = storage_signature
+      _IS_LOADED = True
 
   return _PORTFOLIOS
 
 
+def start_loading():
+  """Loads all portfolios in the background, if they are not loaded yet.
+
+  Portfolios can be requested with get_portfolio while others are loaded.
+  """
+  global _LOADER
+
+  with _PORTFOLIOS_LOCK:
+    if _IS_LOADED or (_LOADER and _LOADER.is_alive()):
+      return
+    _LOADER = threading.Thread(
+        target=get_portfolios, name='finance-tracker-portfolio-loader',
+        daemon=True)
+    _LOADER.start()
+
+
+def is_loaded() -> bool:
+  """Returns whether all stored portfolios were loaded at least once."""
+  return _IS_LOADED
+
+
+def get_loading_progress() -> Tuple[int, int]:
+  """Gets how many portfolios are loaded out of those being loaded.
+
+  Returns:
+    Number of loaded portfolios and total number of portfolios to load.
+  """
+  return _LOADING_PROGRESS
+
+
+def load_portfolio(portfolio_id: Text) -> Optional[portfolio.Portfolio]:
+  """Loads a single stored portfolio, without loading other portfolios.
+
+  Args:
+    portfolio_id: Id of the portfolio.
+
+  Returns:
+    Stored portfolio, loaded again if it changed. None if it is not stored.
+  """
+  portfolio_filename = f'{_PORTFOLIO_STORAGE_PATH}/{portfolio_id}'
+
+  with _PORTFOLIOS_LOCK:
+    file_signature = file_manager.get_file_signature(portfolio_filename)
+    if not file_signature:
+      _PORTFOLIOS.pop(portfolio_id, None)
+      _PORTFOLIO_FILE_SIGNATURES.pop(portfolio_id, None)
+      _STORED_ASSET_VERSIONS.pop(portfolio_id, None)
+      return None
+
+    if (portfolio_id not in _PORTFOLIOS or
+        _PORTFOLIO_FILE_SIGNATURES.get(portfolio_id) != file_signature):
+      _set_loaded_portfolio(
+          _get_portfolio_from_file(portfolio_filename), file_signature)
+
+    return _PORTFOLIOS[portfolio_id]
+
+
+def is_stored(managed_portfolio: portfolio.Portfolio) -> bool:
+  """Returns whether a portfolio is unchanged since it was loaded or stored.
+
+  Changes are told by the versions of its assets.
+
+  Args:
+    managed_portfolio: Portfolio to check.
+  """
+  with _PORTFOLIOS_LOCK:
+    portfolio_id = managed_portfolio.get_id()
+    return (
+        _PORTFOLIOS.get(portfolio_id) is managed_portfolio and
+        _STORED_ASSET_VERSIONS.get(portfolio_id) == (
+            _get_asset_versions(managed_portfolio)))
+
+
+@metrics_manager.timed('store_portfolio')
 def store_portfolio(managed_portfolio: portfolio.Portfolio):
   """Stores portfolio contents.
 
   Args:
     managed_portfolio: Portfolio to store.
+
+  Raises:
+    StalePortfolioError: portfolio was stored by another process since it was
+        loaded. It is loaded again on next access, discarding this change.
+  """
+  portfolio_id = managed_portfolio.get_id()
+  portfolio_filename = f'{_PORTFOLIO_STORAGE_PATH}/{portfolio_id}'
+  lock_filename = f'{_PORTFOLIO_STORAGE_PATH}/{_PORTFOLIO_LOCK_FILENAME}'
+
+  with get_portfolio_lock(managed_portfolio):
+    with _PORTFOLIOS_LOCK, file_manager.acquire_lock(lock_filename):
+      loaded_portfolio = _PORTFOLIOS.get(portfolio_id, managed_portfolio)
+      file_signature = file_manager.get_file_signature(portfolio_filename)
+      if (loaded_portfolio is not managed_portfolio or
+          file_signature != _PORTFOLIO_FILE_SIGNATURES.get(portfolio_id)):
+        raise StalePortfolioError(
+            f'{managed_portfolio} was changed by another process.')
+
+      managed_portfolio.increment_version()
+      serialized_portfolio = pickle.dumps(managed_portfolio)
+      file_manager.create_file(
+          portfolio_filename, contents=serialized_portfolio)
+
+      _set_loaded_portfolio(
+          managed_portfolio,
+          file_manager.get_file_signature(portfolio_filename))
+
+
+def _load_changed_portfolios():
+  """Loads portfolios which are new or changed, and drops deleted ones.
+
+  Portfolios are unpickled without holding the portfolios lock, so single
+  portfolios can be loaded and stored in the meantime.
+  """
+  global _LOADING_PROGRESS
+
+  stored_files = {}
+  for portfolio_filename in glob.glob(_PORTFOLIO_GLOB_FILES):
+    # Signature is taken before reading, so a file replaced in between is
+    # loaded again next time.
+    file_signature = file_manager.get_file_signature(portfolio_filename)
+    if file_signature:
+      stored_files[os.path.basename(portfolio_filename)] = (
+          portfolio_filename, file_signature)
+
+  with _PORTFOLIOS_LOCK:
+    for portfolio_id in set(_PORTFOLIO_FILE_SIGNATURES) - set(stored_files):
+      # Portfolio may have been stored after listing files.
+      if not file_manager.get_file_signature(
+          f'{_PORTFOLIO_STORAGE_PATH}/{portfolio_id}'):
+        del _PORTFOLIO_FILE_SIGNATURES[portfolio_id]
+        _PORTFOLIOS.pop(portfolio_id, None)
+        _STORED_ASSET_VERSIONS.pop(portfolio_id, None)
+
+    # Previous signature of each changed portfolio, to only replace those
+    # which were not loaded or stored by others while unpickling.
+    changed_portfolios = {
+        portfolio_id: _PORTFOLIO_FILE_SIGNATURES.get(portfolio_id)
+        for portfolio_id, (_, file_signature) in stored_files.items()
+        if (portfolio_id not in _PORTFOLIOS or
+            _PORTFOLIO_FILE_SIGNATURES.get(portfolio_id) != file_signature)
+    }
+
+  if not changed_portfolios:
+    return
+
+  start_time = time.perf_counter()
+  total_count = len(changed_portfolios)
+  log_interval = max(1, total_count // _LOADING_LOG_STEPS)
+  _LOADING_PROGRESS = (0, total_count)
+
+  for loaded_count, portfolio_id in enumerate(changed_portfolios, start=1):
+    portfolio_filename, file_signature = stored_files[portfolio_id]
+    try:
+      loaded_portfolio = _get_portfolio_from_file(portfolio_filename)
+    except FileNotFoundError:
+      loaded_portfolio = None
+
+    with _PORTFOLIOS_LOCK:
+      if (loaded_portfolio and
+          _PORTFOLIO_FILE_SIGNATURES.get(portfolio_id) == (
+              changed_portfolios[portfolio_id])):
+        _set_loaded_portfolio(loaded_portfolio, file_signature)
+
+    _LOADING_PROGRESS = (loaded_count, total_count)
+    # Only loading all portfolios, e.g. on startup, is logged.
+    if not _IS_LOADED and (
+        loaded_count % log_interval == 0 or loaded_count == total_count):
+      print(f'Loaded {loaded_count}/{total_count} portfolios in '
+            f'{time.perf_counter() - start_time:.1f}s.', file=sys.stderr)
+
+
+def _set_loaded_portfolio(managed_portfolio: portfolio.Portfolio,
+                          file_signature: file_manager.FileSignature):
+  """Keeps a portfolio as loaded or stored with the given file signature.
+
+  Args:
+    managed_portfolio: Portfolio loaded or stored.
+    file_signature: Signature of the file where it is stored.
+  """
+  portfolio_id = managed_portfolio.get_id()
+  _PORTFOLIOS[portfolio_id] = managed_portfolio
+  _PORTFOLIO_FILE_SIGNATURES[portfolio_id] = file_signature
+  _STORED_ASSET_VERSIONS[portfolio_id] = (
+      _get_asset_versions(managed_portfolio))
+
+
+def _get_asset_versions(managed_portfolio: portfolio.Portfolio
+                        ) -> Mapping[Text, Tuple[asset.Asset, int]]:
+  """Gets the assets of a portfolio and their versions.
+
+  Assets are kept, rather than their ids, so an asset deleted and added
+  again with its version restarted is told apart.
+
+  Args:
+    managed_portfolio: Portfolio from which to get asset versions.
+
+  Returns:
+    Map of asset ids and their asset and version.
   """
-  serialized_portfolio = pickle.dumps(managed_portfolio)
+  return {
+      asset_id: (managed_asset, managed_asset.get_version())
+      for asset_id, managed_asset in managed_portfolio.assets.items()
+  }
+
 
-  portfolio_filename = (
-      f'{_PORTFOLIO_STORAGE_PATH}/{managed_portfolio.get_id()}')
-  file_manager.create_file(portfolio_filename, contents=serialized_portfolio)
+def _is_storage_changed() -> bool:
+  """Returns whether portfolios may have been stored since last loaded."""
+  storage_signature = file_manager.get_file_signature(
+      _PORTFOLIO_STORAGE_PATH)
+  return (storage_signature != _STORAGE_SIGNATURE or
+          _is_recently_modified(storage_signature))
+
+
+def _is_recently_modified(file_signature: file_manager.FileSignature
+                          ) -> bool:
+  """Returns whether a file was modified too recently to trust its signature.
+
+  Args:
+    file_signature: Signature of the file.
+  """
+  if not file_signature:
+    return False
+  _, _, modified_time_ns = file_signature
+  return time.time() - modified_time_ns / 1e9 < _MODIFIED_TIME_RESOLUTION
 
 
 def _get_portfolio_from_file(portfolio_filename: Text) -> portfolio.Portfolio:
@@ -1,19 +1,47 @@
 """Calculates positions of given assets."""
 
+import datetime
 import enum
+import pickle
 
+from models import adjustment_index
 from models import asset
+from models import corporate_action
 from models import operation
 from models import portfolio
+from models import portfolio_summary
 from models import position
 from services import asset_manager
-from typing import Iterable, Mapping, Tuple, Union
+from services import currency_manager
+from services import file_manager
+from services import metrics_manager
+from services import portfolio_manager
+from typing import Iterable, List, Mapping, Optional, Text, Tuple, Union
 
 Number = Union[int, float]
 OperationIterable = Iterable[operation.Operation]
 OperationType = operation.OperationType  # Shorthand as it's used a lot.
 OperationsByType = Mapping[OperationType, OperationIterable]
 TypeCalculation = Mapping[OperationType, Number]
+PositionVersion = Tuple[int, int]
+# First and last (excluded) unit, in FIFO order, and a factor of their cost.
+UnitRange = Tuple[Number, Number, adjustment_index.Factor]
+
+# Hidden folder next to stored portfolios where their positions are stored,
+# so they are not loaded as portfolios.
+_POSITION_STORAGE_FOLDER = '.positions'
+
+# Positions and summary of each portfolio and valuation method, together with
+# the portfolio and exchange rates version they were computed at.
+_PORTFOLIO_POSITIONS = {}
+# Position of each asset and valuation method, together with the position
+# version it was computed at.
+_ASSET_POSITIONS = {}
+# Portfolio version whose stored positions were last read, for each portfolio.
+_READ_STORED_POSITIONS = {}
+# Portfolio version, rates fingerprint and positions last stored for each
+# portfolio, to not store the same positions again.
+_WRITTEN_STORED_POSITIONS = {}
 
 
 class ValuationMethod(enum.Enum):
@@ -27,17 +55,45 @@ class ValuationMethod(enum.Enum):
 class OperationForCalculation(operation.Operation):
   """A copy of an operation to be used for calculations."""
 
-  def __init__(self, original_operation: operation.Operation):
+  def __init__(self, original_operation: operation.Operation,
+               adjustment: Optional[asset_manager.Adjustment] = None):
     """Initializes Operation for Calculation.
 
+    Price is converted to the asset currency at the date of the operation, so
+    operations in different currencies can be added up.
+
     Args:
       original_operation: Operation to copy.
+      adjustment: Quantity and price factors of later corporate actions,
+          e.g. splits, so operations before and after them are in the same
+          units. None if not adjusted.
     """
+    self.managed_asset = original_operation.managed_asset
     self.timestamp = original_operation.timestamp
     self.quantity = original_operation.quantity
     self.remaining_quantity = original_operation.quantity
-    self.price_per_unit = original_operation.price_per_unit
-    self.operation_currency = original_operation.operation_currency
+    self.operation_currency = (
+        self.managed_asset.currency or original_operation.operation_currency)
+    try:
+      self.price_per_unit = currency_manager.convert_value(
+          original_operation.price_per_unit,
+          original_operation.operation_currency, self.operation_currency,
+          original_operation.timestamp)
+    except currency_manager.ExchangeRateError:
+      # Operations stored before their currency was checked keep their
+      # price, so the rest of the position can still be calculated. Their
+      # position is marked as unconverted (see get_position).
+      self.price_per_unit = original_operation.price_per_unit
+
+    if not adjustment:
+      return
+
+    quantity_factor, price_factor = adjustment
+    if quantity_factor != 1:
+      self.quantity = float(self.quantity * quantity_factor)
+      self.remaining_quantity = self.quantity
+    if price_factor != 1:
+      self.price_per_unit = float(self.price_per_unit * price_factor)
 
   def __str__(self):
     """Converts operation to string."""
@@ -51,6 +107,7 @@ class OperationForCalculation(operation.Operation):
     )
 
 
+@metrics_manager.timed('get_position')
 def get_position(
         managed_asset: asset.Asset,
         valuation_method: ValuationMethod = ValuationMethod.FIFO
@@ -61,6 +118,9 @@ def get_position(
     managed_asset: Asset for which to calculate position.
     valuation_method: Inventory valuation method to calculate returns.
 
+  Positions with operations whose prices can not be converted to the asset
+  currency list those currencies in unconverted_currencies.
+
   Raises:
     NotImplementedError: When valuation method has not been implemented.
 
@@ -68,15 +128,52 @@ def get_position(
     Position of the given asset.
   """
   if valuation_method == ValuationMethod.AVERAGE:
-    return _get_position_by_average(managed_asset)
+    asset_position = _get_position_by_average(managed_asset)
   elif valuation_method == ValuationMethod.FIFO:
-    return _get_position_by_fifo(managed_asset)
-  elif valuation_method == ValuationMethod.LIFO:
-    pass
+    asset_position = _get_position_by_fifo(managed_asset)
+  else:
     # TODO: return _get_position_by_lifo(managed_asset)
+    raise NotImplementedError(
+        f'Valuation method {valuation_method.value} not implemented.')
+
+  asset_position.unconverted_currencies = (
+      _get_unconverted_currencies(managed_asset))
+  return asset_position
+
+
+def _get_unconverted_currencies(managed_asset: asset.Asset) -> List[Text]:
+  """Gets the operation currencies without exchange rates to the asset's.
+
+  Args:
+    managed_asset: Asset whose operations to check.
+
+  Returns:
+    Sorted currencies of operations which can not be converted.
+  """
+  if not managed_asset.currency:
+    return []
+
+  unconverted_currencies = set()
+  for _, operation_currency in asset_manager.get_operation_totals(
+          managed_asset):
+    try:
+      currency_manager.get_exchange_rate(
+          operation_currency, managed_asset.currency)
+    except currency_manager.ExchangeRateError:
+      unconverted_currencies.add(operation_currency)
+  return sorted(unconverted_currencies)
 
-  raise NotImplementedError(
-      f'Valuation method {valuation_method.value} not implemented.')
+
+def get_position_version(managed_asset: asset.Asset) -> PositionVersion:
+  """Gets the version of an asset position, which changes when it changes.
+
+  Args:
+    managed_asset: Asset for which to get position version.
+
+  Returns:
+    Asset and exchange rates versions.
+  """
+  return (managed_asset.get_version(), currency_manager.get_rates_version())
 
 
 def get_positions(
@@ -92,14 +189,280 @@ def get_positions(
   Returns:
     Map of assets and their current positions.
   """
-  portfolio_assets = asset_manager.get_assets(managed_portfolio)
-  portfolio_positions = {
-      managed_asset: get_position(managed_asset, valuation_method)
-      for managed_asset in portfolio_assets.values()
-  }
+  portfolio_positions, _ = (
+      _get_positions_and_summary(managed_portfolio, valuation_method))
   return portfolio_positions
 
 
+def get_portfolio_summary(
+    managed_portfolio: portfolio.Portfolio,
+    valuation_method: ValuationMethod = ValuationMethod.FIFO
+) -> portfolio_summary.PortfolioSummary:
+  """Gets the aggregated totals of all positions in the portfolio.
+
+  Args:
+    managed_portfolio: Portfolio to summarize.
+    valuation_method: Inventory valuation method to calculate returns.
+
+  Raises:
+    ExchangeRateError: positions can not be converted to portfolio currency.
+
+  Returns:
+    Summary of the portfolio positions in the portfolio currency.
+  """
+  _, summary = _get_positions_and_summary(managed_portfolio, valuation_method)
+  if not summary:
+    raise currency_manager.ExchangeRateError(
+        f'Unable to summarize {managed_portfolio}: missing exchange rates of '
+        'its positions.')
+  return summary
+
+
+def _get_positions_and_summary(
+    managed_portfolio: portfolio.Portfolio,
+    valuation_method: ValuationMethod
+) -> Tuple[Mapping[asset.Asset, position.Position],
+           Optional[portfolio_summary.PortfolioSummary]]:
+  """Gets positions and summary of a portfolio, computed once per version.
+
+  Args:
+    managed_portfolio: Portfolio from which to obtain positions.
+    valuation_method: Inventory valuation method to calculate returns.
+
+  Returns:
+    Map of assets and their current positions, and the portfolio summary.
+    Summary is None when positions can not be converted to portfolio currency.
+  """
+  cache_key = (managed_portfolio.get_id(), valuation_method)
+  version = (
+      managed_portfolio.get_version(), currency_manager.get_rates_version())
+
+  cached_version, portfolio_positions, summary = (
+      _PORTFOLIO_POSITIONS.get(cache_key, (None, None, None)))
+  if cached_version == version:
+    return (portfolio_positions, summary)
+
+  with metrics_manager.span('compute_positions'):
+    _read_stored_positions(managed_portfolio)
+    portfolio_assets = asset_manager.get_assets(managed_portfolio)
+    portfolio_positions = {
+        managed_asset: _get_cached_position(
+            managed_portfolio, managed_asset, valuation_method)
+        for managed_asset in portfolio_assets.values()
+    }
+
+  try:
+    summary = _get_portfolio_summary(managed_portfolio, portfolio_positions)
+  except ValueError as error:
+    print(f'{managed_portfolio} summary was not calculated: {error}')
+    summary = None
+
+  _PORTFOLIO_POSITIONS[cache_key] = (version, portfolio_positions, summary)
+  _write_stored_positions(managed_portfolio)
+  return (portfolio_positions, summary)
+
+
+def _get_cached_position(
+    managed_portfolio: portfolio.Portfolio,
+    managed_asset: asset.Asset,
+    valuation_method: ValuationMethod
+) -> position.Position:
+  """Gets position of an asset, computed once per position version.
+
+  Args:
+    managed_portfolio: Portfolio where asset is.
+    managed_asset: Asset for which to calculate position.
+    valuation_method: Inventory valuation method to calculate returns.
+
+  Returns:
+    Position of the given asset.
+  """
+  cache_key = (
+      managed_portfolio.get_id(), managed_asset.get_id(), valuation_method)
+  version = get_position_version(managed_asset)
+
+  cached_version, asset_position = (
+      _ASSET_POSITIONS.get(cache_key, (None, None)))
+  # Assets deleted and added again restart their version.
+  if cached_version != version or asset_position.asset is not managed_asset:
+    asset_position = get_position(managed_asset, valuation_method)
+    _ASSET_POSITIONS[cache_key] = (version, asset_position)
+
+  return asset_position
+
+
+def _read_stored_positions(managed_portfolio: portfolio.Portfolio):
+  """Caches positions stored for the current version of a portfolio.
+
+  Positions are read once per portfolio version, e.g. after a restart, and
+  only those of assets at the version they were computed at are used.
+
+  Args:
+    managed_portfolio: Portfolio for which to read stored positions.
+  """
+  portfolio_id = managed_portfolio.get_id()
+  portfolio_version = managed_portfolio.get_version()
+  if (_READ_STORED_POSITIONS.get(portfolio_id) == portfolio_version or
+      not portfolio_manager.is_stored(managed_portfolio)):
+    return
+  _READ_STORED_POSITIONS[portfolio_id] = portfolio_version
+
+  positions_filename = _get_positions_filename(portfolio_id)
+  try:
+    stored_positions = pickle.loads(
+        file_manager.get_file_binary_content(positions_filename))
+  except FileNotFoundError:
+    return
+  except Exception as error:
+    print(f'Unable to read {managed_portfolio} stored positions: {error}')
+    return
+
+  if (stored_positions['portfolio_version'] != portfolio_version or
+      stored_positions['rates_fingerprint'] != (
+          currency_manager.get_rates_fingerprint())):
+    return
+
+  rates_version = currency_manager.get_rates_version()
+  for (asset_id, valuation_method_name), (asset_version, position_values) in (
+      stored_positions['positions'].items()):
+    managed_asset = managed_portfolio.assets.get(asset_id)
+    if not managed_asset or managed_asset.get_version() != asset_version:
+      continue
+    # Positions stored before unconverted currencies were kept are computed
+    # again, as they may have mixed currencies.
+    if 'unconverted_currencies' not in position_values:
+      continue
+
+    valuation_method = ValuationMethod(valuation_method_name)
+    cache_key = (portfolio_id, asset_id, valuation_method)
+    _ASSET_POSITIONS[cache_key] = (
+        (asset_version, rates_version),
+        position.Position(managed_asset, **position_values))
+
+
+def _write_stored_positions(managed_portfolio: portfolio.Portfolio):
+  """Stores the cached positions of a portfolio, to read them after restarts.
+
+  Positions are only stored while the portfolio is unchanged since it was
+  stored, so they match the stored portfolio version.
+
+  Args:
+    managed_portfolio: Portfolio whose positions to store.
+  """
+  portfolio_id = managed_portfolio.get_id()
+  if not portfolio_manager.is_stored(managed_portfolio):
+    return
+
+  stored_positions = {
+      'portfolio_version': managed_portfolio.get_version(),
+      'rates_fingerprint': currency_manager.get_rates_fingerprint(),
+      'positions': {},
+  }
+  for managed_asset in managed_portfolio.assets.values():
+    for valuation_method in ValuationMethod:
+      cache_key = (portfolio_id, managed_asset.get_id(), valuation_method)
+      cached_version, asset_position = (
+          _ASSET_POSITIONS.get(cache_key, (None, None)))
+      if (cached_version != get_position_version(managed_asset) or
+          asset_position.asset is not managed_asset):
+        continue
+
+      position_values = vars(asset_position).copy()
+      del position_values['asset']
+      stored_positions['positions'][
+          (managed_asset.get_id(), valuation_method.value)] = (
+              managed_asset.get_version(), position_values)
+
+  if _WRITTEN_STORED_POSITIONS.get(portfolio_id) == stored_positions:
+    return
+
+  try:
+    file_manager.create_file(
+        _get_positions_filename(portfolio_id),
+        contents=pickle.dumps(stored_positions))
+  except OSError as error:
+    print(f'Unable to store {managed_portfolio} positions: {error}')
+    return
+  _WRITTEN_STORED_POSITIONS[portfolio_id] = stored_positions
+
+
+def _get_positions_filename(portfolio_id: Text) -> Text:
+  """Gets the file where positions of a portfolio are stored.
+
+  Args:
+    portfolio_id: Id of the portfolio.
+
+  Returns:
+    Name of the file, next to stored portfolios.
+  """
+  return (
+      f'{portfolio_manager.get_storage_path()}/'
+      f'{_POSITION_STORAGE_FOLDER}/{portfolio_id}')
+
+
+def _get_portfolio_summary(
+    managed_portfolio: portfolio.Portfolio,
+    portfolio_positions: Mapping[asset.Asset, position.Position]
+) -> portfolio_summary.PortfolioSummary:
+  """Aggregates positions into a summary in the portfolio currency.
+
+  Args:
+    managed_portfolio: Portfolio to summarize.
+    portfolio_positions: Positions of all assets in the portfolio.
+
+  Raises:
+    ExchangeRateError: no exchange rate found for the asset currencies, or
+        positions mix operation currencies which can not be converted.
+
+  Returns:
+    Summary of the portfolio positions.
+  """
+  positions = list(portfolio_positions.values())
+  for asset_position in positions:
+    if asset_position.unconverted_currencies:
+      raise currency_manager.ExchangeRateError(
+          f'{asset_position.asset} has operations in '
+          f'{", ".join(asset_position.unconverted_currencies)} which can not '
+          f'be converted to {asset_position.asset.currency}.')
+
+  currencies = [asset_position.asset.currency for asset_position in positions]
+
+  def get_total(attribute):
+    values = [
+        getattr(asset_position, attribute) for asset_position in positions]
+    return currency_manager.convert_values(
+        values, currencies, managed_portfolio.currency)
+
+  market_values = get_total('market_value')
+  market_value = float(market_values.sum())
+  realized_pl = float(get_total('realized_pl').sum())
+  unrealized_pl = float(get_total('unrealized_pl').sum())
+  dividends = float(get_total('dividends').sum())
+  cost_basis = float(get_total('cost_basis').sum())
+  sold_cost_basis = float(get_total('sold_cost_basis').sum())
+
+  total_pl = realized_pl + unrealized_pl + dividends
+  total_cost_basis = cost_basis + sold_cost_basis
+
+  allocation = {
+      asset_position.asset: (
+          float(asset_market_value) / market_value if market_value else 0)
+      for asset_position, asset_market_value in zip(positions, market_values)
+  }
+
+  return portfolio_summary.PortfolioSummary(
+      managed_portfolio,
+      market_value,
+      realized_pl,
+      realized_pl / sold_cost_basis if sold_cost_basis > 0 else 0,
+      unrealized_pl,
+      unrealized_pl / cost_basis if cost_basis > 0 else 0,
+      dividends,
+      total_pl,
+      total_pl / total_cost_basis if total_cost_basis > 0 else 0,
+      allocation)
+
+
 # FIFO calculations.
 def _get_position_by_fifo(managed_asset: asset.Asset) -> position.Position:
   """Gets position of given asset following Fist In, First Out method.
@@ -118,6 +481,8 @@ def _get_position_by_fifo(managed_asset: asset.Asset) -> position.Position:
   asset_operations = list(asset_manager.get_operations(managed_asset).values())
   asset_operations.sort(key=lambda op: op.timestamp)
   operations_by_type = _get_operations_by_type(asset_operations)
+  operations_by_type[OperationType.BUY] = _get_spin_off_buy_units(
+      managed_asset, operations_by_type)
 
   sold_units = _get_fifo_sold_units(operations_by_type)
   buy_units_sold, buy_units_unsold = (
@@ -139,12 +504,16 @@ def _get_position_by_fifo(managed_asset: asset.Asset) -> position.Position:
       current_price)
 
   dividend_value, dividend_yield = (
-      _get_dividend_value_and_yield(operations_by_type))
+      _get_dividend_value_and_yield(managed_asset))
+
+  cost_basis = _get_total_value(buy_units_unsold)
+  sold_cost_basis = _get_total_value(buy_units_sold)
 
   return position.Position(
       managed_asset, remaining_quantity, market_value,
       realized_pl, realized_roi, unrealized_pl, unrealized_roi,
-      opportunity_pl, opportunity_roi, dividend_value, dividend_yield)
+      opportunity_pl, opportunity_roi, dividend_value, dividend_yield,
+      cost_basis, sold_cost_basis)
 
 
 def _get_fifo_sold_units(
@@ -186,9 +555,9 @@ def _get_fifo_buy_units_sold(
 
   buy_operations = _copy_list_of_operations_for_calculation(buy_operations)
 
-  # TODO: an improvement here would be to iterate the list of sell instead of
-  # the total value. This would allow to verify that the sell timestamp was
-  # after a buy timestamp. Otherwise, we sold more asset units than we had.
+  # Sells are matched by total quantity. Operations selling units before
+  # they were bought are rejected when added (see asset_manager), but assets
+  # stored before that may still have them.
   sell_operations = _copy_list_of_operations_for_calculation(sell_operations)
   sell_quantity = _get_total_quantity(sell_operations)
 
@@ -333,176 +702,71 @@ def _get_position_by_average(managed_asset: asset.Asset) -> position.Position:
   the return on investment that were realized. However, it is the simplest
   method to calculate.
 
+  As every unit is valued at the average price of its operation type, the
+  position only needs the running totals of the asset, not its history.
+
   Args:
     managed_asset: Asset for which to calculate positions.
 
+  Raises:
+    ValueError: sold more units than we had bought.
+
   Returns:
     Position of the asset by average methodology.
   """
   current_price = managed_asset.current_price
 
-  asset_operations = list(asset_manager.get_operations(managed_asset).values())
-  operations_by_type = _get_operations_by_type(asset_operations)
-
-  sold_units = operations_by_type[OperationType.SELL]
+  total_quantity = _get_total_quantity_by_type(managed_asset)
+  average_price = _get_average_value_by_type(managed_asset)
 
-  buy_units_sold, buy_units_unsold = (
-      _get_average_buy_units_sold(operations_by_type))
+  buy_quantity = total_quantity[OperationType.BUY]
+  sell_quantity = total_quantity[OperationType.SELL]
+  average_buy_price = average_price[OperationType.BUY]
+  average_sell_price = average_price[OperationType.SELL]
 
-  rebought_units, sold_rebought_units, sold_not_rebought_units = (
-      _get_average_rebought_units_sold(operations_by_type))
+  if sell_quantity > buy_quantity:
+    raise ValueError('Sold more units than bought. Overselling asset.')
 
-  remaining_quantity = _get_total_quantity(buy_units_unsold)
+  remaining_quantity = buy_quantity - sell_quantity
   market_value = remaining_quantity * current_price
 
-  realized_pl, realized_roi = (
-      _get_realized_pl_and_roi(buy_units_sold, sold_units))
-
-  unrealized_pl, unrealized_roi = _get_unrealized_pl_and_roi(
-      buy_units_unsold, managed_asset.current_price)
-
-  opportunity_pl, opportunity_roi = _get_opportunity_pl_and_roi(
-      sold_not_rebought_units, sold_rebought_units, rebought_units,
-      current_price)
+  sold_cost_basis = sell_quantity * average_buy_price
+  cost_basis = remaining_quantity * average_buy_price
+  spin_offs = _get_spin_offs(managed_asset)
+  if spin_offs:
+    # Only units held on the date of a spin-off have their cost reduced,
+    # taking units sold before it as the first ones bought.
+    held_units = _get_spin_off_held_units(
+        spin_offs, _get_operations_by_type(
+            asset_manager.get_operations(managed_asset).values()))
+    sold_cost_basis = average_buy_price * _get_cost_factor_total(
+        held_units, 0, sell_quantity)
+    cost_basis = average_buy_price * _get_cost_factor_total(
+        held_units, sell_quantity, buy_quantity)
+
+  sold_value = sell_quantity * average_sell_price
+  realized_pl = sold_value - sold_cost_basis
+  realized_roi = realized_pl / sold_cost_basis if sold_cost_basis > 0 else 0
+
+  unrealized_pl = market_value - cost_basis
+  unrealized_roi = unrealized_pl / cost_basis if cost_basis > 0 else 0
+
+  # Units held are considered rebought after a sale, up to the units sold.
+  rebought_quantity = min(sell_quantity, remaining_quantity)
+  not_rebought_quantity = sell_quantity - rebought_quantity
+  opportunity_pl = (
+      not_rebought_quantity * (average_sell_price - current_price) +
+      rebought_quantity * (average_sell_price - average_buy_price))
+  opportunity_roi = opportunity_pl / sold_value if sold_value > 0 else 0
 
   dividend_value, dividend_yield = (
-      _get_dividend_value_and_yield(operations_by_type))
+      _get_dividend_value_and_yield(managed_asset))
 
   return position.Position(
       managed_asset, remaining_quantity, market_value,
       realized_pl, realized_roi, unrealized_pl, unrealized_roi,
-      opportunity_pl, opportunity_roi, dividend_value, dividend_yield)
-
-
-def _get_average_buy_units_sold(
-    operations_by_type: OperationsByType
-) -> Tuple[OperationIterable, OperationIterable]:
-  """Gets list of operations that were sold using average method.
-
-  Args:
-    operations_by_type: Operations by type.
-
-  Raises:
-    ValueError: sold more units than we had bought.
-
-  Returns:
-    List of operations split by whether they were sold or not.
-  """
-  sell_operations = operations_by_type[OperationType.SELL]
-  buy_operations = operations_by_type[OperationType.BUY]
-
-  if not sell_operations:
-    return ([], buy_operations)
-
-  if not buy_operations:
-    raise ValueError('No buy operations found. Overselling asset.')
-
-  buy_operations = _copy_list_of_operations_for_calculation(buy_operations)
-  average_price = _get_average_value_by_type(operations_by_type)
-
-  sell_operations = _copy_list_of_operations_for_calculation(sell_operations)
-  sell_quantity = _get_total_quantity(sell_operations)
-
-  buy_units_sold = []
-  buy_units_unsold = []
-  buy_units_quantity = 0
-
-  while buy_units_quantity < sell_quantity:
-    next_buy_operation = buy_operations.pop(0)
-    next_buy_operation.price_per_unit = average_price[OperationType.BUY]
-    if buy_units_quantity + next_buy_operation.quantity <= sell_quantity:
-      buy_units_sold.append(OperationForCalculation(next_buy_operation))
-      buy_units_quantity += next_buy_operation.quantity
-    else:  # Last unit.
-      remaining_units = sell_quantity - buy_units_quantity
-      buy_units_quantity += remaining_units
-
-      partial_buy_sold = OperationForCalculation(next_buy_operation)
-      partial_buy_sold.quantity = remaining_units
-      buy_units_sold.append(OperationForCalculation(partial_buy_sold))
-
-      partial_buy_unsold = OperationForCalculation(next_buy_operation)
-      partial_buy_unsold.quantity -= remaining_units
-      buy_units_unsold.append(OperationForCalculation(partial_buy_unsold))
-
-  buy_units_unsold.extend(buy_operations)
-
-  return (buy_units_sold, buy_units_unsold)
-
-
-def _get_average_rebought_units_sold(
-    operations_by_type: OperationsByType
-) -> Tuple[OperationIterable, OperationIterable, OperationIterable]:
-  """Gets list of buy units that were rebought after sell using average method.
-
-  Args:
-    operations_by_type: Operations by type.
-
-  Returns:
-    Tuple containing:
-      List of buy operations that were rebought.
-      List of sell operations that were not rebought.
-  """
-  sell_operations = operations_by_type[OperationType.SELL]
-  if not sell_operations:
-    return ([], [], [])
-
-  average_price = _get_average_value_by_type(operations_by_type)
-  average_buy_price = average_price[OperationType.BUY]
-  average_sell_price = average_price[OperationType.SELL]
-
-  sell_operations = _copy_list_of_operations_for_calculation(sell_operations)
-  for sell_op in sell_operations:
-    sell_op.price_per_unit = average_sell_price
-
-  _, buy_units_unsold = _get_average_buy_units_sold(operations_by_type)
-  for buy_op in buy_units_unsold:
-    buy_op.price_per_unit = average_buy_price
-
-  sold_rebought_units = []
-  sold_not_rebought_units = []
-  rebought_units = []
-
-  next_sell = None
-  next_buy = None
-
-  while sell_operations and buy_units_unsold:
-    next_sell = next_sell or sell_operations.pop(0)
-    next_buy = next_buy or buy_units_unsold.pop(0)
-
-    if next_sell.remaining_quantity == next_buy.remaining_quantity:
-      sold_rebought_units.append(OperationForCalculation(next_sell))
-      rebought_units.append(OperationForCalculation(next_buy))
-      next_sell = None
-      next_buy = None
-
-    elif next_sell.remaining_quantity > next_buy.remaining_quantity:
-      next_sell.remaining_quantity -= next_buy.remaining_quantity
-      rebought_units.append(OperationForCalculation(next_buy))
-      next_buy = None
-
-    elif next_sell.remaining_quantity < next_buy.remaining_quantity:
-      sold_rebought_units.append(OperationForCalculation(next_sell))
-      next_buy.remaining_quantity -= next_sell.remaining_quantity
-      next_sell = None
-
-  if next_sell:
-    partial_sell_rebought = OperationForCalculation(next_sell)
-    partial_sell_rebought.quantity -= next_sell.remaining_quantity
-    sold_rebought_units.append(OperationForCalculation(partial_sell_rebought))
-
-    partial_sell_not_rebought = OperationForCalculation(next_sell)
-    partial_sell_rebought.quantity = next_sell.remaining_quantity
-    sold_not_rebought_units.append(
-        OperationForCalculation(partial_sell_not_rebought))
-
-  if next_buy:
-    partial_rebought = OperationForCalculation(next_buy)
-    partial_rebought.quantity -= next_buy.remaining_quantity
-    rebought_units.append(OperationForCalculation(partial_rebought))
-    # We do not care about buys which are new (not rebought).
-
-  return (rebought_units, sold_rebought_units, sold_not_rebought_units)
+      opportunity_pl, opportunity_roi, dividend_value, dividend_yield,
+      cost_basis, sold_cost_basis)
 
 
 # Helper functions.
@@ -552,11 +816,165 @@ def _get_operation_type_for_calculation(
   Returns:
     List of operations for calculations of the given type.
   """
-  return [
-      OperationForCalculation(op)
-      for op in asset_operations
-      if op.operation_type == operation_type
-  ]
+  type_operations = [
+      op for op in asset_operations if op.operation_type == operation_type]
+  if not type_operations:
+    return []
+
+  # Operations are only adjusted when their asset had corporate actions.
+  managed_asset = type_operations[0].managed_asset
+  if not asset_manager.get_adjustment_index(managed_asset):
+    return [OperationForCalculation(op) for op in type_operations]
+
+  # Spin-offs do not change units, and only reduce the cost of units held
+  # on their date (see _get_spin_off_buy_units), so prices are only adjusted
+  # for the units.
+  type_calculations = []
+  for op in type_operations:
+    quantity_factor, _ = asset_manager.get_adjustment_factors(op)
+    type_calculations.append(
+        OperationForCalculation(op, (quantity_factor, 1 / quantity_factor)))
+  return type_calculations
+
+
+def _get_spin_offs(
+    managed_asset: asset.Asset
+) -> List[Tuple[datetime.datetime, adjustment_index.Factor]]:
+  """Gets the date and price factor of the spin-offs of an asset.
+
+  Args:
+    managed_asset: Asset for which to get spin-offs.
+
+  Returns:
+    Date and price factor of each spin-off.
+  """
+  spin_offs = []
+  for asset_action in asset_manager.get_corporate_actions(
+          managed_asset).values():
+    if asset_action.action_type == (
+            corporate_action.CorporateActionType.SPIN_OFF):
+      _, price_factor = asset_manager.get_corporate_action_factors(
+          asset_action)
+      spin_offs.append((asset_action.timestamp, price_factor))
+  return spin_offs
+
+
+def _get_spin_off_held_units(
+    spin_offs: Iterable[Tuple[datetime.datetime, adjustment_index.Factor]],
+    operations_by_type: OperationsByType
+) -> List[UnitRange]:
+  """Gets the units held on the date of each spin-off.
+
+  Units are numbered in FIFO order, so those held on a date are those bought
+  before it and not sold before it.
+
+  Args:
+    spin_offs: Date and price factor of each spin-off.
+    operations_by_type: Operations by type, adjusted for splits.
+
+  Returns:
+    Units held on the date of each spin-off, and its price factor.
+  """
+  held_units = []
+  for action_timestamp, price_factor in spin_offs:
+    bought_quantity = _get_total_quantity(
+        op for op in operations_by_type[OperationType.BUY]
+        if op.timestamp < action_timestamp)
+    sold_quantity = _get_total_quantity(
+        op for op in operations_by_type[OperationType.SELL]
+        if op.timestamp < action_timestamp)
+    if sold_quantity < bought_quantity:
+      held_units.append((sold_quantity, bought_quantity, price_factor))
+  return held_units
+
+
+def _get_cost_factors(held_units: Iterable[UnitRange],
+                      first_unit: Number,
+                      last_unit: Number) -> List[UnitRange]:
+  """Splits a range of units by the spin-offs they were held in.
+
+  Args:
+    held_units: Units held on the date of each spin-off, and its factor.
+    first_unit: First unit of the range.
+    last_unit: Last unit of the range, excluded.
+
+  Returns:
+    Parts of the range, each with the product of the price factors of the
+    spin-offs its units were held in.
+  """
+  boundaries = sorted({first_unit, last_unit} | {
+      unit
+      for held_first_unit, held_last_unit, _ in held_units
+      for unit in (held_first_unit, held_last_unit)
+      if first_unit < unit < last_unit
+  })
+
+  cost_factors = []
+  for part_first_unit, part_last_unit in zip(boundaries, boundaries[1:]):
+    cost_factor = adjustment_index.Factor(1)
+    for held_first_unit, held_last_unit, price_factor in held_units:
+      if held_first_unit <= part_first_unit < held_last_unit:
+        cost_factor *= price_factor
+    cost_factors.append((part_first_unit, part_last_unit, cost_factor))
+  return cost_factors
+
+
+def _get_cost_factor_total(held_units: Iterable[UnitRange],
+                           first_unit: Number,
+                           last_unit: Number) -> float:
+  """Counts a range of units, each weighted by the cost kept by spin-offs.
+
+  Args:
+    held_units: Units held on the date of each spin-off, and its factor.
+    first_unit: First unit of the range.
+    last_unit: Last unit of the range, excluded.
+
+  Returns:
+    Sum of the units, each multiplied by its cost factor.
+  """
+  return float(sum(
+      (part_last_unit - part_first_unit) * cost_factor
+      for part_first_unit, part_last_unit, cost_factor in _get_cost_factors(
+          held_units, first_unit, last_unit)))
+
+
+def _get_spin_off_buy_units(
+        managed_asset: asset.Asset,
+        operations_by_type: OperationsByType) -> OperationIterable:
+  """Splits buy operations by the spin-offs which reduced their cost.
+
+  A spin-off moves part of the cost of the units held on its date to the new
+  company. Units sold before it keep their cost, so profits already realized
+  do not change.
+
+  Args:
+    managed_asset: Asset of the operations.
+    operations_by_type: Operations by type, adjusted for splits.
+
+  Returns:
+    Buy units in FIFO order, priced at the cost kept after spin-offs.
+  """
+  buy_operations = operations_by_type[OperationType.BUY]
+  spin_offs = _get_spin_offs(managed_asset)
+  if not spin_offs:
+    return buy_operations
+
+  held_units = _get_spin_off_held_units(spin_offs, operations_by_type)
+  buy_units = []
+  first_unit = 0
+  for buy_operation in sorted(buy_operations, key=lambda op: op.timestamp):
+    last_unit = first_unit + buy_operation.quantity
+    for part_first_unit, part_last_unit, cost_factor in _get_cost_factors(
+            held_units, first_unit, last_unit):
+      buy_unit = OperationForCalculation(buy_operation)
+      buy_unit.quantity = part_last_unit - part_first_unit
+      buy_unit.remaining_quantity = buy_unit.quantity
+      if cost_factor != 1:
+        buy_unit.price_per_unit = float(
+            buy_unit.price_per_unit * cost_factor)
+      buy_units.append(buy_unit)
+    first_unit = last_unit
+  return buy_units
 
 
 def _get_total_quantity(operation_list: OperationIterable) -> int:
@@ -571,20 +989,63 @@ def _get_total_quantity(operation_list: OperationIterable) -> int:
   return sum([op.quantity for op in operation_list])
 
 
-def _get_total_quantity_by_type(
-        operations_by_type: OperationsByType) -> TypeCalculation:
+def _get_totals_by_type(
+        managed_asset: asset.Asset) -> Tuple[TypeCalculation, TypeCalculation]:
+  """Calculates total quantity and value of each operation type.
+
+  Running totals are read directly when all operations are in the asset
+  currency and after all corporate actions. Otherwise, operations are
+  converted and adjusted at their own date one by one.
+
+  Args:
+    managed_asset: Asset for which to calculate totals.
+
+  Returns:
+    Total quantity and total value in asset currency for each operation type.
+  """
+  asset_totals = asset_manager.get_operation_totals(managed_asset)
+  is_asset_currency = all(
+      currency_manager.is_same_currency(currency, managed_asset.currency)
+      for _, currency in asset_totals)
+  asset_adjustments = asset_manager.get_adjustment_index(managed_asset)
+  is_adjusted = any(
+      asset_adjustments.is_adjusted(totals.first_timestamp.timestamp())
+      for totals in asset_totals.values())
+
+  if not is_asset_currency or is_adjusted:
+    asset_operations = asset_manager.get_operations(managed_asset).values()
+    operations_by_type = _get_operations_by_type(asset_operations)
+    return (
+        {
+            operation_type: _get_total_quantity(operation_list)
+            for operation_type, operation_list in operations_by_type.items()
+        },
+        {
+            operation_type: _get_total_value(operation_list)
+            for operation_type, operation_list in operations_by_type.items()
+        },
+    )
+
+  total_quantity = {operation_type: 0 for operation_type in OperationType}
+  total_value = {operation_type: 0 for operation_type in OperationType}
+  for (operation_type, _), totals in asset_totals.items():
+    total_quantity[operation_type] += totals.quantity
+    total_value[operation_type] += totals.value
+
+  return (total_quantity, total_value)
+
+
+def _get_total_quantity_by_type(managed_asset: asset.Asset) -> TypeCalculation:
   """Calculates total assets in each operation type.
 
   Args:
-    operations_by_type: List of operations by type.
+    managed_asset: Asset for which to calculate totals.
 
   Returns:
     Total quantity of assets for each operation type.
   """
-  return {
-      operation_type: _get_total_quantity(operation_list)
-      for operation_type, operation_list in operations_by_type.items()
-  }
+  total_quantity, _ = _get_totals_by_type(managed_asset)
+  return total_quantity
 
 
 def _get_total_value(operation_list: OperationIterable) -> float:
@@ -599,49 +1060,34 @@ def _get_total_value(operation_list: OperationIterable) -> float:
   return sum([op.quantity * op.price_per_unit for op in operation_list])
 
 
-def _get_total_value_by_type(
-        operations_by_type: OperationsByType) -> TypeCalculation:
-  """Calculates total assets in each operation type.
+def _get_total_value_by_type(managed_asset: asset.Asset) -> TypeCalculation:
+  """Calculates total value in each operation type.
 
   Args:
-    operations_by_type: List of operations by type.
+    managed_asset: Asset for which to calculate totals.
 
   Returns:
     Total value of assets for each operation type.
   """
-  return {
-      operation_type: _get_total_value(operation_list)
-      for operation_type, operation_list in operations_by_type.items()
-  }
-
+  _, total_value = _get_totals_by_type(managed_asset)
+  return total_value
 
-def _get_weighted_average_value(operation_list: OperationIterable) -> float:
-  """Calculates the average weighted value of a given operation list.
-
-  Args:
-    operation_list: Operations for which to calculate weighted average value.
 
-  Returns:
-    Weighted average value.
-  """
-  total_value = _get_total_value(operation_list)
-  total_quantity = _get_total_quantity(operation_list)
-  return total_value / total_quantity if total_quantity > 0 else 0
-
-
-def _get_average_value_by_type(
-        operations_by_type: OperationsByType) -> TypeCalculation:
+def _get_average_value_by_type(managed_asset: asset.Asset) -> TypeCalculation:
   """Calculates average asset value in each operation type.
 
   Args:
-    operations_by_type: List of operations by type.
+    managed_asset: Asset for which to calculate averages.
 
   Returns:
     Average value of assets for each operation type.
   """
+  total_quantity, total_value = _get_totals_by_type(managed_asset)
   return {
-      operation_type: _get_weighted_average_value(operation_list)
-      for operation_type, operation_list in operations_by_type.items()
+      operation_type: (
+          total_value[operation_type] / total_quantity[operation_type]
+          if total_quantity[operation_type] > 0 else 0)
+      for operation_type in OperationType
   }
 
 
@@ -731,15 +1177,14 @@ def _get_opportunity_pl_and_roi(
 
 
 def _get_dividend_value_and_yield(
-    operations_by_type: OperationsByType
-) -> Tuple[float, float]:
+        managed_asset: asset.Asset) -> Tuple[float, float]:
   """Calculates dividend value and yield.
 
   At the moment, this only works with average price yield, which is not a very
   accurate method. Read TODO to know what else needs to be done here.
 
   Args:
-    operations_by_type: Operations by type.
+    managed_asset: Asset for which to calculate dividends.
 
   Returns:
     Total dividend value and yield.
@@ -752,15 +1197,12 @@ def _get_dividend_value_and_yield(
   # is not keeping track. A workaround is to compare against the buy prices,
   # which is not the actual financial metric definition, but does provide a
   # sense of return of investments. This is the current logic.
-  dividend_value = _get_total_value(operations_by_type[OperationType.DIVIDEND])
-  dividend_quantity = (
-      _get_total_quantity(operations_by_type[OperationType.DIVIDEND]))
-
-  dividend_per_share = (
-      dividend_value / dividend_quantity if dividend_quantity > 0 else 0)
+  average_price = _get_average_value_by_type(managed_asset)
+  dividend_value = _get_total_value_by_type(managed_asset)[
+      OperationType.DIVIDEND]
 
-  buy_average = (
-      _get_weighted_average_value(operations_by_type[OperationType.BUY]))
+  dividend_per_share = average_price[OperationType.DIVIDEND]
+  buy_average = average_price[OperationType.BUY]
 
   dividend_yield = dividend_per_share / buy_average if buy_average > 0 else 0
 
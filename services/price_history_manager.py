@@ -0,0 +1,325 @@
+"""Keeps daily prices of trackers in local files."""
+
+import datetime
+import glob
+import os
+import threading
+import time
+import numpy as np
+
+from models import adjustment_index
+from services import file_manager
+from typing import Mapping, Optional, Sequence, Text, Tuple
+
+_PRICE_HISTORY_STORAGE_PATH = 'price_history'
+_PRICE_HISTORY_FILE_HEADER = 'date,price'
+# Storage changed less than these seconds ago is checked on every access, as
+# further changes may not move its modification time.
+_MODIFIED_TIME_RESOLUTION = 2
+
+TrackerPrices = Mapping[datetime.date, float]
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Prices of each tracker by date, in the currency of its assets.
+_PRICE_HISTORIES = {}
+_LOADED = False
+# Signature of the storage folder and of each file when last loaded, so files
+# stored by other processes (e.g. server workers) are loaded again.
+_STORAGE_SIGNATURE = None
+_FILE_SIGNATURES = {}
+# Changes every time stored prices change, so derived values can be cached.
+_PRICES_VERSION = 0
+_PRICES_LOCK = threading.RLock()
+
+
+def get_storage_path() -> Text:
+  """Gets the folder where price histories are stored."""
+  return _PRICE_HISTORY_STORAGE_PATH
+
+
+def set_storage_path(storage_path: Text):
+  """Sets the folder where price histories are stored, e.g. for benchmarks.
+
+  Prices loaded from the previous folder are forgotten.
+
+  Args:
+    storage_path: Folder where to store and load price histories.
+  """
+  global _PRICE_HISTORY_STORAGE_PATH
+  global _LOADED
+  global _STORAGE_SIGNATURE
+
+  with _PRICES_LOCK:
+    _PRICE_HISTORY_STORAGE_PATH = storage_path
+    _LOADED = False
+    _STORAGE_SIGNATURE = None
+    _FILE_SIGNATURES.clear()
+    _PRICE_HISTORIES.clear()
+    _clear_cache()
+
+
+def get_price_histories() -> Mapping[Text, TrackerPrices]:
+  """Gets all the stored price histories.
+
+  Price histories stored by other processes since they were loaded are
+  loaded again.
+
+  Returns:
+    Map of trackers and their prices by date.
+  """
+  global _LOADED
+  global _STORAGE_SIGNATURE
+
+  with _PRICES_LOCK:
+    storage_signature = file_manager.get_file_signature(
+        _PRICE_HISTORY_STORAGE_PATH)
+    if (not _LOADED or storage_signature != _STORAGE_SIGNATURE or
+        _is_recently_modified(storage_signature)):
+      _load_changed_price_histories()
+      _STORAGE_SIGNATURE = storage_signature
+      _LOADED = True
+
+  return _PRICE_HISTORIES
+
+
+def get_prices_version() -> int:
+  """Gets the version of the stored prices, which changes when they change."""
+  get_price_histories()
+  return _PRICES_VERSION
+
+
+def get_price_matrix(
+    trackers: Sequence[Text],
+    max_days: Optional[int] = None,
+    shared_dates: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Gets the daily prices of many trackers side by side.
+
+  Trackers without a price on one of the dates keep their previous price.
+
+  Args:
+    trackers: Trackers for which to get prices.
+    max_days: Number of latest dates to include. Defaults to all.
+    shared_dates: Whether to only include dates since every tracker has a
+        price. Otherwise, dates since any tracker has a price are included,
+        and trackers have no price (NaN) before their first one.
+
+  Raises:
+    ValueError: a tracker has no stored prices.
+
+  Returns:
+    Sorted dates, and a matrix with the price of each tracker (column) at
+    each date (row).
+  """
+  price_histories = get_price_histories()
+  missing_trackers = [
+      tracker for tracker in trackers
+      if not price_histories.get(tracker.upper())
+  ]
+  if missing_trackers:
+    raise ValueError(f'No prices stored for {", ".join(missing_trackers)}.')
+
+  with _PRICES_LOCK:
+    tracker_prices = [
+        sorted(price_histories[tracker.upper()].items())
+        for tracker in trackers
+    ]
+
+  if not tracker_prices:
+    return (np.array([], dtype='datetime64[D]'), np.empty((0, 0)))
+
+  # Dates are compared as day ordinals, which numpy handles much faster.
+  first_dates = [prices[0][0] for prices in tracker_prices]
+  first_date = (
+      max(first_dates) if shared_dates else min(first_dates)).toordinal()
+  date_ordinals = np.array(sorted({
+      price_date.toordinal()
+      for prices in tracker_prices
+      for price_date, _ in prices
+  }))
+  date_ordinals = date_ordinals[date_ordinals >= first_date]
+  if max_days is not None:
+    date_ordinals = date_ordinals[-max_days:]
+
+  prices = np.empty((len(date_ordinals), len(trackers)))
+  for column, prices_by_date in enumerate(tracker_prices):
+    price_ordinals = np.fromiter(
+        (price_date.toordinal() for price_date, _ in prices_by_date),
+        dtype=np.int64, count=len(prices_by_date))
+    price_values = np.fromiter(
+        (price for _, price in prices_by_date),
+        dtype=float, count=len(prices_by_date))
+    # Latest price on or before each date.
+    price_positions = np.searchsorted(
+        price_ordinals, date_ordinals, side='right') - 1
+    prices[:, column] = price_values[price_positions]
+    prices[price_positions < 0, column] = np.nan
+
+  dates = (date_ordinals - _EPOCH_ORDINAL).astype('datetime64[D]')
+  return (dates, prices)
+
+
+def get_adjusted_prices(
+    dates: np.ndarray,
+    prices: np.ndarray,
+    price_adjustments: adjustment_index.AdjustmentIndex
+) -> np.ndarray:
+  """Adjusts the prices of an asset to its units after corporate actions.
+
+  Prices before a 2:1 split are halved, so the split is not seen as a fall.
+  Each price is taken at the end of its date, after the actions of the day.
+
+  Args:
+    dates: Sorted dates of the prices.
+    prices: Price of the asset at each date.
+    price_adjustments: Adjustments of the asset corporate actions.
+
+  Returns:
+    Adjusted price at each date.
+  """
+  if not len(price_adjustments):
+    return prices
+
+  price_timestamps = [
+      datetime.datetime.combine(price_date, datetime.time.max).timestamp()
+      for price_date in dates.tolist()
+  ]
+  return prices * np.array(
+      price_adjustments.get_price_factors(price_timestamps), dtype=float)
+
+
+def load_price_history(prices_filename: Text):
+  """Loads prices of a tracker from a file.
+
+  File must be named after the tracker (e.g. GOOG.csv) and contain one
+  `date,price` line per ISO date.
+
+  Args:
+    prices_filename: File from which to load prices.
+
+  Raises:
+    ValueError: file contents are not valid.
+  """
+  prices_content = file_manager.get_file_text_content(prices_filename)
+  with _PRICES_LOCK:
+    tracker_prices = _PRICE_HISTORIES.setdefault(
+        _get_tracker(prices_filename), {})
+    for line in prices_content.splitlines():
+      line = line.strip()
+      if not line or line == _PRICE_HISTORY_FILE_HEADER:
+        continue
+      price_date, price = line.split(',')
+      tracker_prices[datetime.date.fromisoformat(price_date)] = float(price)
+
+    _clear_cache()
+
+
+def set_prices(prices: Mapping[Text, float],
+               date: Optional[datetime.date] = None):
+  """Sets and stores the prices of many trackers on a date.
+
+  Only trackers whose price changed are stored again.
+
+  Args:
+    prices: Map of trackers and their prices.
+    date: Date of the prices. Defaults to today.
+
+  Raises:
+    ValueError: a price is not positive.
+  """
+  for tracker, price in prices.items():
+    if not price > 0:
+      raise ValueError(f'Price of {tracker} must be positive, got {price}.')
+
+  if isinstance(date, datetime.datetime):
+    date = date.date()
+  date = date or datetime.date.today()
+
+  price_histories = get_price_histories()
+  with _PRICES_LOCK:
+    changed_trackers = []
+    for tracker, price in prices.items():
+      tracker_prices = price_histories.setdefault(tracker.upper(), {})
+      if tracker_prices.get(date) != price:
+        tracker_prices[date] = price
+        changed_trackers.append(tracker.upper())
+
+    if not changed_trackers:
+      return
+    _clear_cache()
+    for tracker in changed_trackers:
+      _store_price_history(tracker)
+
+
+def _store_price_history(tracker: Text):
+  """Stores the prices of a tracker.
+
+  Args:
+    tracker: Tracker whose prices to store.
+  """
+  price_lines = [_PRICE_HISTORY_FILE_HEADER] + [
+      f'{price_date.isoformat()},{price}'
+      for price_date, price in sorted(_PRICE_HISTORIES[tracker].items())
+  ]
+
+  prices_filename = f'{_PRICE_HISTORY_STORAGE_PATH}/{tracker}.csv'
+  file_manager.create_file(prices_filename, contents='\n'.join(price_lines))
+  _FILE_SIGNATURES[prices_filename] = (
+      file_manager.get_file_signature(prices_filename))
+
+
+def _load_changed_price_histories():
+  """Loads price histories which are new or changed, and drops deleted ones.
+
+  Must be called holding the prices lock.
+  """
+  stored_files = {}
+  for prices_filename in glob.glob(f'{_PRICE_HISTORY_STORAGE_PATH}/*.csv'):
+    # Signature is taken before reading, so a file replaced in between is
+    # loaded again next time.
+    file_signature = file_manager.get_file_signature(prices_filename)
+    if file_signature:
+      stored_files[prices_filename] = file_signature
+
+  for prices_filename in set(_FILE_SIGNATURES) - set(stored_files):
+    del _FILE_SIGNATURES[prices_filename]
+    _PRICE_HISTORIES.pop(_get_tracker(prices_filename), None)
+    _clear_cache()
+
+  for prices_filename, file_signature in stored_files.items():
+    if _FILE_SIGNATURES.get(prices_filename) == file_signature:
+      continue
+    # Prices of a changed file replace those loaded before.
+    _PRICE_HISTORIES.pop(_get_tracker(prices_filename), None)
+    try:
+      load_price_history(prices_filename)
+    except FileNotFoundError:
+      _clear_cache()
+      continue
+    _FILE_SIGNATURES[prices_filename] = file_signature
+
+
+def _get_tracker(prices_filename: Text) -> Text:
+  """Gets the tracker whose prices are stored in a file."""
+  tracker, _ = os.path.splitext(os.path.basename(prices_filename))
+  return tracker.upper()
+
+
+def _is_recently_modified(file_signature: file_manager.FileSignature
+                          ) -> bool:
+  """Returns whether a file was modified too recently to trust its signature.
+
+  Args:
+    file_signature: Signature of the file.
+  """
+  if not file_signature:
+    return False
+  _, _, modified_time_ns = file_signature
+  return time.time() - modified_time_ns / 1e9 < _MODIFIED_TIME_RESOLUTION
+
+
+def _clear_cache():
+  """Marks values derived from prices as outdated after prices change."""
+  global _PRICES_VERSION
+  _PRICES_VERSION += 1
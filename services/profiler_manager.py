@@ -0,0 +1,213 @@
+"""Profiles the running process to find where time goes."""
+
+import collections
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterable, Mapping, Optional, Text, Tuple
+
+# Profiling is only allowed when this variable is set to a true value.
+_PROFILER_ENVIRONMENT_VARIABLE = 'FINANCE_TRACKER_PROFILER'
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+_DEFAULT_SAMPLING_INTERVAL = 0.005
+_MAX_SAMPLING_SECONDS = 60.0
+_MIN_SAMPLING_INTERVAL = 0.001
+_PROFILE_STATS_LIMIT = 60
+
+# Number of times each collapsed stack was sampled.
+StackCounts = Mapping[Text, int]
+
+
+def is_enabled() -> bool:
+  """Returns whether profiling is allowed."""
+  return (
+      os.environ.get(_PROFILER_ENVIRONMENT_VARIABLE, '').lower()
+      in _TRUE_VALUES)
+
+
+def sample_process(seconds: float,
+                   interval: float = _DEFAULT_SAMPLING_INTERVAL
+                   ) -> StackCounts:
+  """Samples the stacks of all threads of the process for a while.
+
+  Args:
+    seconds: How long to sample for. At most one minute.
+    interval: Seconds between samples.
+
+  Raises:
+    ValueError: seconds or interval are out of range.
+
+  Returns:
+    Number of times each collapsed stack was sampled.
+  """
+  seconds, interval = _get_sampling_range(seconds, interval)
+  deadline = time.perf_counter() + seconds
+  return _sample_stacks(lambda: time.perf_counter() < deadline, interval)
+
+
+def sample_function(function: Callable[[], Any],
+                    interval: float = _DEFAULT_SAMPLING_INTERVAL
+                    ) -> Tuple[Any, StackCounts]:
+  """Runs a function in a new thread, sampling only that thread's stacks.
+
+  Args:
+    function: Function to profile.
+    interval: Seconds between samples.
+
+  Raises:
+    ValueError: interval is out of range.
+
+  Returns:
+    Result of the function, and number of times each collapsed stack was
+    sampled.
+  """
+  _, interval = _get_sampling_range(0, interval)
+
+  function_result = {}
+
+  def run_function():
+    try:
+      function_result['result'] = function()
+    except Exception as error:
+      function_result['error'] = error
+
+  function_thread = threading.Thread(
+      target=run_function, name='finance-tracker-profiled', daemon=True)
+  function_thread.start()
+  stack_counts = _sample_stacks(
+      function_thread.is_alive, interval, [function_thread.ident])
+  function_thread.join()
+
+  if 'error' in function_result:
+    raise function_result['error']
+  return function_result['result'], stack_counts
+
+
+def profile_function(function: Callable[[], Any],
+                     sort_key: Text = 'cumulative') -> Tuple[Any, Text]:
+  """Runs a function under cProfile.
+
+  Args:
+    function: Function to profile.
+    sort_key: Statistic by which to sort functions (e.g. cumulative, tottime).
+
+  Raises:
+    ValueError: sort_key is not a statistic of cProfile.
+
+  Returns:
+    Result of the function, and its profile statistics as text.
+  """
+  if sort_key not in pstats.Stats.sort_arg_dict_default:
+    raise ValueError(
+        f'Unknown sort key {sort_key}, use one of '
+        f'{", ".join(sorted(pstats.Stats.sort_arg_dict_default))}.')
+
+  profiler = cProfile.Profile()
+  function_result = profiler.runcall(function)
+
+  stats_stream = io.StringIO()
+  profile_stats = pstats.Stats(profiler, stream=stats_stream)
+  profile_stats.sort_stats(sort_key).print_stats(_PROFILE_STATS_LIMIT)
+  return function_result, stats_stream.getvalue()
+
+
+def format_collapsed_stacks(stack_counts: StackCounts) -> Text:
+  """Formats stacks one per line with their count, as used by flame graphs.
+
+  Args:
+    stack_counts: Number of times each collapsed stack was sampled.
+
+  Returns:
+    Lines of `frame;frame;frame count`, most sampled stacks first.
+  """
+  stack_lines = [
+      f'{collapsed_stack} {stack_count}'
+      for collapsed_stack, stack_count in sorted(
+          stack_counts.items(), key=lambda stack: (-stack[1], stack[0]))
+  ]
+  return '\n'.join(stack_lines) + '\n'
+
+
+def _sample_stacks(should_continue: Callable[[], bool],
+                   interval: float,
+                   thread_ids: Optional[Iterable[int]] = None
+                   ) -> StackCounts:
+  """Samples the stacks of threads while a condition holds.
+
+  Args:
+    should_continue: Returns whether to keep sampling.
+    interval: Seconds between samples.
+    thread_ids: Threads to sample. Defaults to all but the sampling thread.
+
+  Returns:
+    Number of times each collapsed stack was sampled.
+  """
+  sampling_thread_id = threading.get_ident()
+  thread_ids = set(thread_ids) if thread_ids is not None else None
+
+  stack_counts = collections.Counter()
+  while should_continue():
+    thread_names = {
+        running_thread.ident: running_thread.name
+        for running_thread in threading.enumerate()
+    }
+    for thread_id, frame in sys._current_frames().items():
+      if thread_id == sampling_thread_id:
+        continue
+      if thread_ids is not None and thread_id not in thread_ids:
+        continue
+      stack_counts[_get_collapsed_stack(
+          frame, thread_names.get(thread_id, str(thread_id)))] += 1
+    time.sleep(interval)
+
+  return stack_counts
+
+
+def _get_collapsed_stack(frame, thread_name: Text) -> Text:
+  """Collapses a stack into a single line, outermost frame first.
+
+  Args:
+    frame: Innermost frame of the stack.
+    thread_name: Name of the thread running the stack.
+
+  Returns:
+    Thread name and frames as `module:function`, separated by semicolons.
+  """
+  frame_names = []
+  while frame is not None:
+    code = frame.f_code
+    module_name = os.path.splitext(os.path.basename(code.co_filename))[0]
+    frame_names.append(f'{module_name}:{code.co_name}')
+    frame = frame.f_back
+
+  frame_names.append(thread_name)
+  return ';'.join(reversed(frame_names))
+
+
+def _get_sampling_range(seconds: float, interval: float
+                        ) -> Tuple[float, float]:
+  """Validates how long and how often to sample.
+
+  Args:
+    seconds: How long to sample for.
+    interval: Seconds between samples.
+
+  Raises:
+    ValueError: seconds or interval are out of range.
+
+  Returns:
+    Seconds and interval.
+  """
+  if not 0 <= seconds <= _MAX_SAMPLING_SECONDS:
+    raise ValueError(
+        f'Sampling must last between 0 and {_MAX_SAMPLING_SECONDS} seconds.')
+  if not _MIN_SAMPLING_INTERVAL <= interval <= _MAX_SAMPLING_SECONDS:
+    raise ValueError(
+        f'Sampling interval must be between {_MIN_SAMPLING_INTERVAL} and '
+        f'{_MAX_SAMPLING_SECONDS} seconds.')
+  return seconds, interval
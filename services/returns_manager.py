@@ -0,0 +1,475 @@
+"""Calculates time-weighted and money-weighted returns of given assets."""
+
+import datetime
+import numpy as np
+
+from models import asset
+from models import operation
+from models import portfolio
+from models import returns
+from services import asset_manager
+from services import currency_manager
+from typing import Callable, Mapping, Optional, Sequence, Text, Tuple
+
+OperationType = operation.OperationType  # Shorthand as it's used a lot.
+
+_SECONDS_PER_YEAR = 365.25 * 24 * 60 * 60
+_VALUE_TOLERANCE = 1e-9
+
+_IRR_INITIAL_GUESS = 0.1
+_IRR_TOLERANCE = 1e-10
+_NEWTON_MAX_ITERATIONS = 50
+_BRENT_MAX_ITERATIONS = 200
+# Rates at which NPV is evaluated to bracket a root when Newton diverges.
+_IRR_BRACKET_RATES = np.array([
+    -0.9999, -0.99, -0.9, -0.75, -0.5, -0.25, -0.1, 0.0, 0.1, 0.25, 0.5,
+    1.0, 2.0, 5.0, 10.0, 100.0, 1000.0,
+])
+
+
+class CashFlows(object):
+  """Vectorized cash flows and valuation marks of an asset's operations."""
+
+  def __init__(self, managed_asset: asset.Asset,
+               valuation_date: datetime.datetime,
+               currency: Optional[Text] = None):
+    """Builds the cash flow arrays of an asset.
+
+    Operations after valuation date are ignored. All arrays are sorted by
+    timestamp and have one element per operation. Quantities and prices are
+    adjusted for later corporate actions, e.g. splits, so holdings and marks
+    do not jump when they happen.
+
+    Args:
+      managed_asset: Asset for which to build cash flows.
+      valuation_date: Date at which the asset is valued.
+      currency: Currency of the cash flows. Defaults to asset currency.
+    """
+    currency = currency or managed_asset.currency
+    asset_operations = [
+        op for op in asset_manager.get_operations(managed_asset).values()
+        if op.timestamp <= valuation_date
+    ]
+    asset_operations.sort(key=lambda op: op.timestamp)
+    count = len(asset_operations)
+
+    timestamps = np.fromiter(
+        (op.timestamp.timestamp() for op in asset_operations),
+        dtype=float, count=count)
+    types = np.fromiter(
+        (op.operation_type.value for op in asset_operations),
+        dtype=int, count=count)
+    quantities = np.fromiter(
+        (op.quantity for op in asset_operations), dtype=float, count=count)
+    prices = currency_manager.convert_values(
+        np.fromiter(
+            (op.price_per_unit for op in asset_operations),
+            dtype=float, count=count),
+        [op.operation_currency for op in asset_operations],
+        currency, timestamps)
+    if asset_manager.get_adjustment_index(managed_asset):
+      adjustments = np.array(
+          [asset_manager.get_adjustment_factors(op)
+           for op in asset_operations], dtype=float).reshape(count, 2)
+      quantities = quantities * adjustments[:, 0]
+      prices = prices * adjustments[:, 1]
+
+    is_buy = types == OperationType.BUY.value
+    is_sell = types == OperationType.SELL.value
+    is_dividend = types == OperationType.DIVIDEND.value
+    operation_values = quantities * prices
+
+    quantity_deltas = np.where(is_buy, quantities, 0.0)
+    quantity_deltas -= np.where(is_sell, quantities, 0.0)
+    holdings_after = np.cumsum(quantity_deltas)
+    holdings_before = holdings_after - quantity_deltas
+
+    # Dividends do not carry a market price, so the last known trade price is
+    # carried forward as the mark of the asset.
+    price_marks = np.where(is_buy | is_sell, prices, np.nan)
+    mark_indexes = np.where(~np.isnan(price_marks), np.arange(count), 0)
+    price_marks = np.nan_to_num(
+        price_marks[np.maximum.accumulate(mark_indexes)] if count else
+        price_marks)
+    previous_marks = np.concatenate([price_marks[:1], price_marks[:-1]])
+
+    self.asset = managed_asset
+    self.currency = currency
+    self.valuation_date = valuation_date
+    self.timestamps = timestamps
+    # Investor perspective: money put in is negative, money taken out positive.
+    self.cash_flows = np.where(is_buy, -operation_values, 0.0)
+    self.cash_flows += np.where(is_sell | is_dividend, operation_values, 0.0)
+    self.dividends = np.where(is_dividend, operation_values, 0.0)
+    # Value moved into (or out of) the position by each operation.
+    self.value_flows = quantity_deltas * price_marks
+    # Change in value of the position held before each operation.
+    self.value_gains = holdings_before * (price_marks - previous_marks)
+    self.final_value = (
+        holdings_after[-1] * currency_manager.convert_value(
+            managed_asset.current_price, managed_asset.currency, currency,
+            valuation_date)
+        if count else 0.0)
+
+  def is_empty(self) -> bool:
+    """Returns whether there are no operations to evaluate."""
+    return not self.timestamps.size
+
+
+def get_asset_returns(
+        managed_asset: asset.Asset,
+        valuation_date: Optional[datetime.datetime] = None
+) -> returns.Returns:
+  """Gets time-weighted and money-weighted returns of an asset.
+
+  Args:
+    managed_asset: Asset for which to calculate returns.
+    valuation_date: Date at which asset is valued. Defaults to now.
+
+  Returns:
+    Returns of the asset.
+  """
+  valuation_date = valuation_date or datetime.datetime.now()
+  asset_cash_flows = CashFlows(managed_asset, valuation_date)
+  (irr,) = _get_internal_rates_of_return([asset_cash_flows])
+  return _get_returns([asset_cash_flows], irr)
+
+
+def get_assets_returns(
+        managed_portfolio: portfolio.Portfolio,
+        valuation_date: Optional[datetime.datetime] = None
+) -> Mapping[asset.Asset, returns.Returns]:
+  """Gets the returns of every asset in the portfolio.
+
+  Internal rates of return of all assets are solved together, so this is much
+  faster than calling get_asset_returns for each asset.
+
+  Args:
+    managed_portfolio: Portfolio from which to obtain returns.
+    valuation_date: Date at which assets are valued. Defaults to now.
+
+  Returns:
+    Map of assets and their returns.
+  """
+  valuation_date = valuation_date or datetime.datetime.now()
+  portfolio_cash_flows = _get_portfolio_cash_flows(
+      managed_portfolio, valuation_date)
+  irr_values = _get_internal_rates_of_return(portfolio_cash_flows)
+
+  return {
+      asset_cash_flows.asset: _get_returns([asset_cash_flows], irr)
+      for asset_cash_flows, irr in zip(portfolio_cash_flows, irr_values)
+  }
+
+
+def get_portfolio_returns(
+        managed_portfolio: portfolio.Portfolio,
+        valuation_date: Optional[datetime.datetime] = None
+) -> returns.Returns:
+  """Gets time-weighted and money-weighted returns of the whole portfolio.
+
+  Args:
+    managed_portfolio: Portfolio for which to calculate returns.
+    valuation_date: Date at which portfolio is valued. Defaults to now.
+
+  Returns:
+    Returns of the portfolio.
+  """
+  valuation_date = valuation_date or datetime.datetime.now()
+  portfolio_cash_flows = _get_portfolio_cash_flows(
+      managed_portfolio, valuation_date, managed_portfolio.currency)
+  (irr,) = _get_internal_rates_of_return(
+      [portfolio_cash_flows], combine_cash_flows=True)
+  return _get_returns(portfolio_cash_flows, irr)
+
+
+def _get_portfolio_cash_flows(
+        managed_portfolio: portfolio.Portfolio,
+        valuation_date: datetime.datetime,
+        currency: Optional[Text] = None) -> Sequence[CashFlows]:
+  """Builds cash flows of every asset in the portfolio.
+
+  Args:
+    managed_portfolio: Portfolio from which to build cash flows.
+    valuation_date: Date at which assets are valued.
+    currency: Currency of the cash flows. Defaults to each asset currency.
+
+  Returns:
+    Cash flows of each asset of the portfolio.
+  """
+  portfolio_assets = asset_manager.get_assets(managed_portfolio)
+  return [
+      CashFlows(managed_asset, valuation_date, currency)
+      for managed_asset in portfolio_assets.values()
+  ]
+
+
+def _get_returns(cash_flows_list: Sequence[CashFlows],
+                 irr: Optional[float]) -> returns.Returns:
+  """Builds the returns of a group of cash flows valued together.
+
+  Args:
+    cash_flows_list: Cash flows to evaluate as a single investment.
+    irr: Internal rate of return already solved for these cash flows.
+
+  Returns:
+    Returns of the cash flows.
+  """
+  non_empty_cash_flows = [
+      cash_flows for cash_flows in cash_flows_list if not cash_flows.is_empty()
+  ]
+  if not non_empty_cash_flows:
+    return returns.Returns(None, None, None, None, None)
+
+  valuation_date = non_empty_cash_flows[0].valuation_date
+  start_timestamp = min(
+      cash_flows.timestamps[0] for cash_flows in non_empty_cash_flows)
+  start_date = datetime.datetime.fromtimestamp(start_timestamp)
+
+  twr = _get_time_weighted_return(non_empty_cash_flows)
+  years = (valuation_date.timestamp() - start_timestamp) / _SECONDS_PER_YEAR
+  # Periods shorter than a year are not annualized to avoid inflating returns.
+  annualized_twr = (
+      float((1 + twr) ** (1 / years) - 1)
+      if twr is not None and twr > -1 and years >= 1 else None)
+
+  return returns.Returns(twr, annualized_twr, irr, start_date, valuation_date)
+
+
+def _get_time_weighted_return(
+        cash_flows_list: Sequence[CashFlows]) -> Optional[float]:
+  """Calculates the time-weighted return of a group of cash flows.
+
+  Every operation starts a new sub-period. The growth of each sub-period is
+  the value of the holdings right before the operation (plus dividends paid)
+  over the value right after the previous operation.
+
+  Args:
+    cash_flows_list: Cash flows to evaluate as a single investment.
+
+  Returns:
+    Cumulative time-weighted return. None if nothing was ever held.
+  """
+  timestamps = np.concatenate([cf.timestamps for cf in cash_flows_list])
+  order = np.argsort(timestamps, kind='stable')
+  value_flows = np.concatenate(
+      [cf.value_flows for cf in cash_flows_list])[order]
+  value_gains = np.concatenate(
+      [cf.value_gains for cf in cash_flows_list])[order]
+  dividends = np.concatenate([cf.dividends for cf in cash_flows_list])[order]
+
+  values_after = np.cumsum(value_gains + value_flows)
+  values_before = values_after - value_flows
+  final_value = sum(cf.final_value for cf in cash_flows_list)
+
+  start_values = values_after
+  end_values = np.append(values_before[1:] + dividends[1:], final_value)
+  is_held = start_values > _VALUE_TOLERANCE
+  if not is_held.any():
+    return None
+
+  growths = end_values[is_held] / start_values[is_held]
+  return float(np.prod(growths)) - 1
+
+
+def _get_internal_rates_of_return(
+        cash_flows_groups: Sequence,
+        combine_cash_flows: bool = False) -> Sequence[Optional[float]]:
+  """Calculates the internal rate of return (XIRR) of each cash flow group.
+
+  Args:
+    cash_flows_groups: Cash flows to solve. Each element is either one
+        CashFlows or, if combine_cash_flows is set, a list of them.
+    combine_cash_flows: Whether each group is a list of cash flows to value
+        together.
+
+  Returns:
+    Yearly internal rate of return of each group, None if it has no solution.
+  """
+  times_list = []
+  amounts_list = []
+  for cash_flows_group in cash_flows_groups:
+    group = cash_flows_group if combine_cash_flows else [cash_flows_group]
+    group = [cash_flows for cash_flows in group if not cash_flows.is_empty()]
+    if not group:
+      times_list.append(np.zeros(0))
+      amounts_list.append(np.zeros(0))
+      continue
+
+    valuation_timestamp = group[0].valuation_date.timestamp()
+    final_value = sum(cash_flows.final_value for cash_flows in group)
+    timestamps = np.concatenate(
+        [cash_flows.timestamps for cash_flows in group] +
+        [[valuation_timestamp]])
+    amounts = np.concatenate(
+        [cash_flows.cash_flows for cash_flows in group] + [[final_value]])
+    times_list.append((timestamps - timestamps.min()) / _SECONDS_PER_YEAR)
+    amounts_list.append(amounts)
+
+  times, amounts = _pad_arrays(times_list), _pad_arrays(amounts_list)
+  rates = _solve_rates_of_return(times, amounts)
+
+  return [None if np.isnan(rate) else float(rate) for rate in rates]
+
+
+def _pad_arrays(arrays: Sequence[np.ndarray]) -> np.ndarray:
+  """Stacks arrays of different length into a zero-padded matrix.
+
+  Args:
+    arrays: Arrays to stack.
+
+  Returns:
+    Matrix with one row per array.
+  """
+  width = max([array.size for array in arrays] + [1])
+  padded = np.zeros((len(arrays), width))
+  for row, array in enumerate(arrays):
+    padded[row, :array.size] = array
+  return padded
+
+
+def _get_npv_and_derivative(
+        rates: np.ndarray, times: np.ndarray,
+        amounts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+  """Calculates the net present value and its derivative for each row.
+
+  Args:
+    rates: Rate of each row.
+    times: Time in years of each cash flow, one row per rate.
+    amounts: Amount of each cash flow, one row per rate.
+
+  Returns:
+    Net present value and its derivative with respect to the rate.
+  """
+  bases = 1 + rates[:, np.newaxis]
+  discounted_amounts = amounts * bases ** -times
+  npv = discounted_amounts.sum(axis=1)
+  derivative = (-times * discounted_amounts / bases).sum(axis=1)
+  return (npv, derivative)
+
+
+def _solve_rates_of_return(
+        times: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+  """Solves the rate which makes the net present value zero for each row.
+
+  All rows are solved together with Newton's method. Rows which do not
+  converge fall back to Brent's method on a bracketed root.
+
+  Args:
+    times: Time in years of each cash flow, one row per investment.
+    amounts: Amount of each cash flow, one row per investment.
+
+  Returns:
+    Rate of each row, NaN when there is no solution.
+  """
+  rates = np.full(times.shape[0], _IRR_INITIAL_GUESS)
+  is_solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+  is_converged = ~is_solvable
+  rates[~is_solvable] = np.nan
+
+  with np.errstate(all='ignore'):
+    for _ in range(_NEWTON_MAX_ITERATIONS):
+      pending = ~is_converged & ~np.isnan(rates)
+      if not pending.any():
+        break
+      npv, derivative = _get_npv_and_derivative(
+          rates[pending], times[pending], amounts[pending])
+      steps = npv / derivative
+      new_rates = rates[pending] - steps
+      new_rates[~(new_rates > -1) | ~np.isfinite(new_rates)] = np.nan
+      rates[pending] = new_rates
+      is_converged[pending] = np.abs(steps) < _IRR_TOLERANCE
+
+    is_solved = is_converged & ~np.isnan(rates)
+    for row in np.flatnonzero(is_solvable & ~is_solved):
+      rates[row] = _solve_rate_of_return_by_brent(times[row], amounts[row])
+
+  return rates
+
+
+def _solve_rate_of_return_by_brent(
+        times: np.ndarray, amounts: np.ndarray) -> float:
+  """Solves the rate which makes the net present value zero by bracketing.
+
+  Args:
+    times: Time in years of each cash flow.
+    amounts: Amount of each cash flow.
+
+  Returns:
+    Rate of return, NaN when no root could be bracketed.
+  """
+  bracket_npv, _ = _get_npv_and_derivative(
+      _IRR_BRACKET_RATES,
+      np.broadcast_to(times, (_IRR_BRACKET_RATES.size, times.size)),
+      np.broadcast_to(amounts, (_IRR_BRACKET_RATES.size, amounts.size)))
+  sign_changes = np.flatnonzero(
+      np.sign(bracket_npv[:-1]) * np.sign(bracket_npv[1:]) <= 0)
+  if not sign_changes.size:
+    return np.nan
+
+  lower = sign_changes[0]
+
+  def get_npv(rate):
+    return float(np.dot(amounts, (1 + rate) ** -times))
+
+  return _find_root_by_brent(
+      get_npv, _IRR_BRACKET_RATES[lower], _IRR_BRACKET_RATES[lower + 1])
+
+
+def _find_root_by_brent(function: Callable[[float], float],
+                        lower: float, upper: float) -> float:
+  """Finds a root of a function within a bracket using Brent's method.
+
+  Args:
+    function: Function for which to find the root.
+    lower: Lower end of the bracket.
+    upper: Upper end of the bracket. Function must change sign in bracket.
+
+  Returns:
+    Root of the function, NaN if the function does not change sign.
+  """
+  a, b, c = lower, upper, upper
+  fa, fb = function(a), function(b)
+  if fa * fb > 0:
+    return np.nan
+
+  fc = fb
+  d = e = b - a
+  for _ in range(_BRENT_MAX_ITERATIONS):
+    # Keep the root bracketed between b (best estimate) and c.
+    if fb * fc > 0:
+      c, fc = a, fa
+      d = e = b - a
+    if abs(fc) < abs(fb):
+      a, b, c = b, c, b
+      fa, fb, fc = fb, fc, fb
+
+    tolerance = 2 * np.finfo(float).eps * abs(b) + _IRR_TOLERANCE / 2
+    midpoint = (c - b) / 2
+    if abs(midpoint) <= tolerance or fb == 0:
+      return b
+
+    if abs(e) >= tolerance and abs(fa) > abs(fb):
+      # Inverse quadratic interpolation (secant when only two points).
+      s = fb / fa
+      if a == c:
+        p, q = 2 * midpoint * s, 1 - s
+      else:
+        q, r = fa / fc, fb / fc
+        p = s * (2 * midpoint * q * (q - r) - (b - a) * (r - 1))
+        q = (q - 1) * (r - 1) * (s - 1)
+      if p > 0:
+        q = -q
+      p = abs(p)
+      if 2 * p < min(3 * midpoint * q - abs(tolerance * q), abs(e * q)):
+        e, d = d, p / q
+      else:  # Interpolation failed, use bisection.
+        d = e = midpoint
+    else:  # Bounds decreasing too slowly, use bisection.
+      d = e = midpoint
+
+    a, fa = b, fb
+    b += d if abs(d) > tolerance else np.copysign(tolerance, midpoint)
+    fb = function(b)
+
+  return b
@@ -0,0 +1,264 @@
+"""Estimates potential losses of portfolios by simulating price scenarios."""
+
+import math
+import threading
+import numpy as np
+
+from models import portfolio
+from models import risk
+from services import asset_manager
+from services import currency_manager
+from services import metrics_manager
+from services import position_manager
+from services import price_history_manager
+from typing import Mapping, Text, Tuple
+
+_DEFAULT_CONFIDENCE = 0.95
+_DEFAULT_HORIZON_DAYS = 1
+_DEFAULT_SCENARIOS = 100000
+# Latest daily returns from which scenarios are drawn, about two years.
+_DEFAULT_LOOKBACK_DAYS = 500
+# Fewest daily returns of a tracker to model it, about three months, so a
+# tracker with little history does not shorten the returns of all others.
+_MIN_LOOKBACK_DAYS = 60
+# Bounds the memory used by a single estimate.
+_MAX_SCENARIOS = 1000000
+# Seed of the scenarios, so the same portfolio always gets the same estimate.
+_SCENARIOS_SEED = 0
+
+# Risk of each portfolio and parameters, together with the portfolio, rates
+# and prices version it was estimated at.
+_PORTFOLIO_RISKS = {}
+_PORTFOLIO_RISKS_LOCK = threading.Lock()
+
+
+@metrics_manager.timed('get_portfolio_risk')
+def get_portfolio_risk(
+    managed_portfolio: portfolio.Portfolio,
+    confidence: float = _DEFAULT_CONFIDENCE,
+    horizon_days: int = _DEFAULT_HORIZON_DAYS,
+    scenarios: int = _DEFAULT_SCENARIOS,
+    lookback_days: int = _DEFAULT_LOOKBACK_DAYS
+) -> risk.Risk:
+  """Gets the value at risk and expected shortfall of a portfolio.
+
+  Current positions are revalued under scenarios of daily returns of their
+  trackers over the horizon. Historical scenarios draw whole days of past
+  returns, keeping how trackers moved together. Parametric scenarios draw
+  from a normal distribution with the mean and covariance of past returns.
+  Trackers with fewer daily returns than the lookback, or than about three
+  months if shorter, are not modeled. Prices are adjusted for corporate
+  actions. Estimates are cached until the portfolio, exchange rates or
+  prices change.
+
+  Args:
+    managed_portfolio: Portfolio for which to estimate risk.
+    confidence: Probability of losses not exceeding the value at risk.
+    horizon_days: Number of days over which losses are estimated.
+    scenarios: Number of scenarios to simulate by each method.
+    lookback_days: Number of latest daily returns from which to estimate.
+
+  Raises:
+    ValueError: parameters are not valid.
+
+  Returns:
+    Risk of the portfolio, in the portfolio currency.
+  """
+  if not 0 < confidence < 1:
+    raise ValueError(f'Confidence must be between 0 and 1, got {confidence}.')
+  if horizon_days < 1:
+    raise ValueError(f'Horizon must be at least 1 day, got {horizon_days}.')
+  if not 1 <= scenarios <= _MAX_SCENARIOS:
+    raise ValueError(
+        f'Scenarios must be between 1 and {_MAX_SCENARIOS}, got {scenarios}.')
+  if lookback_days < 2:
+    raise ValueError(
+        f'Lookback must be at least 2 days, got {lookback_days}.')
+
+  cache_key = (
+      managed_portfolio.get_id(), confidence, horizon_days, scenarios,
+      lookback_days)
+  version = (
+      managed_portfolio.get_version(), currency_manager.get_rates_version(),
+      price_history_manager.get_prices_version())
+  with _PORTFOLIO_RISKS_LOCK:
+    cached_version, portfolio_risk = (
+        _PORTFOLIO_RISKS.get(cache_key, (None, None)))
+  if cached_version == version:
+    return portfolio_risk
+
+  tracker_values = _get_tracker_values(managed_portfolio)
+  price_histories = price_history_manager.get_price_histories()
+  min_prices = min(lookback_days, _MIN_LOOKBACK_DAYS) + 1
+  modeled_trackers = [
+      tracker for tracker in tracker_values
+      if len(price_histories.get(tracker.upper(), {})) >= min_prices
+  ]
+  unmodeled_trackers = [
+      tracker for tracker in tracker_values
+      if tracker not in modeled_trackers
+  ]
+
+  dates, prices = price_history_manager.get_price_matrix(
+      modeled_trackers, lookback_days + 1)
+  tracker_assets = {}
+  for managed_asset in asset_manager.get_assets(managed_portfolio).values():
+    tracker_assets.setdefault(managed_asset.get_tracker(), managed_asset)
+  for column, tracker in enumerate(modeled_trackers):
+    prices[:, column] = price_history_manager.get_adjusted_prices(
+        dates, prices[:, column],
+        asset_manager.get_adjustment_index(tracker_assets[tracker]))
+
+  market_values = np.array(
+      [tracker_values[tracker] for tracker in modeled_trackers])
+  historical_var, historical_es = (0.0, 0.0)
+  parametric_var, parametric_es = (0.0, 0.0)
+  if modeled_trackers:
+    daily_returns = np.diff(np.log(prices), axis=0)
+    random_generator = np.random.default_rng(_SCENARIOS_SEED)
+    historical_var, historical_es = _get_value_at_risk(
+        _get_historical_losses(
+            market_values, daily_returns, horizon_days, scenarios,
+            random_generator),
+        confidence)
+    parametric_var, parametric_es = _get_value_at_risk(
+        _get_parametric_losses(
+            market_values, daily_returns, horizon_days, scenarios,
+            random_generator),
+        confidence)
+
+  portfolio_risk = risk.Risk(
+      managed_portfolio.currency,
+      float(market_values.sum()),
+      confidence,
+      horizon_days,
+      scenarios,
+      historical_var,
+      historical_es,
+      parametric_var,
+      parametric_es,
+      dates[0].item() if len(dates) else None,
+      dates[-1].item() if len(dates) else None,
+      unmodeled_trackers)
+
+  with _PORTFOLIO_RISKS_LOCK:
+    _PORTFOLIO_RISKS[cache_key] = (version, portfolio_risk)
+  return portfolio_risk
+
+
+def _get_tracker_values(
+        managed_portfolio: portfolio.Portfolio) -> Mapping[Text, float]:
+  """Gets the market value held of each tracker in the portfolio currency.
+
+  Args:
+    managed_portfolio: Portfolio from which to obtain positions.
+
+  Raises:
+    ValueError: positions can not be converted to portfolio currency.
+
+  Returns:
+    Map of trackers and the market value of their positions.
+  """
+  portfolio_positions = [
+      asset_position
+      for asset_position in position_manager.get_positions(
+          managed_portfolio).values()
+      if asset_position.market_value
+  ]
+  market_values = currency_manager.convert_values(
+      [asset_position.market_value for asset_position in portfolio_positions],
+      [
+          asset_position.asset.currency
+          for asset_position in portfolio_positions
+      ],
+      managed_portfolio.currency)
+
+  tracker_values = {}
+  for asset_position, market_value in zip(portfolio_positions, market_values):
+    tracker = asset_position.asset.get_tracker()
+    tracker_values[tracker] = tracker_values.get(tracker, 0) + market_value
+  return tracker_values
+
+
+def _get_historical_losses(
+    market_values: np.ndarray,
+    daily_returns: np.ndarray,
+    horizon_days: int,
+    scenarios: int,
+    random_generator: np.random.Generator
+) -> np.ndarray:
+  """Simulates losses drawing days of past returns.
+
+  Args:
+    market_values: Market value held of each tracker.
+    daily_returns: Daily log returns (rows) of each tracker (columns).
+    horizon_days: Number of days drawn for each scenario.
+    scenarios: Number of scenarios to simulate.
+    random_generator: Generator of random numbers.
+
+  Returns:
+    Loss of each scenario.
+  """
+  if horizon_days == 1:
+    # Each scenario is a past day, so days are revalued once and drawn.
+    daily_losses = -(np.expm1(daily_returns) @ market_values)
+    return daily_losses[
+        random_generator.integers(len(daily_returns), size=scenarios)]
+
+  scenario_returns = np.zeros((scenarios, len(market_values)))
+  for _ in range(horizon_days):
+    scenario_returns += daily_returns[
+        random_generator.integers(len(daily_returns), size=scenarios)]
+  return -(np.expm1(scenario_returns) @ market_values)
+
+
+def _get_parametric_losses(
+    market_values: np.ndarray,
+    daily_returns: np.ndarray,
+    horizon_days: int,
+    scenarios: int,
+    random_generator: np.random.Generator
+) -> np.ndarray:
+  """Simulates losses drawing returns from a normal distribution.
+
+  Args:
+    market_values: Market value held of each tracker.
+    daily_returns: Daily log returns (rows) of each tracker (columns).
+    horizon_days: Number of days over which returns are drawn.
+    scenarios: Number of scenarios to simulate.
+    random_generator: Generator of random numbers.
+
+  Returns:
+    Loss of each scenario.
+  """
+  tracker_count = len(market_values)
+  mean_returns = daily_returns.mean(axis=0)
+  covariance = np.atleast_2d(np.cov(daily_returns, rowvar=False))
+
+  # Covariance of trackers moving together is not positive definite, so it
+  # is factored by its eigenvalues rather than by Cholesky.
+  eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+  return_factors = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+  scenario_returns = (
+      random_generator.standard_normal((scenarios, tracker_count)) @
+      return_factors.T * math.sqrt(horizon_days) +
+      mean_returns * horizon_days)
+  return -(np.expm1(scenario_returns) @ market_values)
+
+
+def _get_value_at_risk(losses: np.ndarray,
+                       confidence: float) -> Tuple[float, float]:
+  """Gets the value at risk and expected shortfall of simulated losses.
+
+  Args:
+    losses: Loss of each scenario.
+    confidence: Probability of losses not exceeding the value at risk.
+
+  Returns:
+    Lowest loss of the worst scenarios beyond the confidence, and their
+    average loss.
+  """
+  tail_count = max(1, int(round(len(losses) * (1 - confidence))))
+  tail_losses = np.partition(losses, len(losses) - tail_count)[-tail_count:]
+  return (float(tail_losses.min()), float(tail_losses.mean()))
@@ -0,0 +1,358 @@
+"""Runs background jobs and periodic price refreshes off the request path."""
+
+import asyncio
+import collections
+import datetime
+import inspect
+import os
+import pickle
+import queue
+import random
+import threading
+import uuid
+from models import asset
+from models import job
+from models import portfolio
+from services import file_manager
+from services import portfolio_manager
+from services import stats_manager
+from typing import Any, Callable, List, Optional, Text, Tuple
+
+# Seconds between price refreshes. Zero disables periodic refreshes.
+_REFRESH_INTERVAL_ENVIRONMENT_VARIABLE = 'FINANCE_TRACKER_REFRESH_INTERVAL'
+# Fraction of the interval by which each wait is randomly moved.
+_REFRESH_JITTER_ENVIRONMENT_VARIABLE = 'FINANCE_TRACKER_REFRESH_JITTER'
+# Longest wait, in seconds, after consecutive refreshes fail.
+_REFRESH_MAX_BACKOFF_ENVIRONMENT_VARIABLE = (
+    'FINANCE_TRACKER_REFRESH_MAX_BACKOFF')
+_DEFAULT_REFRESH_INTERVAL = 900
+_DEFAULT_REFRESH_JITTER = 0.1
+_DEFAULT_REFRESH_MAX_BACKOFF = 3600
+
+_ASSET_STATS_JOB_TYPE = 'asset_stats'
+_PORTFOLIO_STATS_JOB_TYPE = 'portfolio_stats'
+_PRICE_REFRESH_JOB_TYPE = 'price_refresh'
+# Number of jobs kept to report their status.
+_MAX_STORED_JOBS = 1000
+# Number of queued jobs run at the same time.
+_MAX_CONCURRENT_JOBS = 64
+# Jobs are also stored as files, so any server process can report them.
+_JOB_STORAGE_PATH = 'jobs'
+# Only the process holding this lock refreshes prices.
+_REFRESH_LOCK_FILENAME = f'{_JOB_STORAGE_PATH}/.refresh.lock'
+
+# Job, and function or coroutine function doing its work.
+QueuedJob = Tuple[job.Job, Callable[[], Any]]
+
+_JOBS = collections.OrderedDict()
+_JOB_QUEUE = queue.Queue()
+_JOBS_LOCK = threading.Lock()
+_WORKER = None
+_REFRESH_LOCK = None
+
+
+def start():
+  """Starts the background worker, if it is not running yet."""
+  global _WORKER
+
+  with _JOBS_LOCK:
+    if _WORKER and _WORKER.is_alive():
+      return
+    _WORKER = threading.Thread(
+        target=_run_worker, name='finance-tracker-scheduler', daemon=True)
+    _WORKER.start()
+
+
+def get_job(job_id: Text) -> job.Job:
+  """Gets a job by given id.
+
+  Args:
+    job_id: Job id to retrieve.
+
+  Raises:
+    KeyError: job does not exist or is not kept anymore.
+
+  Returns:
+    Job.
+  """
+  with _JOBS_LOCK:
+    if job_id in _JOBS:
+      return _JOBS[job_id]
+
+  try:
+    job_filename = f'{_JOB_STORAGE_PATH}/{uuid.UUID(job_id)}'
+    return pickle.loads(file_manager.get_file_binary_content(job_filename))
+  except (ValueError, FileNotFoundError):
+    raise KeyError(job_id)
+
+
+def submit_asset_stats_update(managed_portfolio: portfolio.Portfolio,
+                              managed_asset: asset.Asset) -> job.Job:
+  """Requests to update the stats of an asset in the background.
+
+  Args:
+    managed_portfolio: Portfolio to which asset belongs.
+    managed_asset: Asset for which to update stats.
+
+  Returns:
+    Pending job updating the stats.
+  """
+  async def update_asset_stats():
+    await stats_manager.update_asset_stats_async(
+        managed_portfolio, managed_asset)
+
+  return _submit_job(
+      job.Job(
+          _ASSET_STATS_JOB_TYPE, managed_portfolio.get_id(),
+          managed_asset.get_id()),
+      update_asset_stats)
+
+
+def submit_portfolio_stats_update(
+        managed_portfolio: portfolio.Portfolio) -> job.Job:
+  """Requests to update the stats of a portfolio in the background.
+
+  Args:
+    managed_portfolio: Portfolio for which to update stats.
+
+  Returns:
+    Pending job updating the stats.
+  """
+  async def update_portfolio_stats():
+    await stats_manager.update_portfolio_stats_async(managed_portfolio)
+
+  return _submit_job(
+      job.Job(_PORTFOLIO_STATS_JOB_TYPE, managed_portfolio.get_id()),
+      update_portfolio_stats)
+
+
+def refresh_prices() -> bool:
+  """Refreshes the prices of all portfolios.
+
+  Returns:
+    Whether any price was fetched, or there were no prices to fetch.
+  """
+  portfolios = list(portfolio_manager.get_portfolios().values())
+  has_trackers = any(
+      managed_portfolio.assets for managed_portfolio in portfolios)
+  fetched_prices = stats_manager.update_portfolios_prices(portfolios)
+  return fetched_prices > 0 or not has_trackers
+
+
+def _submit_job(new_job: job.Job, work: Callable[[], Any]) -> job.Job:
+  """Keeps a job to report its status and queues it to run.
+
+  Args:
+    new_job: Job to run.
+    work: Function or coroutine function doing the job work.
+
+  Returns:
+    Submitted job.
+  """
+  with _JOBS_LOCK:
+    _JOBS[new_job.get_id()] = new_job
+    _forget_finished_jobs()
+
+  _store_job(new_job)
+  _JOB_QUEUE.put((new_job, work))
+  start()
+  return new_job
+
+
+def _forget_finished_jobs():
+  """Drops the oldest finished jobs once too many are kept."""
+  excess_jobs = len(_JOBS) - _MAX_STORED_JOBS
+  if excess_jobs <= 0:
+    return
+
+  finished_job_ids = [
+      job_id for job_id, stored_job in _JOBS.items()
+      if stored_job.is_finished()
+  ]
+  for job_id in finished_job_ids[:excess_jobs]:
+    del _JOBS[job_id]
+    file_manager.delete_file(f'{_JOB_STORAGE_PATH}/{job_id}')
+
+
+def _store_job(stored_job: job.Job):
+  """Stores the status of a job.
+
+  Args:
+    stored_job: Job to store.
+  """
+  file_manager.create_file(
+      f'{_JOB_STORAGE_PATH}/{stored_job.get_id()}',
+      contents=pickle.dumps(stored_job))
+
+
+def _run_worker():
+  """Runs queued jobs and refreshes prices periodically, forever."""
+  refresh_interval = _get_environment_float(
+      _REFRESH_INTERVAL_ENVIRONMENT_VARIABLE, _DEFAULT_REFRESH_INTERVAL)
+  consecutive_failures = 0
+  next_refresh = _get_next_refresh(refresh_interval, consecutive_failures)
+
+  while True:
+    timeout = None
+    if next_refresh:
+      timeout = max(
+          0, (next_refresh - datetime.datetime.now()).total_seconds())
+
+    queued_jobs = _get_queued_jobs(timeout)
+    if queued_jobs:
+      asyncio.run(_run_queued_jobs(queued_jobs))
+      continue
+
+    if not _is_refreshing_process():
+      next_refresh = _get_next_refresh(refresh_interval, 0)
+      continue
+
+    refresh_job = job.Job(_PRICE_REFRESH_JOB_TYPE)
+    asyncio.run(_run_job(refresh_job, _refresh_prices_or_fail))
+    if refresh_job.status == job.JobStatus.SUCCEEDED:
+      consecutive_failures = 0
+    else:
+      consecutive_failures += 1
+    next_refresh = _get_next_refresh(refresh_interval, consecutive_failures)
+
+
+def _get_queued_jobs(timeout: Optional[float]) -> List[QueuedJob]:
+  """Waits for a queued job, and takes others queued meanwhile too.
+
+  Args:
+    timeout: Seconds to wait for a job. None to wait until there is one.
+
+  Returns:
+    Queued jobs, up to the number of jobs run at the same time. Empty if no
+    job was queued before timeout.
+  """
+  try:
+    queued_jobs = [_JOB_QUEUE.get(timeout=timeout)]
+  except queue.Empty:
+    return []
+
+  while len(queued_jobs) < _MAX_CONCURRENT_JOBS:
+    try:
+      queued_jobs.append(_JOB_QUEUE.get_nowait())
+    except queue.Empty:
+      break
+
+  return queued_jobs
+
+
+async def _run_queued_jobs(queued_jobs: List[QueuedJob]):
+  """Runs queued jobs at the same time, storing their status.
+
+  Jobs awaiting market data wait together, so slow fetches do not hold
+  other jobs back.
+
+  Args:
+    queued_jobs: Jobs to run.
+  """
+  await asyncio.gather(*[
+      _run_job(queued_job, work, is_stored=True)
+      for queued_job, work in queued_jobs
+  ])
+
+
+async def _run_job(running_job: job.Job, work: Callable[[], Any],
+                   is_stored: bool = False):
+  """Runs a job, recording its status.
+
+  Args:
+    running_job: Job to run.
+    work: Function doing the job work. Coroutine functions are awaited,
+        and other functions run in another thread not to block other jobs.
+    is_stored: If True, stores the job status whenever it changes.
+  """
+  running_job.status = job.JobStatus.RUNNING
+  running_job.started_at = datetime.datetime.now()
+  if is_stored:
+    _store_job(running_job)
+
+  try:
+    if inspect.iscoroutinefunction(work):
+      await work()
+    else:
+      await asyncio.to_thread(work)
+    running_job.status = job.JobStatus.SUCCEEDED
+  except Exception as error:
+    print(f'{running_job} failed: {error}')
+    running_job.error = str(error)
+    running_job.status = job.JobStatus.FAILED
+  running_job.finished_at = datetime.datetime.now()
+
+  if is_stored:
+    _store_job(running_job)
+
+
+def _is_refreshing_process() -> bool:
+  """Returns whether this process is the one refreshing prices.
+
+  When several server processes run, the first to take the refresh lock
+  keeps it until it ends; then another process takes it on its next refresh.
+  """
+  global _REFRESH_LOCK
+
+  if not _REFRESH_LOCK:
+    _REFRESH_LOCK = file_manager.acquire_lock(
+        _REFRESH_LOCK_FILENAME, blocking=False)
+  return bool(_REFRESH_LOCK)
+
+
+def _refresh_prices_or_fail():
+  """Refreshes the prices of all portfolios.
+
+  Raises:
+    ValueError: no price could be fetched.
+  """
+  if not refresh_prices():
+    raise ValueError('No price could be fetched.')
+
+
+def _get_next_refresh(refresh_interval: float, consecutive_failures: int
+                      ) -> Optional[datetime.datetime]:
+  """Gets when to refresh prices next.
+
+  Waits grow exponentially with each consecutive failure, up to a maximum,
+  and are moved randomly so refreshes do not happen all at the same time.
+
+  Args:
+    refresh_interval: Seconds between successful refreshes.
+    consecutive_failures: Number of refreshes which failed in a row.
+
+  Returns:
+    Date and time of next refresh. None if refreshes are disabled.
+  """
+  if refresh_interval <= 0:
+    return None
+
+  refresh_jitter = _get_environment_float(
+      _REFRESH_JITTER_ENVIRONMENT_VARIABLE, _DEFAULT_REFRESH_JITTER)
+  refresh_max_backoff = _get_environment_float(
+      _REFRESH_MAX_BACKOFF_ENVIRONMENT_VARIABLE, _DEFAULT_REFRESH_MAX_BACKOFF)
+
+  wait = refresh_interval
+  if consecutive_failures:
+    wait = min(
+        refresh_interval * 2 ** consecutive_failures,
+        max(refresh_max_backoff, refresh_interval))
+  wait *= 1 + random.uniform(-refresh_jitter, refresh_jitter)
+
+  return datetime.datetime.now() + datetime.timedelta(seconds=wait)
+
+
+def _get_environment_float(variable_name: Text, default: float) -> float:
+  """Gets a number from an environment variable.
+
+  Args:
+    variable_name: Name of the environment variable.
+    default: Value to use when variable is not set.
+
+  Raises:
+    ValueError: variable is not a number.
+
+  Returns:
+    Value of the variable.
+  """
+  return float(os.environ.get(variable_name, default))
@@ -0,0 +1,89 @@
+"""Simulates hypothetical operations without changing portfolios."""
+
+import datetime
+from models import asset
+from models import operation
+from models import portfolio
+from models import simulation
+from services import asset_manager
+from services import metrics_manager
+from services import position_manager
+from typing import Optional, Sequence, Text
+
+
+def get_operation(
+    managed_portfolio: portfolio.Portfolio,
+    managed_asset: asset.Asset,
+    operation_type: operation.OperationType,
+    quantity: int,
+    price_per_unit: Optional[float] = None,
+    timestamp: Optional[datetime.datetime] = None,
+    operation_currency: Optional[Text] = ''
+) -> operation.Operation:
+  """Creates a hypothetical operation, which is not added to the asset.
+
+  Args:
+    managed_portfolio: Portfolio where asset is.
+    managed_asset: Asset to operate.
+    operation_type: Type of operation to simulate.
+    quantity: Quantity changed in the operation.
+    price_per_unit: Price per each unit of the asset. Defaults to the asset
+        current price.
+    timestamp: Date and time of the operation. Defaults to now.
+    operation_currency: Currency in which price is expressed. Defaults to
+        the asset currency when price is not given, or else the portfolio
+        currency.
+
+  Returns:
+    Hypothetical operation.
+  """
+  if price_per_unit is None:
+    price_per_unit = managed_asset.current_price
+    operation_currency = operation_currency or managed_asset.currency
+
+  return operation.Operation(
+      managed_asset, timestamp or datetime.datetime.now(), operation_type,
+      quantity, price_per_unit,
+      operation_currency or managed_portfolio.currency)
+
+
+@metrics_manager.timed('simulate_operations')
+def simulate_operations(
+    managed_portfolio: portfolio.Portfolio,
+    managed_asset: asset.Asset,
+    new_operations: Sequence[operation.Operation]
+) -> simulation.Simulation:
+  """Gets the positions of an asset as if operations were added to it.
+
+  The portfolio is neither changed nor stored: positions are calculated on a
+  view of the asset which reads its operations with the new ones on top.
+
+  Args:
+    managed_portfolio: Portfolio where asset is.
+    managed_asset: Asset on which to simulate operations.
+    new_operations: Hypothetical operations on the asset.
+
+  Raises:
+    OversellError: operations sell more units than held.
+
+  Returns:
+    Current and simulated positions of the asset by each valuation method.
+  """
+  simulated_asset = asset_manager.get_simulated_asset(
+      managed_asset, new_operations)
+
+  current_positions = {}
+  simulated_positions = {}
+  for valuation_method in position_manager.ValuationMethod:
+    try:
+      simulated_positions[valuation_method.value] = (
+          position_manager.get_position(simulated_asset, valuation_method))
+    except NotImplementedError:
+      continue
+    # Only this asset is computed, without the portfolio positions and
+    # their stored copy.
+    current_positions[valuation_method.value] = (
+        position_manager.get_position(managed_asset, valuation_method))
+
+  return simulation.Simulation(
+      managed_asset, new_operations, current_positions, simulated_positions)
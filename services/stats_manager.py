@@ -1,12 +1,17 @@
 """Obtains and calculates stats and ratios of given assets."""
 
+import asyncio
 import enum
+import numpy as np
 from models import asset
+from models import market_data
 from models import portfolio
 from models import stats
 from services import asset_manager
-from typing import Mapping
-from yahoo_fin import stock_info
+from services import market_data_manager
+from services import portfolio_manager
+from services import price_history_manager
+from typing import Iterable, List, Mapping, Optional, Sequence, Text
 
 
 class StockAttribute(enum.Enum):
@@ -21,9 +26,25 @@ class StockAttribute(enum.Enum):
   VALUE_OVER_EBITDA = 'Enterprise Value/EBITDA 6'
 
 
-def get_asset_stats(managed_asset: asset.Asset) -> stats.AssetStats:
+StockStatValues = Mapping[StockAttribute, Optional[float]]
+
+_STOCK_ATTRIBUTES = list(StockAttribute)
+_MISSING_ATTRIBUTE_VALUE = '0'
+_NOT_AVAILABLE_VALUES = ['n/a', 'nan', 'none', '-', '']
+_SUFFIX_MULTIPLIERS = {
+    '%': 0.01,
+    'k': 1e3,
+    'M': 1e6,
+    'B': 1e9,
+    'T': 1e12,
+}
+
+
+def get_asset_stats(managed_portfolio: portfolio.Portfolio,
+                    managed_asset: asset.Asset) -> stats.AssetStats:
   """Gets the stats of a given asset.
   Args:
+    managed_portfolio: Portfolio to which asset belongs.
     managed_asset: Asset for which to get stats.
 
   Returns:
@@ -32,7 +53,7 @@ def get_asset_stats(managed_asset: asset.Asset) -> stats.AssetStats:
   if hasattr(managed_asset, 'stats') and managed_asset.stats:
     return managed_asset.stats
 
-  return update_asset_stats(managed_asset)
+  return update_asset_stats(managed_portfolio, managed_asset)
 
 
 def get_portfolio_stats(managed_portfolio: portfolio.Portfolio
@@ -46,81 +67,73 @@ def get_portfolio_stats(managed_portfolio: portfolio.Portfolio
     Map of asssets and their stats.
   """
   portfolio_assets = asset_manager.get_assets(managed_portfolio)
+  missing_stats_assets = [
+      managed_asset for managed_asset in portfolio_assets.values()
+      if not getattr(managed_asset, 'stats', None)
+  ]
+
+  updated_stats = {}
+  if missing_stats_assets:
+    updated_stats = _update_assets_stats(
+        managed_portfolio, missing_stats_assets)
+
   portfolio_stats = {
-      managed_asset: get_asset_stats(managed_asset)
+      managed_asset: updated_stats.get(managed_asset) or managed_asset.stats
       for managed_asset in portfolio_assets.values()
   }
   return portfolio_stats
 
 
-def update_asset_stats(managed_asset: asset.Asset) -> stats.AssetStats:
-  """Updates stats of given assets.
+def update_asset_stats(managed_portfolio: portfolio.Portfolio,
+                       managed_asset: asset.Asset) -> stats.AssetStats:
+  """Updates stats of given assets, and stores its portfolio.
 
   Args:
+    managed_portfolio: Portfolio to which asset belongs.
     managed_asset: Asset for which to update stats.
 
   Returns:
     Stats of the given asset.
   """
-  tracker = managed_asset.get_tracker()
-  price = managed_asset.current_price
+  return asyncio.run(
+      update_asset_stats_async(managed_portfolio, managed_asset))
 
-  if not tracker:
-    return stats.StockStats(managed_asset=managed_asset, price=price)
 
-  try:
-    fetched_price = _parse_and_format_value(stock_info.get_live_price(tracker))
-  except AssertionError:
-    fetched_price = None
-
-  if not fetched_price:
-    print(f'{managed_asset.get_id()} price was not updated.')
-    return stats.StockStats(managed_asset=managed_asset, price=price)
+async def update_asset_stats_async(managed_portfolio: portfolio.Portfolio,
+                                   managed_asset: asset.Asset
+                                   ) -> stats.AssetStats:
+  """Updates stats of given asset, awaiting its market data.
 
-  price = fetched_price
-  managed_asset.current_price = price
-
-  try:
-    stock_data = stock_info.get_stats(tracker)
-  except Exception:
-    print(f'Unable to update {managed_asset.get_id()} price.')
-    return stats.StockStats(managed_asset=managed_asset, price=price)
-
-  if stock_data.empty:
-    return stats.StockStats(managed_asset=managed_asset, price=price)
+  Args:
+    managed_portfolio: Portfolio to which asset belongs, which is stored.
+    managed_asset: Asset for which to update stats.
 
-  try:  # TODO: handle all types of assets instead of only stocks.
-    stock_stats = stats.StockStats(
-        managed_asset=managed_asset,
-        price=price,
-        debt_to_equity=_get_stock_stat_value(
-            stock_data, StockAttribute.DEBT_TO_EQUITY),
-        dividend_yield=_get_stock_stat_value(
-            stock_data, StockAttribute.DIVIDEND_YIELD),
-        eps=_get_stock_stat_value(
-            stock_data, StockAttribute.EPS),
-        pe=_get_stock_stat_value(
-            stock_data, StockAttribute.PE),
-        profit_margin=_get_stock_stat_value(
-            stock_data, StockAttribute.PROFIT_MARGIN),
-        return_on_equity=_get_stock_stat_value(
-            stock_data, StockAttribute.RETURN_ON_EQUITY),
-        revenue_growth=_get_stock_stat_value(
-            stock_data, StockAttribute.REVENUE_GROWTH),
-        value_over_ebitda=_get_stock_stat_value(
-            stock_data, StockAttribute.VALUE_OVER_EBITDA),
-    )
-    managed_asset.stats = stock_stats
-    return stock_stats
-  except Exception:
-    print(f'{managed_asset.get_id()} financial metrics were not updated.')
-    return stats.StockStats(managed_asset=managed_asset, price=price)
+  Returns:
+    Stats of the given asset.
+  """
+  asset_stats = await _update_assets_stats_async(
+      managed_portfolio, [managed_asset])
+  return asset_stats[managed_asset]
 
 
 def update_portfolio_stats(managed_portfolio: portfolio.Portfolio
                            ) -> Mapping[asset.Asset, stats.AssetStats]:
   """Updates the stats for all assets in the portfolio.
 
+  Args:
+    managed_portfolio: Portfolio for which to update stats.
+
+  Returns:
+    Map of asssets and their stats.
+  """
+  return asyncio.run(update_portfolio_stats_async(managed_portfolio))
+
+
+async def update_portfolio_stats_async(
+        managed_portfolio: portfolio.Portfolio
+) -> Mapping[asset.Asset, stats.AssetStats]:
+  """Updates the stats for all assets in the portfolio, awaiting market data.
+
   Args:
     managed_portfolio: Portfolio for which to update stats.
 
@@ -128,60 +141,287 @@ def update_portfolio_stats(managed_portfolio: portfolio.Portfolio
     Map of asssets and their stats.
   """
   portfolio_assets = asset_manager.get_assets(managed_portfolio)
-  portfolio_stats = {
-      managed_asset: update_asset_stats(managed_asset)
-      for managed_asset in portfolio_assets.values()
+  return await _update_assets_stats_async(
+      managed_portfolio, list(portfolio_assets.values()))
+
+
+def update_portfolios_prices(
+        managed_portfolios: Iterable[portfolio.Portfolio]) -> int:
+  """Updates the prices of all assets in many portfolios at once.
+
+  Only live prices are fetched, so it is cheaper than updating all stats.
+  Portfolios where any price changed are stored, and prices are recorded in
+  the price history of their trackers.
+
+  Args:
+    managed_portfolios: Portfolios for which to update prices.
+
+  Returns:
+    Number of asset prices which were fetched.
+  """
+  portfolios_assets = {
+      managed_portfolio: list(
+          asset_manager.get_assets(managed_portfolio).values())
+      for managed_portfolio in managed_portfolios
   }
-  return portfolio_stats
+  trackers = [
+      managed_asset.get_tracker()
+      for portfolio_assets in portfolios_assets.values()
+      for managed_asset in portfolio_assets
+      if managed_asset.get_tracker()
+  ]
+  if not trackers:
+    return 0
+
+  fetched_market_data = market_data_manager.fetch_market_data(
+      trackers, include_stats=False)
 
+  try:
+    price_history_manager.set_prices({
+        tracker: tracker_market_data.price
+        for tracker, tracker_market_data in fetched_market_data.items()
+        if tracker_market_data.price
+    })
+  except (OSError, ValueError) as error:
+    # Risk estimates use older prices until the next refresh.
+    print(f'Unable to store price history: {error}')
+
+  fetched_prices = 0
+  for managed_portfolio, portfolio_assets in portfolios_assets.items():
+    with portfolio_manager.get_portfolio_lock(managed_portfolio):
+      is_updated = False
+      for managed_asset in portfolio_assets:
+        asset_market_data = fetched_market_data.get(
+            managed_asset.get_tracker())
+        if not asset_market_data or not asset_market_data.price:
+          continue
+
+        fetched_prices += 1
+        if asset_market_data.price == managed_asset.current_price:
+          continue
+
+        managed_asset.current_price = asset_market_data.price
+        if getattr(managed_asset, 'stats', None):
+          managed_asset.stats.price = asset_market_data.price
+        managed_asset.increment_version()
+        is_updated = True
+
+      if not is_updated:
+        continue
+      try:
+        portfolio_manager.store_portfolio(managed_portfolio)
+      except portfolio_manager.StalePortfolioError as error:
+        # Prices are updated again on the next refresh.
+        print(f'Unable to store prices: {error}')
+
+  return fetched_prices
+
+
+def get_stock_stat_values(stats_tables: Iterable[market_data.StatsTable]
+                          ) -> List[StockStatValues]:
+  """Gets the values of all stock attributes from many stats tables at once.
+
+  Each table is indexed by attribute name once, and the raw values of all
+  tables are parsed together in a single vectorized step.
 
-def _get_stock_stat_value(stock_data, stock_attribute):
-  """Gets the stock stat value from a given stock attribute.
+  Args:
+    stats_tables: Rows of (attribute name, raw value) of each stock.
+
+  Returns:
+    Map of stock attributes and their values, for each table. Attributes
+    missing from a table are 0; values which are not available are None.
+  """
+  raw_values = []
+  for stats_table in stats_tables:
+    stats_index = {}
+    for attribute_name, attribute_value in stats_table:
+      stats_index.setdefault(attribute_name, attribute_value)
+    raw_values.append([
+        stats_index.get(stock_attribute.value, _MISSING_ATTRIBUTE_VALUE)
+        for stock_attribute in _STOCK_ATTRIBUTES
+    ])
+
+  if not raw_values:
+    return []
+
+  parsed_values = parse_stat_values(np.asarray(raw_values, dtype=str))
+  stat_values = parsed_values.astype(object)
+  stat_values[np.isnan(parsed_values)] = None
+
+  return [
+      dict(zip(_STOCK_ATTRIBUTES, table_values))
+      for table_values in stat_values.tolist()
+  ]
+
+
+def parse_stat_values(raw_values: np.ndarray) -> np.ndarray:
+  """Parses raw stat values into numbers, all at once.
+
+  Percentages are expressed as ratios, and k, M, B and T suffixes are
+  expanded. Values which are not available (e.g. N/A) are NaN.
 
   Args:
-    stock: Stock information(pandas Dataframe).
-    attribute_name: Attribute from which value is requested.
+    raw_values: Values of the stats as strings, in any shape.
 
   Returns:
-    Attribute value.
+    Values of the stats as floats, in the same shape.
   """
-  attribute = (
-      stock_data.loc[stock_data['Attribute'] == stock_attribute.value])
-  attribute_value = attribute['Value']
+  values = np.char.replace(np.char.strip(raw_values), ',', '')
+
+  multipliers = np.ones(values.shape)
+  for suffix, multiplier in _SUFFIX_MULTIPLIERS.items():
+    has_suffix = np.char.endswith(values, suffix)
+    multipliers[has_suffix] = multiplier
+    values[has_suffix] = np.char.rstrip(values[has_suffix], suffix)
+
+  is_missing = np.isin(np.char.lower(values), _NOT_AVAILABLE_VALUES)
+  values[is_missing] = '0'
 
   try:
-    attribute_series = attribute_value.values
-  except Exception:
-    return attribute_value
+    numbers = values.astype(float)
+  except ValueError:
+    numbers = np.vectorize(_parse_number, otypes=[float])(values)
 
-  if attribute_series:
-    return _parse_and_format_value(attribute_series[0])
-  else:
-    return _parse_and_format_value('0')
+  numbers[is_missing] = np.nan
+  return numbers * multipliers
 
 
-def _parse_and_format_value(string_value):
-  """Parses and formats a string into the stats format.
+def _update_assets_stats(managed_portfolio: portfolio.Portfolio,
+                         managed_assets: Sequence[asset.Asset]
+                         ) -> Mapping[asset.Asset, stats.AssetStats]:
+  """Updates stats of many assets, fetching their market data at once.
 
   Args:
-    string_value: Value of the stat as string.
+    managed_portfolio: Portfolio to which assets belong, which is stored.
+    managed_assets: Assets for which to update stats.
 
   Returns:
-    Value of the stat as a float.
+    Map of assets and their stats.
   """
-  if str(string_value).lower() == 'nan':
-    return None
+  return asyncio.run(
+      _update_assets_stats_async(managed_portfolio, managed_assets))
 
-  if type(string_value) == float:
-    return string_value
 
-  if type(string_value) == int:
-    return float(string_value)
+async def _update_assets_stats_async(
+        managed_portfolio: portfolio.Portfolio,
+        managed_assets: Sequence[asset.Asset]
+) -> Mapping[asset.Asset, stats.AssetStats]:
+  """Updates stats of many assets, awaiting their market data at once.
+
+  Assets are changed and their portfolio stored in another thread, holding
+  the portfolio lock, so other jobs awaiting on the event loop go on.
+
+  Args:
+    managed_portfolio: Portfolio to which assets belong, which is stored.
+    managed_assets: Assets for which to update stats.
+
+  Returns:
+    Map of assets and their stats.
+  """
+  trackers = [
+      managed_asset.get_tracker() for managed_asset in managed_assets
+      if managed_asset.get_tracker()
+  ]
+  fetched_market_data = await market_data_manager.fetch_market_data_async(
+      trackers)
+
+  stats_tables = {
+      tracker: tracker_market_data.stats_table
+      for tracker, tracker_market_data in fetched_market_data.items()
+      if tracker_market_data.stats_table
+  }
+  stock_stat_values = dict(zip(
+      stats_tables, get_stock_stat_values(stats_tables.values())))
+
+  return await asyncio.to_thread(
+      _store_assets_stats, managed_portfolio, managed_assets,
+      fetched_market_data, stock_stat_values)
+
+
+def _store_assets_stats(
+    managed_portfolio: portfolio.Portfolio,
+    managed_assets: Sequence[asset.Asset],
+    fetched_market_data: Mapping[Text, market_data.MarketData],
+    stock_stat_values: Mapping[Text, StockStatValues]
+) -> Mapping[asset.Asset, stats.AssetStats]:
+  """Updates prices and stats of assets from market data, and stores them.
+
+  Args:
+    managed_portfolio: Portfolio to which assets belong.
+    managed_assets: Assets for which to update stats.
+    fetched_market_data: Market data fetched for each tracker.
+    stock_stat_values: Parsed values of the stats table of each tracker.
+
+  Returns:
+    Map of assets and their stats.
+  """
+  with portfolio_manager.get_portfolio_lock(managed_portfolio):
+    assets_stats = {
+        managed_asset: _update_asset_stats_from_market_data(
+            managed_asset,
+            fetched_market_data.get(managed_asset.get_tracker()),
+            stock_stat_values.get(managed_asset.get_tracker()))
+        for managed_asset in managed_assets
+    }
+    portfolio_manager.store_portfolio(managed_portfolio)
+  return assets_stats
+
+
+def _update_asset_stats_from_market_data(
+        managed_asset: asset.Asset,
+        asset_market_data: Optional[market_data.MarketData],
+        stat_values: Optional[StockStatValues]) -> stats.AssetStats:
+  """Updates price and stats of an asset from its fetched market data.
+
+  Args:
+    managed_asset: Asset for which to update stats.
+    asset_market_data: Market data fetched for the asset tracker.
+    stat_values: Parsed values of the fetched stats table, if any.
+
+  Returns:
+    Stats of the given asset.
+  """
+  price = managed_asset.current_price
+
+  if not asset_market_data:
+    return stats.StockStats(managed_asset=managed_asset, price=price)
 
-  string_value = str(string_value)
+  fetched_price = asset_market_data.price
+  if not fetched_price:
+    print(f'{managed_asset.get_id()} price was not updated.')
+    return stats.StockStats(managed_asset=managed_asset, price=price)
+
+  price = fetched_price
+  managed_asset.current_price = price
+  managed_asset.increment_version()
 
-  if '%' in string_value:
-    string_value = string_value.replace('%', '')
-    return float(string_value) / 100
+  if asset_market_data.stats_table is None:
+    print(f'Unable to update {managed_asset.get_id()} price.')
+    return stats.StockStats(managed_asset=managed_asset, price=price)
+
+  if not stat_values:
+    return stats.StockStats(managed_asset=managed_asset, price=price)
 
-  return float(string_value)
+  # TODO: handle all types of assets instead of only stocks.
+  stock_stats = stats.StockStats(
+      managed_asset=managed_asset,
+      price=price,
+      debt_to_equity=stat_values[StockAttribute.DEBT_TO_EQUITY],
+      dividend_yield=stat_values[StockAttribute.DIVIDEND_YIELD],
+      eps=stat_values[StockAttribute.EPS],
+      pe=stat_values[StockAttribute.PE],
+      profit_margin=stat_values[StockAttribute.PROFIT_MARGIN],
+      return_on_equity=stat_values[StockAttribute.RETURN_ON_EQUITY],
+      revenue_growth=stat_values[StockAttribute.REVENUE_GROWTH],
+      value_over_ebitda=stat_values[StockAttribute.VALUE_OVER_EBITDA],
+  )
+  managed_asset.stats = stock_stats
+  return stock_stats
+
+
+def _parse_number(string_value: Text) -> float:
+  """Parses a single number, which is NaN if it is not valid."""
+  try:
+    return float(string_value)
+  except ValueError:
+    return np.nan
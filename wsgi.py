@@ -0,0 +1,20 @@
+"""Serves Finance Tracker with a production WSGI server.
+
+Run from the repository root with the settings in gunicorn.conf.py:
+  gunicorn wsgi:app
+"""
+
+import gc
+import os
+from app import app
+from services import portfolio_manager
+
+# Loads portfolios before the server forks its workers, which then share the
+# loaded portfolios instead of loading a copy each. Otherwise, each worker
+# serves requests while loading its own copy.
+if os.environ.get('FINANCE_TRACKER_PRELOAD_PORTFOLIOS', '1') == '1':
+  portfolio_manager.get_portfolios()
+
+# Garbage collection would otherwise write to the loaded objects, copying
+# their memory into every worker.
+gc.freeze()